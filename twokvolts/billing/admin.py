@@ -1,4 +1,33 @@
 from django.contrib import admin
-from .models import Invoice
 
-admin.site.register(Invoice)
\ No newline at end of file
+from twokvolts.pagination import EstimatedCountPaginator
+from .models import BillingRun, Invoice, OverdueSweep
+
+
+@admin.register(Invoice)
+class InvoiceAdmin(admin.ModelAdmin):
+    list_display = ('id', 'period', 'contract_number', 'personal_account',
+                    'amount', 'paid_total', 'status', 'due_date')
+    list_filter = ('status',)
+    list_select_related = ('contract__consumer',)
+    search_fields = ('=id', '=contract__contract_number',
+                     '=contract__consumer__personal_account')
+    raw_id_fields = ('contract', 'meter_reading')
+    # Оплаченная сумма меняется только платежами: оплату проводят
+    # в разделе платежей с настоящим номером операции
+    readonly_fields = ('paid_total', 'issue_date')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    @admin.display(description='Договор',
+                   ordering='contract__contract_number')
+    def contract_number(self, obj):
+        return obj.contract.contract_number
+
+    @admin.display(description='Лицевой счет')
+    def personal_account(self, obj):
+        return obj.contract.consumer.personal_account
+
+
+admin.site.register(BillingRun)
+admin.site.register(OverdueSweep)
@@ -0,0 +1,173 @@
+# billing/engine.py
+import datetime
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Exists, Max, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from contracts.models import Contract
+from dashboard.rollups import refresh_rollups
+from dashboard.summary import invalidate_for_contracts
+from meter_readings.models import MeterReading
+from .models import BillingRun, Invoice
+from .pricing import price_invoices
+
+
+def period_bounds(period):
+    """Первый день расчетного месяца и первый день следующего"""
+    start = period.replace(day=1)
+    if start.month == 12:
+        return start, datetime.date(start.year + 1, 1, 1)
+    return start, datetime.date(start.year, start.month + 1, 1)
+
+
+def partition_ranges(partitions):
+    """Делит активные договоры на диапазоны id примерно равной ширины"""
+    bounds = Contract.objects.filter(is_active=True).aggregate(
+        low=Min('id'), high=Max('id')
+    )
+    if bounds['low'] is None:
+        return []
+    low, high = bounds['low'], bounds['high']
+    step = max(1, -(-(high - low + 1) // partitions))
+    return [(start, min(start + step - 1, high))
+            for start in range(low, high + 1, step)]
+
+
+def partition_rows(start, end, id_range):
+    """Договоры диапазона без счета за период с показаниями на его концах.
+
+    Показания на конец периода и на начало берутся одним запросом
+    через коррелированные подзапросы по индексу (contract, reading_date).
+    """
+    readings = MeterReading.objects.filter(contract=OuterRef('pk'))
+    # У секционированной таблицы счетов нет уникального индекса на
+    # meter_reading (в нем нет ключа секционирования), поэтому показание,
+    # по которому уже выставлен счет, здесь не берется
+    billed = Invoice.objects.filter(meter_reading=OuterRef('pk'))
+    current = readings.filter(
+        ~Exists(billed), reading_date__gte=start, reading_date__lt=end
+    ).order_by('-reading_date')
+    previous = readings.filter(
+        reading_date__lt=start
+    ).order_by('-reading_date')
+
+    return Contract.objects.filter(
+        id__range=id_range,
+        is_active=True,
+        start_date__lt=end
+    ).exclude(
+        invoices__period=start
+    ).annotate(
+        current_id=Subquery(current.values('id')[:1]),
+        current_value=Subquery(current.values('value')[:1]),
+        # Вторая ветка, по всей истории, выполняется только для
+        # договоров без показаний за последний год
+        previous_value=Coalesce(
+            Subquery(previous.within_lookback(start).values('value')[:1]),
+            Subquery(previous.values('value')[:1])
+        ),
+    ).values_list(
+        'id', 'tariff_id', 'current_id', 'current_value', 'previous_value'
+    )
+
+
+def bill_partition(period, id_range):
+    """Выставляет счета за период договорам из диапазона id"""
+    started = time.monotonic()
+    start, end = period_bounds(period)
+    rows = partition_rows(start, end, id_range)
+
+    due_date = end + datetime.timedelta(days=settings.BILLING_DUE_DAYS)
+    invoices = []
+    tariff_ids = []
+    skipped = 0
+    for contract_id, tariff_id, reading_id, value, previous_value in rows:
+        if reading_id is None or previous_value is None:
+            skipped += 1
+            continue
+        consumption = value - previous_value
+        if consumption < 0:
+            skipped += 1
+            continue
+        invoices.append(Invoice(
+            contract_id=contract_id,
+            period=start,
+            meter_reading_id=reading_id,
+            consumption=consumption,
+            due_date=due_date
+        ))
+        tariff_ids.append(tariff_id)
+
+    # Суммы считаются сразу для всего диапазона по тарифам договоров
+    amounts = price_invoices([invoice.consumption for invoice in invoices],
+                             tariff_ids)
+    for invoice, amount in zip(invoices, amounts):
+        invoice.amount = amount
+
+    # Уникальность (contract, period) делает повторный запуск безопасным.
+    # Конфликтующие строки bulk_create молча пропускает, поэтому
+    # созданные считаются по разнице числа счетов диапазона
+    issued = Invoice.objects.filter(period=start, contract__id__range=id_range)
+    with transaction.atomic():
+        existing = issued.count()
+        Invoice.objects.bulk_create(invoices, batch_size=2000,
+                                    ignore_conflicts=True)
+        created = issued.count() - existing
+        # bulk_create не отправляет сигналы, итоги обновляются явно
+        refresh_rollups((invoice.contract_id, start) for invoice in invoices)
+        invalidate_for_contracts(invoice.contract_id for invoice in invoices)
+
+    return {
+        'range': list(id_range),
+        'invoices': created,
+        'skipped': skipped,
+        'seconds': round(time.monotonic() - started, 3),
+    }
+
+
+def _init_worker():
+    if not apps.ready:
+        django.setup()
+
+
+def run_billing(period, workers=1, partitions=None):
+    """Расчетный прогон за месяц ``period`` по всем активным договорам.
+
+    Диапазоны договоров обрабатываются пулом из ``workers`` процессов.
+    Прогон можно перезапускать: договоры, по которым счет за период
+    уже выставлен, пропускаются.
+    """
+    start, _ = period_bounds(period)
+    run = BillingRun.objects.create(period=start)
+    ranges = partition_ranges(partitions or workers * 4)
+    try:
+        if workers > 1 and len(ranges) > 1:
+            # Дочерние процессы не должны наследовать открытые соединения
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers,
+                                     initializer=_init_worker) as pool:
+                results = list(pool.map(bill_partition, repeat(start),
+                                        ranges))
+        else:
+            results = [bill_partition(start, r) for r in ranges]
+    except Exception:
+        run.status = 'failed'
+        run.finished_at = timezone.now()
+        run.save(update_fields=['status', 'finished_at'])
+        raise
+
+    run.partitions = results
+    run.invoices_count = sum(r['invoices'] for r in results)
+    run.status = 'done'
+    run.finished_at = timezone.now()
+    run.save(update_fields=['partitions', 'invoices_count', 'status',
+                            'finished_at'])
+    return run
@@ -0,0 +1,69 @@
+# billing/management/commands/bench_pricing.py
+import time
+from decimal import Decimal
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.pricing import SCALE, block_amounts, decimal_amount
+
+
+def parse_blocks(value):
+    """'100:4.5,300:6.1,:8.2' -> границы и цены в Decimal"""
+    bounds, rates = [], []
+    for block in value.split(','):
+        upper, _, rate = block.partition(':')
+        bounds.append(Decimal(upper) if upper else None)
+        rates.append(Decimal(rate))
+    if bounds[-1] is not None:
+        raise ValueError('последний блок должен быть без границы')
+    return bounds, rates
+
+
+class Command(BaseCommand):
+    help = 'Замер скорости векторного расчета сумм по ступенчатому тарифу'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=1000000,
+                            help='Сколько договоро-месяцев считать')
+        parser.add_argument('--blocks', default='100:5.51,300:6.89,:9.12',
+                            help='Блоки тарифа граница:цена через запятую')
+        parser.add_argument('--check', type=int, default=10000,
+                            help='Сколько сумм сверить с расчетом в Decimal')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            bounds, rates = parse_blocks(options['blocks'])
+        except (ArithmeticError, ValueError) as error:
+            raise CommandError(f'Неверные блоки тарифа: {error}')
+
+        # Расход до 2000 кВт*ч с четырьмя знаками после запятой
+        rng = np.random.default_rng(options['seed'])
+        consumption = rng.integers(0, 2000 * SCALE, options['size'],
+                                   dtype=np.int64)
+        unit_bounds = [None if upper is None else int(upper.scaleb(4))
+                       for upper in bounds]
+        unit_rates = [int(rate.scaleb(4)) for rate in rates]
+
+        started = time.perf_counter()
+        kopecks = block_amounts(consumption, unit_bounds, unit_rates)
+        elapsed = max(time.perf_counter() - started, 1e-9)
+
+        sample = rng.choice(options['size'],
+                            min(options['check'], options['size']),
+                            replace=False)
+        mismatches = sum(
+            decimal_amount(Decimal(int(consumption[i])).scaleb(-4),
+                           bounds, rates)
+            != Decimal(int(kopecks[i])).scaleb(-2)
+            for i in sample
+        )
+
+        message = (f'{options["size"]} договоро-месяцев за {elapsed:.3f} с '
+                   f'({options["size"] / elapsed / 1e6:.1f} млн/с), '
+                   f'сверено с Decimal {len(sample)}, '
+                   f'расхождений {mismatches}')
+        if mismatches:
+            raise CommandError(message)
+        self.stdout.write(self.style.SUCCESS(message))
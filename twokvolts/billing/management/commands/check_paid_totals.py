@@ -0,0 +1,82 @@
+# billing/management/commands/check_paid_totals.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import DecimalField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from billing.models import OPEN_STATUSES, Invoice
+from payments.models import Payment
+from twokvolts.replicas import replica_reads
+
+
+class Command(BaseCommand):
+    help = 'Сверка оплаченных сумм и статусов счетов с платежами'
+
+    max_reported = 20
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Счетов в одном запросе')
+        parser.add_argument('--fix', action='store_true',
+                            help='Исправить расхождения')
+
+    def handle(self, *args, **options):
+        # Отчет без исправлений не нагружает основную базу
+        with replica_reads(enabled=not options['fix']):
+            self.check(options)
+
+    def check(self, options):
+        started = time.monotonic()
+        paid = Payment.objects.filter(
+            invoice=OuterRef('pk')
+        ).order_by().values('invoice').annotate(total=Sum('amount'))
+        amount_field = DecimalField(max_digits=12, decimal_places=2)
+        invoices = Invoice.objects.order_by('id').annotate(
+            actual=Coalesce(Subquery(paid.values('total'),
+                                     output_field=amount_field), 0,
+                            output_field=amount_field)
+        ).values_list('id', 'amount', 'paid_total', 'status', 'actual')
+
+        checked = 0
+        broken = 0
+        last_id = 0
+        while True:
+            batch = list(invoices.filter(
+                id__gt=last_id
+            )[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            checked += len(batch)
+            deltas = self.find_mismatches(batch, broken)
+            broken += len(deltas)
+            if options['fix'] and deltas:
+                # Разница прибавляется через F(), статус пересчитывается
+                Invoice.objects.apply_payments(deltas)
+
+        message = (f'Проверено счетов {checked}, расхождений {broken}'
+                   f'{", исправлено" if options["fix"] and broken else ""}'
+                   f' за {time.monotonic() - started:.1f} с')
+        if broken and not options['fix']:
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
+
+    def find_mismatches(self, batch, reported):
+        """{id счета: поправка к paid_total} для счетов с расхождениями"""
+        deltas = {}
+        for pk, amount, paid_total, status, actual in batch:
+            fully_paid = actual >= amount
+            wrong_status = (status == 'paid' and not fully_paid) or (
+                status in OPEN_STATUSES and fully_paid
+            )
+            if paid_total == actual and not wrong_status:
+                continue
+            deltas[pk] = actual - paid_total
+            if reported + len(deltas) <= self.max_reported:
+                self.stderr.write(
+                    f'Счет #{pk}: учтено {paid_total}, по платежам {actual}, '
+                    f'статус {status}'
+                )
+        return deltas
@@ -0,0 +1,40 @@
+# billing/management/commands/run_billing.py
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.engine import run_billing
+
+
+class Command(BaseCommand):
+    help = 'Расчетный прогон: выставление счетов за месяц'
+
+    def add_arguments(self, parser):
+        parser.add_argument('period', help='Расчетный месяц, ГГГГ-ММ')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Число процессов')
+        parser.add_argument('--partitions', type=int,
+                            help='Число диапазонов договоров '
+                                 '(по умолчанию 4 на процесс)')
+
+    def handle(self, *args, **options):
+        try:
+            period = datetime.datetime.strptime(
+                options['period'], '%Y-%m'
+            ).date()
+        except ValueError:
+            raise CommandError('Период задается в формате ГГГГ-ММ')
+
+        run = run_billing(period, workers=options['workers'],
+                          partitions=options['partitions'])
+        for partition in run.partitions:
+            low, high = partition['range']
+            self.stdout.write(
+                f'Договоры {low}-{high}: счетов {partition["invoices"]}, '
+                f'пропущено {partition["skipped"]}, '
+                f'{partition["seconds"]:.3f} с'
+            )
+        elapsed = (run.finished_at - run.started_at).total_seconds()
+        self.stdout.write(self.style.SUCCESS(
+            f'Выставлено счетов: {run.invoices_count} за {elapsed:.1f} с'
+        ))
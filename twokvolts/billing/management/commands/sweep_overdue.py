@@ -0,0 +1,29 @@
+# billing/management/commands/sweep_overdue.py
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.overdue import sweep_overdue
+
+
+class Command(BaseCommand):
+    help = ('Перевод неоплаченных счетов с истекшим сроком в просроченные '
+            '(запускать по расписанию, можно параллельно)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Расчетная дата ГГГГ-ММ-ДД')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Счетов в одной транзакции')
+
+    def handle(self, *args, **options):
+        try:
+            today = (datetime.date.fromisoformat(options['date'])
+                     if options['date'] else None)
+        except ValueError:
+            raise CommandError('Дата задается в формате ГГГГ-ММ-ДД')
+
+        sweep = sweep_overdue(today, options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Просрочено счетов: {sweep.invoices_count} '
+            f'за {sweep.seconds:.1f} с'
+        ))
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.16 on 2026-10-18 10:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BillingRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField()),
+                ('status', models.CharField(choices=[('running', 'Выполняется'), ('done', 'Завершен'), ('failed', 'Ошибка')], default='running', max_length=20)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('invoices_count', models.PositiveIntegerField(default=0)),
+                ('partitions', models.JSONField(default=list)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.UniqueConstraint(fields=('contract', 'period'), name='invoice_contract_period_unique'),
+        ),
+    ]
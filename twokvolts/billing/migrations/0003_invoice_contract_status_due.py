@@ -0,0 +1,17 @@
+# Generated by Django 3.2.16 on 2026-10-18 10:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0002_billing_run'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['contract', 'status', 'due_date'], name='invoice_contract_status_due'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.16 on 2026-10-18 10:40
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_paid_total(apps, schema_editor):
+    # Один UPDATE по всем счетам вместо обхода в Python
+    Invoice = apps.get_model('billing', 'Invoice')
+    Payment = apps.get_model('payments', 'Payment')
+    paid = Payment.objects.filter(
+        invoice=OuterRef('pk')
+    ).order_by().values('invoice').annotate(total=Sum('amount'))
+    Invoice.objects.update(paid_total=Coalesce(
+        Subquery(paid.values('total'),
+                 output_field=models.DecimalField(max_digits=12,
+                                                  decimal_places=2)),
+        0, output_field=models.DecimalField(max_digits=12, decimal_places=2)
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0003_invoice_contract_status_due'),
+        ('payments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='paid_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(fill_paid_total, migrations.RunPython.noop),
+    ]
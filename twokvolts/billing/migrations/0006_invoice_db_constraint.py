@@ -0,0 +1,20 @@
+# Generated by Django 3.2.16 on 2026-10-18 11:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meter_readings', '0004_reading_admin_indexes'),
+        ('billing', '0005_overdue_sweep'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='invoice',
+            name='meter_reading',
+            field=models.OneToOneField(db_constraint=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='meter_readings.meterreading'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.16 on 2026-10-18 11:10
+
+from django.db import migrations
+
+from twokvolts.partitions import partition_table, unpartition_table
+
+
+def partition(apps, schema_editor):
+    partition_table(schema_editor, 'billing_invoice', 'period')
+
+
+def unpartition(apps, schema_editor):
+    unpartition_table(schema_editor, 'billing_invoice', 'period')
+    if schema_editor.connection.vendor == 'postgresql':
+        # Уникальность связи с показанием в секциях держал обычный индекс
+        schema_editor.execute(
+            'DROP INDEX billing_invoice_meter_reading_id_key'
+        )
+        schema_editor.execute(
+            'ALTER TABLE billing_invoice ADD CONSTRAINT '
+            'billing_invoice_meter_reading_id_key UNIQUE (meter_reading_id)'
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('billing', '0006_invoice_db_constraint'),
+        ('dashboard', '0003_notification_invoice_db_constraint'),
+        ('payments', '0003_invoice_db_constraint'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
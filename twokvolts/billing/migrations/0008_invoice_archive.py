@@ -0,0 +1,39 @@
+# Generated by Django 3.2.16 on 2026-10-18 11:08
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0002_tariff_tiers_zones'),
+        ('billing', '0007_partition_invoice_by_period'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_date', models.DateField()),
+                ('last_date', models.DateField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('ids', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), size=None)),
+                ('periods', django.contrib.postgres.fields.ArrayField(base_field=models.DateField(), size=None)),
+                ('meter_readings', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(null=True), size=None)),
+                ('consumption', django.contrib.postgres.fields.ArrayField(base_field=models.DecimalField(decimal_places=4, max_digits=12), size=None)),
+                ('amounts', django.contrib.postgres.fields.ArrayField(base_field=models.DecimalField(decimal_places=2, max_digits=12), size=None)),
+                ('paid_totals', django.contrib.postgres.fields.ArrayField(base_field=models.DecimalField(decimal_places=2, max_digits=12), size=None)),
+                ('statuses', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=20), size=None)),
+                ('issue_dates', django.contrib.postgres.fields.ArrayField(base_field=models.DateField(), size=None)),
+                ('due_dates', django.contrib.postgres.fields.ArrayField(base_field=models.DateField(), size=None)),
+                ('contract', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contracts.contract')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='invoicearchive',
+            index=models.Index(fields=['contract', 'last_date'], name='invoice_archive_contract'),
+        ),
+    ]
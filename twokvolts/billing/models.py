@@ -1,6 +1,54 @@
-from django.db import models
+from decimal import Decimal
+
+from django.contrib.postgres.fields import ArrayField
+from django.db import connections, models
+from django.db.models import Q
+from django.utils import timezone
+
 from contracts.models import Contract
 from meter_readings.models import MeterReading
+from twokvolts.archive import PackedArchive
+
+OPEN_STATUSES = ('issued', 'overdue')
+
+
+class InvoiceQuerySet(models.QuerySet):
+
+    def apply_payments(self, deltas):
+        """Меняет оплаченную сумму счетов и их статус одним UPDATE.
+
+        ``deltas`` — {id счета: сумма}, отрицательная при отмене платежа.
+        Сумма прибавляется к текущей в самом UPDATE, поэтому одновременные
+        платежи по одному счету не теряются, а статус считается по новой
+        сумме. Суммы соединяются со счетами как массивы, а не ветками CASE
+        на каждый счет.
+        """
+        if not deltas:
+            return 0
+        connection = connections[self.db]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        statuses = ', '.join(f"'{status}'" for status in OPEN_STATUSES)
+        reopened = ("inv.status = 'paid' "
+                    "AND inv.amount > inv.paid_total + d.delta")
+        sql = (
+            f'UPDATE {table} AS inv SET '
+            f'paid_total = inv.paid_total + d.delta, '
+            f'status = CASE '
+            f'WHEN inv.status IN ({statuses}) '
+            f"AND inv.amount <= inv.paid_total + d.delta THEN 'paid' "
+            f"WHEN {reopened} AND inv.due_date < %s THEN 'overdue' "
+            f"WHEN {reopened} THEN 'issued' "
+            f'ELSE inv.status END '
+            f'FROM (SELECT unnest(%s::bigint[]) AS id, '
+            f'unnest(%s::numeric[]) AS delta) AS d '
+            f'WHERE inv.id = d.id'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [
+                timezone.now().date(), list(deltas),
+                [Decimal(value) for value in deltas.values()],
+            ])
+            return cursor.rowcount
 
 
 class Invoice(models.Model):
@@ -13,17 +61,106 @@ class Invoice(models.Model):
                                  on_delete=models.CASCADE,
                                  related_name='invoices')
     period = models.DateField()  # Период начисления
+    # Связь с показанием. Таблица показаний секционирована,
+    # внешний ключ проверяет Django
     meter_reading = models.OneToOneField(MeterReading,
                                          on_delete=models.PROTECT,
-                                         null=True) # Связь с показанием
+                                         null=True,
+                                         db_constraint=False)
     consumption = models.DecimalField(max_digits=12,
                                       decimal_places=4)  # Расход
     amount = models.DecimalField(max_digits=12,
                                  decimal_places=2)  # Сумма к оплате
+    paid_total = models.DecimalField(max_digits=12, decimal_places=2,
+                                     default=0)  # Оплачено по счету
     status = models.CharField(max_length=20,
                               choices=STATUS_CHOICES, default='issued')
     issue_date = models.DateField(auto_now_add=True)
     due_date = models.DateField()  # Дата, до которой нужно оплатить
 
+    objects = InvoiceQuerySet.as_manager()
+
     def __str__(self):
         return f"Счет #{self.id} за {self.period.strftime('%Y-%m')}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['contract', 'period'],
+                                    name='invoice_contract_period_unique'),
+        ]
+        indexes = [
+            # Открытые и просроченные счета договора
+            models.Index(fields=['contract', 'status', 'due_date'],
+                         name='invoice_contract_status_due'),
+            # Кандидаты для sweep_overdue
+            models.Index(fields=['due_date'], condition=Q(status='issued'),
+                         name='invoice_issued_due'),
+        ]
+
+
+class BillingRun(models.Model):
+    STATUS_CHOICES = [
+        ('running', 'Выполняется'),
+        ('done', 'Завершен'),
+        ('failed', 'Ошибка'),
+    ]
+    period = models.DateField()
+    status = models.CharField(max_length=20,
+                              choices=STATUS_CHOICES, default='running')
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    invoices_count = models.PositiveIntegerField(default=0)
+    # Время и число счетов по диапазонам договоров
+    partitions = models.JSONField(default=list)
+
+    def __str__(self):
+        return f"Расчет за {self.period.strftime('%Y-%m')} ({self.status})"
+
+
+class OverdueSweep(models.Model):
+    """Запуск перевода неоплаченных счетов в просроченные"""
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    as_of = models.DateField()  # Просрочены счета со сроком раньше этой даты
+    invoices_count = models.PositiveIntegerField(default=0)
+    seconds = models.FloatField(default=0)
+
+    def __str__(self):
+        return (f"Просрочка на {self.as_of:%Y-%m-%d}: "
+                f"{self.invoices_count} счетов")
+
+
+class InvoiceArchive(PackedArchive):
+    """Оплаченные счета закрытых периодов (команда archive_history)"""
+
+    ids = ArrayField(models.BigIntegerField())
+    periods = ArrayField(models.DateField())
+    meter_readings = ArrayField(models.BigIntegerField(null=True))
+    consumption = ArrayField(models.DecimalField(max_digits=12,
+                                                 decimal_places=4))
+    amounts = ArrayField(models.DecimalField(max_digits=12,
+                                             decimal_places=2))
+    paid_totals = ArrayField(models.DecimalField(max_digits=12,
+                                                 decimal_places=2))
+    statuses = ArrayField(models.CharField(max_length=20))
+    issue_dates = ArrayField(models.DateField())
+    due_dates = ArrayField(models.DateField())
+
+    packed = {
+        'id': 'ids',
+        'period': 'periods',
+        'meter_reading_id': 'meter_readings',
+        'consumption': 'consumption',
+        'amount': 'amounts',
+        'paid_total': 'paid_totals',
+        'status': 'statuses',
+        'issue_date': 'issue_dates',
+        'due_date': 'due_dates',
+    }
+    date_field = 'period'
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['contract', 'last_date'],
+                         name='invoice_archive_contract'),
+        ]
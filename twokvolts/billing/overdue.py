@@ -0,0 +1,51 @@
+# billing/overdue.py
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from dashboard.summary import invalidate_for_contracts
+from .models import Invoice, OverdueSweep
+
+
+def sweep_chunk(today, chunk_size):
+    """Переводит в просроченные одну пачку счетов, возвращает их число.
+
+    Строки, заблокированные параллельным запуском или проводимым
+    платежом, пропускаются (SKIP LOCKED) и достанутся следующей пачке
+    или следующему запуску.
+    """
+    with transaction.atomic():
+        rows = list(Invoice.objects.filter(
+            status='issued',
+            due_date__lt=today
+        ).order_by('id').select_for_update(
+            skip_locked=True
+        ).values_list('id', 'contract_id')[:chunk_size])
+        if not rows:
+            return 0
+        updated = Invoice.objects.filter(
+            id__in=[pk for pk, _ in rows],
+            status='issued'
+        ).update(status='overdue')
+        invalidate_for_contracts(contract_id for _, contract_id in rows)
+    return updated
+
+
+def sweep_overdue(today=None, chunk_size=1000):
+    """Переводит в 'overdue' все выставленные счета с истекшим сроком"""
+    started = time.monotonic()
+    today = today or timezone.now().date()
+    sweep = OverdueSweep.objects.create(as_of=today)
+    total = 0
+    while True:
+        updated = sweep_chunk(today, chunk_size)
+        if not updated:
+            break
+        total += updated
+
+    sweep.invoices_count = total
+    sweep.seconds = round(time.monotonic() - started, 3)
+    sweep.finished_at = timezone.now()
+    sweep.save(update_fields=['invoices_count', 'seconds', 'finished_at'])
+    return sweep
@@ -0,0 +1,106 @@
+# billing/pricing.py
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+
+from contracts.registry import get_tariff
+
+AMOUNT_QUANT = Decimal('0.01')
+SCALE = 10 ** 4  # Расход и цены хранятся с 4 знаками после запятой
+KOPECK = SCALE * SCALE // 100  # Единиц произведения расход*цена в копейке
+# Выше этой границы произведения могут не поместиться в int64
+SAFE_PRODUCT = 2 ** 62
+
+
+def to_units(values):
+    """Decimal с 4 знаками -> целые десятитысячные"""
+    return np.array([int(value.scaleb(4)) for value in values],
+                    dtype=np.int64)
+
+
+def _round_kopecks(products):
+    """Стомиллионные доли рубля -> копейки, половина округляется от нуля"""
+    magnitude = (np.abs(products) + KOPECK // 2) // KOPECK
+    return np.where(products < 0, -magnitude, magnitude)
+
+
+def _widen(consumption, rates, terms=1):
+    # Огромные расходы считаются в целых Python: медленнее, но точно
+    largest = int(np.abs(consumption).max(initial=0))
+    if largest * max(rates, default=0) * terms >= SAFE_PRODUCT:
+        return consumption.astype(object)
+    return consumption
+
+
+def block_amounts(consumption, bounds, rates):
+    """Суммы в копейках по ступенчатому тарифу для массива расходов.
+
+    ``consumption`` и ``bounds`` (верхние границы блоков, последняя
+    None) в десятитысячных кВт*ч, ``rates`` в десятитысячных рубля.
+    Все вычисления целочисленные, округление один раз на счет, как в
+    :func:`decimal_amount`.
+    """
+    consumption = _widen(np.asarray(consumption), rates)
+    total = np.zeros_like(consumption)
+    lower = 0
+    for upper, rate in zip(bounds, rates):
+        portion = consumption - lower
+        if upper is not None:
+            portion = np.minimum(portion, upper - lower)
+        total += np.maximum(portion, 0) * rate
+        if upper is None:
+            break
+        lower = upper
+    return _round_kopecks(total)
+
+
+def zone_amounts(consumption_by_zone, rates):
+    """Суммы в копейках по зонам суток: расход задан матрицей (счет, зона)"""
+    consumption = np.asarray(consumption_by_zone)
+    rates = list(rates)
+    consumption = _widen(consumption, rates, terms=len(rates))
+    return _round_kopecks((consumption * np.asarray(rates)).sum(axis=1))
+
+
+def tariff_blocks(tariff):
+    """Границы и цены блоков тарифа в десятитысячных.
+
+    Без ступеней тариф плоский, сверх последней границы действует
+    основная цена тарифа.
+    """
+    blocks = [(tier.up_to, tier.rate) for tier in tariff.tiers.all()]
+    if not blocks or blocks[-1][0] is not None:
+        blocks.append((None, tariff.rate))
+    bounds = [None if up_to is None else int(up_to.scaleb(4))
+              for up_to, _ in blocks]
+    return bounds, [int(rate.scaleb(4)) for _, rate in blocks]
+
+
+def decimal_amount(consumption, bounds, rates):
+    """Эталонный расчет одного счета в Decimal (границы и цены в кВт*ч/руб.)"""
+    total = Decimal(0)
+    lower = Decimal(0)
+    for upper, rate in zip(bounds, rates):
+        top = consumption if upper is None else min(consumption, upper)
+        if top > lower:
+            total += (top - lower) * rate
+        if upper is None:
+            break
+        lower = upper
+    return total.quantize(AMOUNT_QUANT, ROUND_HALF_UP)
+
+
+def price_invoices(consumption, tariff_ids):
+    """Суммы счетов (Decimal) по расходам и тарифам договоров.
+
+    Счета группируются по тарифу, каждая группа считается одним
+    векторным проходом.
+    """
+    units = to_units(consumption)
+    tariff_ids = np.asarray(tariff_ids)
+    kopecks = np.zeros(len(units), dtype=object)
+    for tariff_id in np.unique(tariff_ids):
+        mask = tariff_ids == tariff_id
+        bounds, rates = tariff_blocks(get_tariff(int(tariff_id)))
+        kopecks[mask] = block_amounts(units[mask], bounds, rates)
+    return [Decimal(int(value)).scaleb(-2) for value in kopecks]
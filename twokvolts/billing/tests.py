@@ -1,3 +1,303 @@
+import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from contracts.models import Tariff, TariffTier
+from dashboard.tests import create_invoice
+from meter_readings.models import MeterReading
+from payments.models import Payment
+from meter_readings.tests import create_consumer
+from .engine import run_billing
+from .models import BillingRun, Invoice, OverdueSweep
+from .overdue import sweep_overdue
+from .pricing import decimal_amount, price_invoices, zone_amounts
+
+User = get_user_model()
+
+
+class BillingRunTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.contracts = create_consumer('billing', contracts=5)
+        readings = []
+        for n, contract in enumerate(cls.contracts[:4]):
+            readings.append(MeterReading(
+                contract=contract, reading_date=datetime.date(2024, 1, 31),
+                value=Decimal('1000')
+            ))
+            readings.append(MeterReading(
+                contract=contract, reading_date=datetime.date(2024, 2, 29),
+                value=Decimal('1000') + Decimal('10.5') * (n + 1)
+            ))
+        # Пятый договор без показаний за февраль
+        readings.append(MeterReading(
+            contract=cls.contracts[4], reading_date=datetime.date(2024, 1, 31),
+            value=Decimal('5')
+        ))
+        MeterReading.objects.bulk_create(readings)
+
+    def test_invoices_from_reading_deltas(self):
+        run = run_billing(datetime.date(2024, 2, 10), partitions=3)
+        self.assertEqual(run.status, 'done')
+        self.assertEqual(run.invoices_count, 4)
+        self.assertEqual(sum(p['skipped'] for p in run.partitions), 1)
+        invoice = Invoice.objects.get(contract=self.contracts[1])
+        self.assertEqual(invoice.period, datetime.date(2024, 2, 1))
+        self.assertEqual(invoice.consumption, Decimal('21'))
+        self.assertEqual(invoice.amount, Decimal('115.50'))
+        self.assertEqual(invoice.due_date, datetime.date(2024, 3, 16))
+        self.assertEqual(invoice.meter_reading.reading_date,
+                         datetime.date(2024, 2, 29))
+
+    def test_rerun_is_idempotent(self):
+        run_billing(datetime.date(2024, 2, 1))
+        Invoice.objects.filter(contract=self.contracts[0]).delete()
+        call_command('run_billing', '2024-02', stdout=StringIO())
+        self.assertEqual(Invoice.objects.count(), 4)
+        self.assertEqual(BillingRun.objects.last().invoices_count, 1)
+
+    def test_previous_reading_older_than_lookback(self):
+        # Январские показания вне окна: они находятся второй веткой
+        with self.settings(READINGS_LOOKBACK_DAYS=0):
+            run = run_billing(datetime.date(2024, 2, 1))
+        self.assertEqual(run.invoices_count, 4)
+        self.assertEqual(
+            Invoice.objects.get(contract=self.contracts[1]).consumption,
+            Decimal('21')
+        )
+
+    def test_billed_reading_is_not_reused(self):
+        reading = MeterReading.objects.get(
+            contract=self.contracts[0], reading_date=datetime.date(2024, 2, 29)
+        )
+        # Счет за другой период уже ссылается на февральское показание
+        create_invoice(self.contracts[0], datetime.date(2024, 3, 1),
+                       meter_reading=reading)
+        run = run_billing(datetime.date(2024, 2, 1))
+        self.assertEqual(run.invoices_count, 3)
+        self.assertEqual(
+            Invoice.objects.filter(meter_reading=reading).count(), 1
+        )
+
+    def test_conflicting_invoice_is_not_counted(self):
+        def price_with_race(consumption, tariff_ids):
+            # Параллельный прогон успел выставить счет первому договору
+            if not Invoice.objects.exists():
+                create_invoice(self.contracts[0], datetime.date(2024, 2, 1))
+            return price_invoices(consumption, tariff_ids)
+
+        with mock.patch('billing.engine.price_invoices', price_with_race):
+            run = run_billing(datetime.date(2024, 2, 1))
+        self.assertEqual(Invoice.objects.count(), 4)
+        self.assertEqual(run.invoices_count, 3)
+
+
+class PricingTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tariff = Tariff.objects.create(name='Социальная норма',
+                                           rate=Decimal('7.1234'))
+        TariffTier.objects.bulk_create([
+            TariffTier(tariff=cls.tariff, up_to=Decimal('100'),
+                       rate=Decimal('4.5678')),
+            TariffTier(tariff=cls.tariff, up_to=Decimal('250.5'),
+                       rate=Decimal('5.9999')),
+        ])
+        cls.flat = Tariff.objects.create(name='Плоский',
+                                         rate=Decimal('5.5000'))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_matches_decimal_rounding(self):
+        consumption = [Decimal('0'), Decimal('0.0001'), Decimal('99.9999'),
+                       Decimal('100'), Decimal('100.0001'),
+                       Decimal('250.5'), Decimal('1234.5678'),
+                       Decimal('0.0909')]
+        bounds = [Decimal('100'), Decimal('250.5'), None]
+        rates = [Decimal('4.5678'), Decimal('5.9999'), Decimal('7.1234')]
+        amounts = price_invoices(consumption, [self.tariff.pk] * 8)
+        self.assertEqual(
+            amounts, [decimal_amount(c, bounds, rates) for c in consumption]
+        )
+        # 100 * 4.5678 + 150.5 * 5.9999 + 984.0678 * 7.1234
+        self.assertEqual(amounts[6], Decimal('8369.67'))
+
+    def test_mixed_tariffs_and_overflow(self):
+        huge = Decimal('99999999.9999')
+        self.assertEqual(
+            price_invoices([Decimal('21'), huge, Decimal('0.0909')],
+                           [self.flat.pk, self.flat.pk, self.tariff.pk]),
+            [Decimal('115.50'), (huge * Decimal('5.5')).quantize(
+                Decimal('0.01'), ROUND_HALF_UP), Decimal('0.42')]
+        )
+
+    def test_zone_amounts(self):
+        kopecks = zone_amounts([[1000000, 500000], [1, 0]], [55000, 25000])
+        self.assertEqual(list(kopecks), [67500, 0])
+
+
+class PaidTotalTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.contracts = create_consumer('paid')
+        cls.invoice = create_invoice(cls.contracts[0],
+                                     datetime.date(2024, 1, 1))
+
+    def pay(self, amount, external_id=''):
+        return Payment.objects.create(
+            invoice=self.invoice, amount=Decimal(amount),
+            payment_date=datetime.date(2024, 2, 1), method='Online',
+            external_id=external_id
+        )
+
+    def state(self):
+        self.invoice.refresh_from_db()
+        return self.invoice.paid_total, self.invoice.status
+
+    def test_payments_update_total_and_status(self):
+        self.pay('200')
+        self.assertEqual(self.state(), (Decimal('200'), 'issued'))
+        second = self.pay('350')
+        self.assertEqual(self.state(), (Decimal('550'), 'paid'))
+        second.amount = Decimal('300')
+        second.save()
+        # Срок оплаты прошел, поэтому счет снова становится просроченным
+        self.assertEqual(self.state(), (Decimal('500'), 'overdue'))
+        second.delete()
+        self.assertEqual(self.state(), (Decimal('200'), 'overdue'))
+
+    def test_check_command_finds_and_fixes_drift(self):
+        self.pay('550')
+        Invoice.objects.update(paid_total=0, status='issued')
+        out, err = StringIO(), StringIO()
+        call_command('check_paid_totals', stdout=out, stderr=err)
+        self.assertIn('расхождений 1', out.getvalue())
+        self.assertIn(f'Счет #{self.invoice.id}', err.getvalue())
+
+        call_command('check_paid_totals', fix=True, stdout=StringIO(),
+                     stderr=StringIO())
+        self.assertEqual(self.state(), (Decimal('550'), 'paid'))
+        out = StringIO()
+        call_command('check_paid_totals', stdout=out)
+        self.assertIn('расхождений 0', out.getvalue())
+
+    def test_apply_payments_in_one_update(self):
+        invoices = [self.invoice] + [
+            create_invoice(self.contracts[0], datetime.date(2023, month, 1))
+            for month in range(1, 13)
+        ]
+        deltas = {invoice.pk: Decimal('550') for invoice in invoices}
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(Invoice.objects.apply_payments(deltas), 13)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(
+            set(Invoice.objects.values_list('paid_total', 'status')),
+            {(Decimal('550'), 'paid')}
+        )
+
+
+class SweepOverdueTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.contracts = create_consumer('sweep')
+        cls.today = datetime.date(2024, 6, 1)
+        for month in range(1, 6):
+            create_invoice(cls.contracts[0], datetime.date(2024, month, 1),
+                           due_date=datetime.date(2024, month + 1, 1))
+        Invoice.objects.filter(period=datetime.date(2024, 1, 1)).update(
+            status='paid', paid_total=F('amount')
+        )
+
+    def statuses(self):
+        return list(Invoice.objects.order_by('period').values_list(
+            'status', flat=True
+        ))
+
+    def test_sweep_in_chunks(self):
+        out = StringIO()
+        call_command('sweep_overdue', date='2024-06-01', chunk_size=2,
+                     stdout=out)
+        self.assertIn('Просрочено счетов: 3', out.getvalue())
+        # Срок последнего счета наступает сегодня, оплаченный не трогаем
+        self.assertEqual(self.statuses(),
+                         ['paid', 'overdue', 'overdue', 'overdue', 'issued'])
+        sweep = OverdueSweep.objects.get()
+        self.assertEqual(sweep.invoices_count, 3)
+        self.assertIsNotNone(sweep.finished_at)
+
+        self.assertEqual(sweep_overdue(self.today).invoices_count, 0)
+
+
+class InvoiceExportTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.contracts = create_consumer('accountant', contracts=2)
+        cls.other, cls.other_contracts = create_consumer('other-export')
+        for contract in cls.contracts + cls.other_contracts:
+            create_invoice(contract, datetime.date(2024, 1, 1))
+        cls.staff = User.objects.create_user('operator', password='pass',
+                                             is_staff=True)
+
+    def export(self, **params):
+        response = self.client.get(reverse('billing:export'), params)
+        return b''.join(response.streaming_content).decode('utf-8-sig')
+
+    def test_operator_scope(self):
+        self.client.force_login(self.staff)
+        self.assertEqual(len(self.export().splitlines()), 4)
+        lines = self.export(consumer=self.other.consumer.pk).splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn('other-export-0,2024-01-01,100.0000,550.00,0.00,'
+                      'issued', lines[1])
+
+        self.client.force_login(self.user)
+        self.assertEqual(
+            len(self.export(consumer=self.other.consumer.pk).splitlines()), 3
+        )
+
+
+class InvoiceAdminTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('operator', password='pass')
+        cls.user, cls.contracts = create_consumer('admin-invoices',
+                                                  contracts=3)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_changelist_queries_do_not_grow(self):
+        url = reverse('admin:billing_invoice_changelist')
+        create_invoice(self.contracts[0], datetime.date(2024, 1, 1))
+        with CaptureQueriesContext(connection) as one:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        for month in range(2, 6):
+            for contract in self.contracts:
+                create_invoice(contract, datetime.date(2024, month, 1))
+        with self.assertNumQueries(len(one)):
+            response = self.client.get(url)
+        self.assertContains(response, 'PA-admin-invoices')
 
-# Create your tests here.
+    def test_no_payment_free_mark_paid_action(self):
+        # Оплата без платежного документа из админки не проводится
+        response = self.client.get(
+            reverse('admin:billing_invoice_changelist')
+        )
+        self.assertNotContains(response, 'mark_paid')
@@ -7,4 +7,5 @@ app_name = 'billing'
 
 urlpatterns = [
     path('', TemplateView.as_view(template_name='list.html'), name='list'),
+    path('export/', views.InvoiceExportView.as_view(), name='export'),
 ]
\ No newline at end of file
@@ -1,3 +1,22 @@
-from django.shortcuts import render
+from twokvolts.exports import StreamingExportView
+from .models import Invoice, InvoiceArchive
 
-# Create your views here.
+
+class InvoiceExportView(StreamingExportView):
+    """Выгрузка счетов"""
+    model = Invoice
+    fields = (('invoice', 'id'),
+              ('contract_number', 'contract__contract_number'),
+              ('period', 'period'),
+              ('consumption', 'consumption'),
+              ('amount', 'amount'),
+              ('paid_total', 'paid_total'),
+              ('status', 'status'),
+              ('issue_date', 'issue_date'),
+              ('due_date', 'due_date'))
+    # Порядок уникального индекса (contract, period)
+    ordering = ('contract_id', 'period')
+    consumer_lookup = 'contract__consumer'
+    date_field = 'period'
+    filename = 'invoices'
+    archive_model = InvoiceArchive
@@ -0,0 +1,101 @@
+# consumers/activity.py
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import Case, F, When
+from django.utils import timezone
+
+from .models import Consumer
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityTracker:
+    """Отметки активности пользователей с буферизацией записи.
+
+    Каждый процесс фиксирует пользователя не чаще раза в ``interval``
+    секунд и раз в ``flush_interval`` секунд записывает накопленные
+    отметки в ``Consumer.last_seen`` одним UPDATE.
+    """
+
+    batch_size = 500
+
+    def __init__(self, interval, flush_interval):
+        self.interval = interval
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.seen = {}  # user_id -> (time.monotonic(), datetime)
+        self.pending = {}  # user_id -> datetime, еще не записано в базу
+        self.last_flush = time.monotonic()
+
+    def touch(self, user_id):
+        now = time.monotonic()
+        with self.lock:
+            recorded = self.seen.get(user_id)
+            if recorded and now - recorded[0] < self.interval:
+                return
+            seen_at = timezone.now()
+            self.seen[user_id] = (now, seen_at)
+            self.pending[user_id] = seen_at
+            due = now - self.last_flush >= self.flush_interval
+        if due:
+            self.flush_safely()
+
+    def last_seen(self, user_id):
+        recorded = self.seen.get(user_id)
+        return recorded[1] if recorded else None
+
+    def flush(self):
+        now = time.monotonic()
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.last_flush = now
+            # Давно неактивные пользователи больше не нужны для троттлинга
+            self.seen = {
+                user_id: recorded for user_id, recorded in self.seen.items()
+                if now - recorded[0] < self.interval
+            }
+        items = list(pending.items())
+        for start in range(0, len(items), self.batch_size):
+            batch = dict(items[start:start + self.batch_size])
+            try:
+                Consumer.objects.filter(user_id__in=batch).update(
+                    last_seen=Case(
+                        *[When(user_id=user_id, then=seen_at)
+                          for user_id, seen_at in batch.items()],
+                        default=F('last_seen')
+                    )
+                )
+            except DatabaseError:
+                # Незаписанные отметки ждут следующего сброса,
+                # более новые отметки тех же пользователей важнее
+                with self.lock:
+                    for user_id, seen_at in items[start:]:
+                        self.pending.setdefault(user_id, seen_at)
+                raise
+
+    def flush_safely(self):
+        """Сброс из запроса: ошибка базы не доходит до пользователя"""
+        try:
+            # Точка сохранения: упавший UPDATE не портит транзакцию запроса
+            with transaction.atomic():
+                self.flush()
+        except DatabaseError:
+            logger.exception('Не удалось сохранить отметки активности')
+
+
+def _flush_at_exit():
+    try:
+        tracker.flush()
+    except Exception as error:
+        # База при выходе может быть уже недоступна (в тестах — закрыта)
+        logger.warning('Не удалось сохранить отметки активности: %s', error)
+
+
+tracker = ActivityTracker(settings.ACTIVITY_TRACKING_INTERVAL,
+                          settings.ACTIVITY_FLUSH_INTERVAL)
+atexit.register(_flush_at_exit)
@@ -1,4 +1,22 @@
 from django.contrib import admin
 from .models import Consumer
 
-admin.site.register(Consumer)
+
+class OnlineFilter(admin.SimpleListFilter):
+    title = 'активность'
+    parameter_name = 'online'
+
+    def lookups(self, request, model_admin):
+        return [('yes', 'Сейчас онлайн')]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'yes':
+            return queryset.online()
+        return queryset
+
+
+@admin.register(Consumer)
+class ConsumerAdmin(admin.ModelAdmin):
+    list_display = ['personal_account', 'full_name', 'type', 'last_seen']
+    list_filter = [OnlineFilter, 'type']
+    search_fields = ['personal_account']
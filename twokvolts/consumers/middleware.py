@@ -1,7 +1,43 @@
 # consumers/middleware.py
-import time
 from django.utils.deprecation import MiddlewareMixin
-from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+from contracts.models import Contract
+from .activity import tracker
+from .models import Consumer
+
+
+def get_consumer(request):
+    """Профиль потребителя текущего пользователя (один запрос на запрос)"""
+    if not hasattr(request, '_cached_consumer'):
+        consumer = None
+        if request.user.is_authenticated:
+            consumer = Consumer.objects.filter(user=request.user).first()
+        request._cached_consumer = consumer
+    return request._cached_consumer
+
+
+def get_active_contract_ids(request):
+    """Список id активных договоров текущего потребителя"""
+    if not hasattr(request, '_cached_active_contract_ids'):
+        consumer = get_consumer(request)
+        request._cached_active_contract_ids = list(
+            Contract.objects.filter(
+                consumer=consumer,
+                is_active=True
+            ).values_list('id', flat=True)
+        ) if consumer else []
+    return request._cached_active_contract_ids
+
+
+class ConsumerMiddleware(MiddlewareMixin):
+    """Ленивые request.consumer и request.active_contract_ids"""
+
+    def process_request(self, request):
+        request.consumer = SimpleLazyObject(lambda: get_consumer(request))
+        request.active_contract_ids = SimpleLazyObject(
+            lambda: get_active_contract_ids(request)
+        )
 
 
 class UserActivityMiddleware(MiddlewareMixin):
@@ -9,5 +45,4 @@ class UserActivityMiddleware(MiddlewareMixin):
 
     def process_request(self, request):
         if request.user.is_authenticated:
-            cache_key = f'user_activity_{request.user.id}'
-            cache.set(cache_key, time.time(), 300)  # 5 минут
+            tracker.touch(request.user.id)
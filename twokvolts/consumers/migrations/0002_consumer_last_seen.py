@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-18 10:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consumers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consumer',
+            name='last_seen',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-18 10:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consumers', '0002_consumer_last_seen'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consumer',
+            name='unread_notifications',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
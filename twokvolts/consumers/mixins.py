@@ -0,0 +1,18 @@
+# consumers/mixins.py
+from django.http import Http404
+
+from .middleware import get_active_contract_ids, get_consumer
+
+
+class ConsumerMixin:
+    """Доступ к потребителю текущего запроса из представлений"""
+
+    def get_consumer(self):
+        consumer = get_consumer(self.request)
+        if consumer is None:
+            raise Http404('Профиль потребителя не найден')
+        return consumer
+
+    def get_contract_ids(self):
+        self.get_consumer()
+        return get_active_contract_ids(self.request)
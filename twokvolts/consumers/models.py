@@ -1,9 +1,23 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 User = get_user_model()
 
 
+class ConsumerQuerySet(models.QuerySet):
+
+    def online(self, window=None):
+        """Потребители, активные за последние ``window`` секунд"""
+        window = window or settings.ACTIVITY_ONLINE_WINDOW
+        return self.filter(
+            last_seen__gte=timezone.now() - timedelta(seconds=window)
+        ).order_by('-last_seen')
+
+
 class Consumer(models.Model):
     USER_TYPE_CHOICES = [
         ('individual', 'Физическое лицо'),
@@ -18,6 +32,15 @@ class Consumer(models.Model):
     phone = models.CharField(max_length=20)
     personal_account = models.CharField(max_length=50, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(null=True, blank=True, db_index=True)
+    # Счетчик непрочитанных уведомлений для шапки сайта
+    unread_notifications = models.PositiveIntegerField(default=0)
+
+    objects = ConsumerQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.personal_account} - {self.full_name}"
+
+    @property
+    def recent_notifications(self):
+        return self.notifications.all()[:5]
@@ -1,3 +1,96 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from dashboard.context_processors import dashboard_context
+from meter_readings.tests import create_consumer
+from .activity import ActivityTracker, tracker
+from .models import Consumer
+
+
+class ActivityTrackerTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [create_consumer(f'active{n}')[0] for n in range(3)]
+
+    def test_writes_are_throttled_and_flushed_in_bulk(self):
+        activity = ActivityTracker(interval=60, flush_interval=3600)
+        with self.assertNumQueries(0):
+            for _ in range(10):
+                for user in self.users[:2]:
+                    activity.touch(user.id)
+        self.assertEqual(len(activity.pending), 2)
+
+        with self.assertNumQueries(1):
+            activity.flush()
+        self.assertEqual(activity.pending, {})
+        self.assertEqual(
+            set(Consumer.objects.online().values_list('user_id', flat=True)),
+            {self.users[0].id, self.users[1].id}
+        )
+
+    def test_middleware_does_not_touch_cache_or_db(self):
+        self.client.force_login(self.users[2])
+        self.addCleanup(tracker.pending.clear)
+        with mock.patch.object(tracker, 'flush_interval', 3600), \
+                mock.patch('django.core.cache.cache.set') as cache_set:
+            response = self.client.get(reverse('home'))
+        cache_set.assert_not_called()
+        self.assertTrue(response.context['is_user_active'])
+        self.assertIsNotNone(tracker.last_seen(self.users[2].id))
+
+    def test_activity_from_other_process_is_visible(self):
+        user = self.users[0]
+        Consumer.objects.filter(user=user).update(last_seen=timezone.now())
+        request = RequestFactory().get('/')
+        request.user = user
+        # Этот процесс пользователя не видел, отметка есть только в базе
+        with mock.patch.object(tracker, 'seen', {}):
+            context = dashboard_context(request)
+        self.assertTrue(context['is_user_active'])
+
+    def test_flush_errors_do_not_reach_request(self):
+        activity = ActivityTracker(interval=60, flush_interval=0)
+        with mock.patch('consumers.activity.Consumer.objects.filter',
+                        side_effect=DatabaseError('нет связи')), \
+                self.assertLogs('consumers.activity', 'ERROR'):
+            activity.touch(self.users[0].id)
+        # Отметка не потеряна и уйдет со следующим сбросом
+        self.assertIn(self.users[0].id, activity.pending)
+        activity.flush()
+        self.assertIsNotNone(
+            Consumer.objects.get(user=self.users[0]).last_seen
+        )
+
+
+class ConsumerResolverTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.contracts = create_consumer('resolver', contracts=2)
+
+    def test_each_page_resolves_consumer_once(self):
+        self.client.force_login(self.user)
+        for name in ['meter_readings:list', 'meter_readings:submit',
+                     'meter_readings:bulk_submit', 'dashboard',
+                     'dashboard_overview', 'consumption_stats']:
+            with self.subTest(page=name), \
+                    CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse(name))
+                self.assertEqual(response.status_code, 200)
+                lookups = [q for q in ctx.captured_queries
+                           if 'FROM "consumers_consumer"' in q['sql']]
+                self.assertEqual(len(lookups), 1)
+
+    def test_user_without_consumer_gets_404(self):
+        self.client.force_login(get_user_model().objects.create_user(
+            username='operator', password='pass'
+        ))
+        response = self.client.get(reverse('meter_readings:list'))
+        self.assertEqual(response.status_code, 404)
@@ -1,5 +1,21 @@
 from django.contrib import admin
-from .models import Tariff, Contract
+from .models import Tariff, TariffTier, TariffZone, Contract
 
-admin.site.register(Tariff)
-admin.site.register(Contract)
\ No newline at end of file
+
+class TariffTierInline(admin.TabularInline):
+    model = TariffTier
+    extra = 0
+
+
+class TariffZoneInline(admin.TabularInline):
+    model = TariffZone
+    extra = 0
+
+
+@admin.register(Tariff)
+class TariffAdmin(admin.ModelAdmin):
+    list_display = ('name', 'rate', 'is_active')
+    inlines = [TariffTierInline, TariffZoneInline]
+
+
+admin.site.register(Contract)
@@ -0,0 +1,49 @@
+# Generated by Django 3.2.16 on 2026-10-18 10:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.expressions
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TariffZone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('starts_at', models.TimeField()),
+                ('ends_at', models.TimeField()),
+                ('rate', models.DecimalField(decimal_places=4, max_digits=10)),
+                ('tariff', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='zones', to='contracts.tariff')),
+            ],
+            options={
+                'ordering': ['tariff', 'starts_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TariffTier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('up_to', models.DecimalField(blank=True, decimal_places=4, max_digits=12, null=True)),
+                ('rate', models.DecimalField(decimal_places=4, max_digits=10)),
+                ('tariff', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tiers', to='contracts.tariff')),
+            ],
+            options={
+                'ordering': ['tariff', django.db.models.expressions.OrderBy(django.db.models.expressions.F('up_to'), nulls_last=True)],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='tariffzone',
+            constraint=models.UniqueConstraint(fields=('tariff', 'name'), name='tariff_zone_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='tarifftier',
+            constraint=models.UniqueConstraint(fields=('tariff', 'up_to'), name='tariff_tier_unique'),
+        ),
+    ]
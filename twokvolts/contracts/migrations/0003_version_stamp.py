@@ -0,0 +1,30 @@
+# Generated by Django 3.2.16 on 2026-10-18 11:24
+
+import time
+
+from django.db import migrations, models
+
+
+def create_tariffs_stamp(apps, schema_editor):
+    # Метка нужна для Last-Modified страницы тарифов с первого запроса
+    VersionStamp = apps.get_model('contracts', 'VersionStamp')
+    VersionStamp.objects.create(key='contracts:tariffs',
+                                version=time.time_ns())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0002_tariff_tiers_zones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionStamp',
+            fields=[
+                ('key', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField()),
+            ],
+        ),
+        migrations.RunPython(create_tariffs_stamp, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import F
 from consumers.models import Consumer
 
 
@@ -22,3 +23,52 @@ class Contract(models.Model):
     is_active = models.BooleanField(default=True)
     meter_number = models.CharField(max_length=50)
     meter_installation_date = models.DateField()
+
+
+class TariffTier(models.Model):
+    """Блок ступенчатого тарифа (социальная норма, сверх нормы)"""
+
+    tariff = models.ForeignKey(Tariff,
+                               on_delete=models.CASCADE,
+                               related_name='tiers')
+    up_to = models.DecimalField(max_digits=12, decimal_places=4,
+                                null=True, blank=True)  # Пусто - без границы
+    rate = models.DecimalField(max_digits=10,
+                               decimal_places=4)  # Цена за кВт*ч в блоке
+
+    class Meta:
+        ordering = ['tariff', F('up_to').asc(nulls_last=True)]
+        constraints = [
+            models.UniqueConstraint(fields=['tariff', 'up_to'],
+                                    name='tariff_tier_unique'),
+        ]
+
+
+class TariffZone(models.Model):
+    """Зона суток тарифа (день, ночь, пик)"""
+
+    tariff = models.ForeignKey(Tariff,
+                               on_delete=models.CASCADE,
+                               related_name='zones')
+    name = models.CharField(max_length=50)
+    starts_at = models.TimeField()
+    ends_at = models.TimeField()  # Может быть раньше начала (ночь)
+    rate = models.DecimalField(max_digits=10,
+                               decimal_places=4)  # Цена за кВт*ч в зоне
+
+    class Meta:
+        ordering = ['tariff', 'starts_at']
+        constraints = [
+            models.UniqueConstraint(fields=['tariff', 'name'],
+                                    name='tariff_zone_unique'),
+        ]
+
+
+class VersionStamp(models.Model):
+    """Метка версии данных для кэшей и ETag, общая для всех воркеров"""
+
+    key = models.CharField(max_length=100, primary_key=True)
+    version = models.BigIntegerField()  # Наносекунды времени изменения
+
+    def __str__(self):
+        return f"{self.key}: {self.version}"
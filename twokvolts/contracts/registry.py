@@ -0,0 +1,61 @@
+# contracts/registry.py
+import threading
+
+from twokvolts.versions import bump_versions, cached_version
+from .models import Tariff
+
+VERSION_KEY = 'contracts:tariffs'
+
+# Тарифы, загруженные этим процессом, и версия, к которой они относятся
+_state = {'version': None, 'tariffs': {}}
+_lock = threading.Lock()
+
+
+def tariffs_version():
+    """Общая для всех воркеров метка версии тарифов.
+
+    Берется из кэша на VERSION_CACHE_TIMEOUT, при промахе — 1 запрос.
+    """
+    return cached_version(VERSION_KEY)
+
+
+def bump_tariffs_version():
+    """Новая версия тарифов после фиксации транзакции"""
+    bump_versions([VERSION_KEY])
+
+
+def _load(version):
+    tariffs = {
+        tariff.pk: tariff for tariff in Tariff.objects.prefetch_related(
+            'tiers', 'zones'
+        ).order_by('id')
+    }
+    with _lock:
+        _state['tariffs'] = tariffs
+        _state['version'] = version
+    return tariffs
+
+
+def _tariffs(version=None):
+    version = version or tariffs_version()
+    if _state['version'] != version:
+        return _load(version)
+    return _state['tariffs']
+
+
+def get_tariffs(version=None):
+    """Все тарифы по порядку id из памяти процесса.
+
+    ``version`` — уже прочитанная вызывающим версия тарифов.
+    """
+    return list(_tariffs(version).values())
+
+
+def get_tariff(pk):
+    """Тариф по id; неизвестный id заставляет перечитать таблицу"""
+    tariff = _tariffs().get(pk)
+    if tariff is None:
+        tariff = _load(_state['version']).get(pk)
+        if tariff is None:
+            raise Tariff.DoesNotExist(f'Тариф #{pk} не найден')
+    return tariff
@@ -0,0 +1,16 @@
+# contracts/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Tariff, TariffTier, TariffZone
+from .registry import bump_tariffs_version
+
+
+@receiver(post_save, sender=Tariff)
+@receiver(post_delete, sender=Tariff)
+@receiver(post_save, sender=TariffTier)
+@receiver(post_delete, sender=TariffTier)
+@receiver(post_save, sender=TariffZone)
+@receiver(post_delete, sender=TariffZone)
+def invalidate_tariffs(sender, instance, **kwargs):
+    bump_tariffs_version()
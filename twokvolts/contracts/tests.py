@@ -1,3 +1,98 @@
+from decimal import Decimal
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+
+from twokvolts.testing import QueryBudgetTestCase, seed_dataset
+from . import registry
+from .models import Tariff
+from .registry import get_tariff, get_tariffs
+
+
+def reset_registry():
+    # Тарифы тестов создаются без смены версии, которая живет в базе
+    cache.clear()
+    registry._state['version'] = None
+
+
+class TariffRegistryTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tariff = Tariff.objects.create(name='Дневной',
+                                           rate=Decimal('6.0000'))
+
+    def setUp(self):
+        reset_registry()
+
+    def test_reads_once_until_tariff_changes(self):
+        self.assertEqual(get_tariff(self.tariff.pk).rate, Decimal('6'))
+        # Версия берется из кэша, база не нужна
+        with self.assertNumQueries(0):
+            self.assertEqual([t.pk for t in get_tariffs()], [self.tariff.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tariff.rate = Decimal('6.5')
+            self.tariff.save()
+        # Новая версия сразу попадает в кэш
+        with self.assertNumQueries(3):
+            self.assertEqual(get_tariff(self.tariff.pk).rate, Decimal('6.5'))
+
+        # Другой воркер с пустым кэшем берет версию из базы
+        reset_registry()
+        with self.assertNumQueries(4):
+            self.assertEqual(get_tariff(self.tariff.pk).rate, Decimal('6.5'))
+        with self.assertNumQueries(0):
+            get_tariffs()
+
+    def test_unknown_id(self):
+        with self.assertRaises(Tariff.DoesNotExist):
+            get_tariff(0)
+
+
+class TariffsPageCacheTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tariff = Tariff.objects.create(name='Ночной',
+                                           rate=Decimal('3.0000'))
+
+    def setUp(self):
+        reset_registry()
+
+    def test_anonymous_page_is_cached(self):
+        url = reverse('tariffs')
+        response = self.client.get(url)
+        self.assertContains(response, 'Ночной')
+        self.assertIn('public', response['Cache-Control'])
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+            HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tariff.name = 'Ночной плюс'
+            self.tariff.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertContains(response, 'Ночной плюс')
+
+
+class TariffsQueryBudgetTest(QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_dataset(consumers=5)
+
+    def setUp(self):
+        reset_registry()
 
-# Create your tests here.
+    def test_tariffs_page(self):
+        self.assertQueryBudget(reverse('tariffs'), 4)
+        self.assertQueryBudget(reverse('tariffs'), 0)
+        self.client.force_login(self.user)
+        self.assertQueryBudget(reverse('tariffs'), 9)
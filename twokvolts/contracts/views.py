@@ -1,9 +1,60 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date
 from django.views.generic import ListView
+
 from .models import Tariff
+from .registry import get_tariffs, tariffs_version
+
+PAGE_KEY = 'contracts:tariffs:page'
+
+
+def _is_stateless(request):
+    """Запрос без сессии и сообщений: страница одинакова для всех"""
+    return not (request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+                or request.COOKIES.get('messages'))
 
 
 class TariffsListView(ListView):
     template_name = 'pages/tariffs.html'
     model = Tariff
     context_object_name = "all_tariffs"
+
+    version = None
+
+    def get_queryset(self):
+        return get_tariffs(self.version)
+
+    def get(self, request, *args, **kwargs):
+        if not _is_stateless(request):
+            # Пользователю показываются его договоры
+            return super().get(request, *args, **kwargs)
+
+        # Анонимам отдается готовая страница текущей версии тарифов
+        version = self.version = tariffs_version()
+        etag = f'"tariffs-{version}"'
+        last_modified = version // 10 ** 9
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            key = f'{PAGE_KEY}:{version}'
+            content = cache.get(key)
+            if content is None:
+                response = super().get(request, *args, **kwargs).render()
+                if response.cookies:
+                    return response
+                content = response.content
+                cache.set(key, content,
+                          timeout=settings.TARIFFS_PAGE_CACHE_TIMEOUT)
+            response = HttpResponse(content)
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, public=True,
+                            max_age=settings.TARIFFS_PAGE_MAX_AGE)
+        patch_vary_headers(response, ('Cookie',))
+        return response
@@ -1,16 +1,32 @@
 # dashboard/context_processors.py
-from django.core.cache import cache
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from consumers.activity import tracker
+from consumers.middleware import get_consumer
+
 
 def dashboard_context(request):
     """Добавляет контекст для всех шаблонов dashboard"""
     context = {}
     
     if request.user.is_authenticated:
-        # Проверяем активность пользователя
-        cache_key = f'user_activity_{request.user.id}'
-        last_activity = cache.get(cache_key)
+        # Сохраненная отметка видна всем процессам; своя, еще не
+        # записанная в базу, бывает свежее
+        consumer = get_consumer(request)
+        last_activity = max(
+            filter(None, [consumer and consumer.last_seen,
+                          tracker.last_seen(request.user.id)]),
+            default=None
+        )
+        window = timedelta(seconds=settings.ACTIVITY_ONLINE_WINDOW)
         
         context['last_activity'] = last_activity
-        context['is_user_active'] = last_activity is not None
+        context['is_user_active'] = (
+            last_activity is not None
+            and timezone.now() - last_activity < window
+        )
     
-    return context
\ No newline at end of file
+    return context
@@ -0,0 +1,67 @@
+# dashboard/management/commands/bench_dashboard.py
+import asyncio
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from consumers.models import Consumer
+from dashboard.summary import abuild_home_summary, build_home_summary
+from twokvolts.concurrency import close_pool_connections
+
+
+class Command(BaseCommand):
+    help = ('Сравнение последовательной и параллельной сборки главной '
+            'страницы при медленной базе')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delay', type=float, default=0.02,
+                            help='Добавочная задержка на каждый запрос, с')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--consumer', type=int,
+                            help='id потребителя (по умолчанию первый)')
+
+    def handle(self, *args, **options):
+        consumers = Consumer.objects.filter(contracts__is_active=True)
+        if options['consumer']:
+            consumers = consumers.filter(pk=options['consumer'])
+        consumer = consumers.order_by('pk').first()
+        if consumer is None:
+            raise CommandError('Нет потребителя с активными договорами')
+
+        delay = options['delay']
+        queries = []
+
+        def slow(execute, sql, params, many, context):
+            queries.append(sql)
+            time.sleep(delay)
+            return execute(sql, params, many, context)
+
+        async def build_async():
+            # В асинхронном коде у соединения свои обертки
+            with connection.execute_wrapper(slow):
+                return await abuild_home_summary(consumer)
+
+        timings = {'sync': [], 'async': []}
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            with connection.execute_wrapper(slow):
+                expected = build_home_summary(consumer)
+            timings['sync'].append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            actual = asyncio.run(build_async())
+            timings['async'].append(time.perf_counter() - started)
+            if actual != expected:
+                raise CommandError('Контекст страниц различается')
+        close_pool_connections()
+
+        sync = statistics.median(timings['sync']) * 1000
+        parallel = statistics.median(timings['async']) * 1000
+        per_build = len(queries) // (2 * options['repeat'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Запросов на сборку {per_build}, задержка {delay * 1000:.0f} мс: '
+            f'последовательно {sync:.0f} мс, параллельно {parallel:.0f} мс '
+            f'(медиана из {options["repeat"]})'
+        ))
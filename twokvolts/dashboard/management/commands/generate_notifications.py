@@ -0,0 +1,37 @@
+# dashboard/management/commands/generate_notifications.py
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.notifications import (generate_notifications,
+                                     refresh_unread_counts)
+
+
+class Command(BaseCommand):
+    help = 'Создание уведомлений о новых, скоро и уже просроченных счетах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Расчетная дата YYYY-MM-DD')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--recount', action='store_true',
+            help='Пересчитать счетчики непрочитанных у всех потребителей'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            today = (datetime.date.fromisoformat(options['date'])
+                     if options['date'] else None)
+        except ValueError:
+            raise CommandError('Дата должна быть в формате YYYY-MM-DD')
+
+        started = time.monotonic()
+        created = generate_notifications(today, options['batch_size'])
+        if options['recount']:
+            refresh_unread_counts()
+        self.stdout.write(self.style.SUCCESS(
+            'Создано уведомлений: ' + ', '.join(
+                f'{kind} {count}' for kind, count in created.items()
+            ) + f' за {time.monotonic() - started:.1f} с'
+        ))
@@ -0,0 +1,43 @@
+# dashboard/management/commands/rebuild_consumption_rollup.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from contracts.models import Contract
+from dashboard.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Пересборка помесячных итогов потребления из счетов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Договоров в одной транзакции')
+        parser.add_argument('--contract', type=int, action='append',
+                            help='Пересобрать только указанные договоры')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        contracts = Contract.objects.order_by('id').values_list(
+            'id', flat=True
+        )
+        if options['contract']:
+            contracts = contracts.filter(id__in=options['contract'])
+
+        rows = 0
+        last_id = 0
+        while True:
+            batch = list(contracts.filter(
+                id__gt=last_id
+            )[:options['batch_size']])
+            if not batch:
+                break
+            rows += rebuild_rollups(batch)
+            last_id = batch[-1]
+            if options['verbosity'] >= 2:
+                self.stdout.write(f'Договоры до id {last_id}: {rows} строк')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересобрано строк итогов: {rows} '
+            f'за {time.monotonic() - started:.1f} с'
+        ))
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.16 on 2026-10-18 10:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('contracts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyConsumption',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('consumption', models.DecimalField(decimal_places=4, default=0, max_digits=14)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('invoices_count', models.PositiveIntegerField(default=0)),
+                ('contract', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_consumption', to='contracts.contract')),
+            ],
+            options={
+                'ordering': ['month'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='monthlyconsumption',
+            constraint=models.UniqueConstraint(fields=('contract', 'month'), name='monthly_consumption_unique'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.16 on 2026-10-18 10:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0002_billing_run'),
+        ('consumers', '0003_consumer_unread_notifications'),
+        ('dashboard', '0001_monthly_consumption'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('overdue', 'Просроченный счет'), ('upcoming', 'Скоро срок оплаты'), ('new_invoice', 'Новый счет')], max_length=20)),
+                ('dedup_key', models.CharField(max_length=100, unique=True)),
+                ('message', models.CharField(max_length=255)),
+                ('date', models.DateField()),
+                ('is_read', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('consumer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='consumers.consumer')),
+                ('invoice', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='billing.invoice')),
+            ],
+            options={
+                'ordering': ['-date', '-id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['consumer', '-date', '-id'], name='notification_feed_idx'),
+        ),
+    ]
@@ -1,4 +1,76 @@
 from django.db import models
+from django.urls import reverse
 
+from billing.models import Invoice
+from consumers.models import Consumer
+from contracts.models import Contract
 
 
+class MonthlyConsumption(models.Model):
+    """Помесячный итог по договору, поддерживается из счетов"""
+    contract = models.ForeignKey(Contract,
+                                 on_delete=models.CASCADE,
+                                 related_name='monthly_consumption')
+    month = models.DateField()  # Первый день месяца
+    consumption = models.DecimalField(max_digits=14,
+                                      decimal_places=4, default=0)
+    amount = models.DecimalField(max_digits=14,
+                                 decimal_places=2, default=0)
+    invoices_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['month']
+        constraints = [
+            models.UniqueConstraint(fields=['contract', 'month'],
+                                    name='monthly_consumption_unique'),
+        ]
+
+
+class Notification(models.Model):
+    """Уведомление потребителя, создается пакетным генератором"""
+    KIND_CHOICES = [
+        ('overdue', 'Просроченный счет'),
+        ('upcoming', 'Скоро срок оплаты'),
+        ('new_invoice', 'Новый счет'),
+    ]
+    LEVELS = {
+        'overdue': 'warning',
+        'upcoming': 'info',
+        'new_invoice': 'success',
+    }
+    consumer = models.ForeignKey(Consumer,
+                                 on_delete=models.CASCADE,
+                                 related_name='notifications')
+    invoice = models.ForeignKey(Invoice,
+                                on_delete=models.CASCADE,
+                                null=True, blank=True,
+                                related_name='notifications',
+                                db_constraint=False)  # Счета секционированы
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    dedup_key = models.CharField(max_length=100, unique=True)
+    message = models.CharField(max_length=255)
+    date = models.DateField()  # Дата события для ленты
+    is_read = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-date', '-id']
+        indexes = [
+            models.Index(fields=['consumer', '-date', '-id'],
+                         name='notification_feed_idx'),
+        ]
+
+    def __str__(self):
+        return self.message
+
+    @property
+    def title(self):
+        return self.get_kind_display()
+
+    @property
+    def level(self):
+        return self.LEVELS.get(self.kind, 'info')
+
+    @property
+    def link(self):
+        return reverse('billing:list')
@@ -0,0 +1,119 @@
+# dashboard/notifications.py
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from billing.models import Invoice
+from consumers.models import Consumer
+from .models import Notification
+
+UPCOMING_DAYS = 3  # За сколько дней предупреждать о сроке оплаты
+NEW_INVOICE_DAYS = 7  # Сколько дней счет считается новым
+
+
+def _candidates(kind, today):
+    """Счета, по которым еще нет уведомления вида ``kind``"""
+    invoices = Invoice.objects.exclude(notifications__kind=kind)
+    if kind == 'overdue':
+        invoices = invoices.filter(status='overdue')
+    elif kind == 'upcoming':
+        invoices = invoices.filter(
+            status='issued',
+            due_date__range=[today, today + timedelta(days=UPCOMING_DAYS)]
+        )
+    else:
+        invoices = invoices.filter(
+            issue_date__gte=today - timedelta(days=NEW_INVOICE_DAYS)
+        )
+    return invoices.values_list(
+        'id', 'contract__consumer_id', 'period', 'issue_date', 'due_date'
+    ).order_by('id')
+
+
+def _build(kind, invoice_id, consumer_id, period, issue_date, due_date):
+    if kind == 'overdue':
+        message = f'Счет #{invoice_id} за {period:%m.%Y} просрочен'
+        date = due_date
+    elif kind == 'upcoming':
+        message = (f'Счет #{invoice_id} нужно оплатить '
+                   f'до {due_date:%d.%m.%Y}')
+        date = due_date
+    else:
+        message = f'Выставлен счет #{invoice_id} за {period:%m.%Y}'
+        date = issue_date
+    return Notification(
+        consumer_id=consumer_id, invoice_id=invoice_id, kind=kind,
+        dedup_key=f'{kind}:{invoice_id}', message=message, date=date
+    )
+
+
+def generate_notifications(today=None, batch_size=2000):
+    """Создает недостающие уведомления по счетам.
+
+    Повторный запуск выбирает только счета без уведомления нужного
+    вида, а гонки между запусками гасит уникальный ``dedup_key``.
+    Возвращает число созданных уведомлений по видам.
+    """
+    today = today or timezone.now().date()
+    created = {}
+    consumer_ids = set()
+    for kind, _ in Notification.KIND_CHOICES:
+        batch = []
+        created[kind] = 0
+        for row in _candidates(kind, today).iterator(chunk_size=batch_size):
+            batch.append(_build(kind, *row))
+            if len(batch) >= batch_size:
+                created[kind] += _save(batch, consumer_ids)
+                batch = []
+        created[kind] += _save(batch, consumer_ids)
+    refresh_unread_counts(consumer_ids)
+    return created
+
+
+def _save(batch, consumer_ids):
+    """Сохраняет пачку, возвращает число действительно созданных.
+
+    Уведомления, уже созданные параллельным запуском, отбрасываются
+    по ``dedup_key`` без ошибки и не считаются.
+    """
+    if not batch:
+        return 0
+    existing = Notification.objects.filter(
+        dedup_key__in=[n.dedup_key for n in batch]
+    )
+    with transaction.atomic():
+        before = existing.count()
+        Notification.objects.bulk_create(batch, ignore_conflicts=True)
+        created = existing.count() - before
+    consumer_ids.update(n.consumer_id for n in batch)
+    return created
+
+
+def refresh_unread_counts(consumer_ids=None, batch_size=1000):
+    """Пересчитывает счетчики непрочитанных одним UPDATE на пачку"""
+    unread = Notification.objects.filter(
+        consumer=OuterRef('pk'), is_read=False
+    ).order_by().values('consumer').annotate(total=Count('id'))
+    value = Coalesce(Subquery(unread.values('total'),
+                              output_field=IntegerField()), 0)
+    if consumer_ids is None:
+        return Consumer.objects.update(unread_notifications=value)
+    consumer_ids = sorted(consumer_ids)
+    updated = 0
+    for start in range(0, len(consumer_ids), batch_size):
+        updated += Consumer.objects.filter(
+            id__in=consumer_ids[start:start + batch_size]
+        ).update(unread_notifications=value)
+    return updated
+
+
+def mark_all_read(consumer):
+    with transaction.atomic():
+        Notification.objects.filter(consumer=consumer,
+                                    is_read=False).update(is_read=True)
+        Consumer.objects.filter(pk=consumer.pk).update(
+            unread_notifications=0
+        )
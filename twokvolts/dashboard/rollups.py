@@ -0,0 +1,122 @@
+# dashboard/rollups.py
+from itertools import chain
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+from billing.models import Invoice, InvoiceArchive
+from contracts.models import Contract
+from twokvolts.archive import reaches_archive
+from twokvolts.dates import next_month_start
+from .models import MonthlyConsumption
+
+
+def month_of(day):
+    return day.replace(day=1)
+
+
+def _aggregate(contract_ids, date_from=None, date_to=None):
+    """Итоги по (договор, месяц) из счетов и их архива.
+
+    Оплаченные счета закрытых периодов лежат в InvoiceArchive, без него
+    пересчет стер бы итоги прошлых лет. ``date_to`` — не включительно.
+    """
+    invoices = Invoice.objects.filter(contract_id__in=contract_ids)
+    if date_from:
+        invoices = invoices.filter(period__gte=date_from)
+    if date_to:
+        invoices = invoices.filter(period__lt=date_to)
+    rows = invoices.annotate(
+        month=TruncMonth('period')
+    ).values('contract_id', 'month').annotate(
+        consumption=Sum('consumption'),
+        amount=Sum('amount'),
+        invoices_count=Count('id')
+    ).order_by().values_list('contract_id', 'month', 'consumption',
+                             'amount', 'invoices_count')
+    if reaches_archive(date_from):
+        rows = chain(rows, _archived(contract_ids, date_from, date_to))
+
+    totals = {}
+    for contract_id, month, consumption, amount, count in rows:
+        key = (contract_id, month)
+        if key in totals:
+            prev = totals[key]
+            consumption += prev.consumption
+            amount += prev.amount
+            count += prev.invoices_count
+        totals[key] = MonthlyConsumption(
+            contract_id=contract_id, month=month, consumption=consumption,
+            amount=amount, invoices_count=count
+        )
+    return list(totals.values())
+
+
+def _archived(contract_ids, date_from=None, date_to=None):
+    """Итоги архивных счетов по месяцам, массивы разворачивает база"""
+    qn = connection.ops.quote_name
+    where, params = ['archive.contract_id = ANY(%s)'], [list(contract_ids)]
+    if date_from:
+        where.append('archive.last_date >= %s AND item.period >= %s')
+        params += [date_from, date_from]
+    if date_to:
+        where.append('archive.first_date < %s AND item.period < %s')
+        params += [date_to, date_to]
+    sql = (
+        f"SELECT archive.contract_id, "
+        f"date_trunc('month', item.period)::date AS month, "
+        f"SUM(item.consumption), SUM(item.amount), COUNT(*) "
+        f"FROM {qn(InvoiceArchive._meta.db_table)} AS archive, "
+        f"unnest(archive.periods, archive.consumption, archive.amounts) "
+        f"AS item(period, consumption, amount) "
+        f"WHERE {' AND '.join(where)} GROUP BY 1, 2"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def refresh_rollups(keys):
+    """Пересчитывает итоги для пар (contract_id, месяц).
+
+    Пересчитывается декартово произведение договоров и месяцев из
+    ``keys`` — одна агрегация по индексу (contract, period) и одна
+    вставка, независимо от числа затронутых счетов.
+    """
+    keys = {(contract_id, month_of(month)) for contract_id, month in keys}
+    if not keys:
+        return
+    contract_ids = {contract_id for contract_id, _ in keys}
+    months = {month for _, month in keys}
+    first, last = min(months), max(months)
+
+    with transaction.atomic():
+        _lock_contracts(contract_ids)
+        MonthlyConsumption.objects.filter(
+            contract_id__in=contract_ids,
+            month__in=months
+        ).delete()
+        rows = [row for row in _aggregate(contract_ids, first,
+                                          next_month_start(last))
+                if row.month in months]
+        MonthlyConsumption.objects.bulk_create(rows, batch_size=2000)
+
+
+def rebuild_rollups(contract_ids):
+    """Полностью пересобирает итоги указанных договоров"""
+    with transaction.atomic():
+        _lock_contracts(contract_ids)
+        MonthlyConsumption.objects.filter(
+            contract_id__in=contract_ids
+        ).delete()
+        rows = _aggregate(contract_ids)
+        MonthlyConsumption.objects.bulk_create(rows, batch_size=2000)
+    return len(rows)
+
+
+def _lock_contracts(contract_ids):
+    # Параллельные пересчеты одного договора выполняются по очереди
+    list(Contract.objects.select_for_update().filter(
+        id__in=contract_ids
+    ).order_by('id').values_list('id', flat=True))
@@ -0,0 +1,52 @@
+# dashboard/signals.py
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from billing.models import Invoice
+from contracts.models import Contract
+from meter_readings.models import MeterReading
+from payments.models import Payment
+from .rollups import month_of, refresh_rollups
+from .summary import invalidate_for_contracts, invalidate_home_summary
+
+
+def _rollup_key(invoice):
+    if invoice.contract_id is None or invoice.period is None:
+        return None
+    return invoice.contract_id, month_of(invoice.period)
+
+
+@receiver(post_init, sender=Invoice)
+def remember_rollup_key(sender, instance, **kwargs):
+    # Нужен, чтобы при переносе счета обновить и прежний месяц
+    instance._rollup_key = _rollup_key(instance)
+
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Invoice)
+def update_rollup(sender, instance, **kwargs):
+    keys = {instance._rollup_key, _rollup_key(instance)} - {None}
+    instance._rollup_key = _rollup_key(instance)
+    refresh_rollups(keys)
+
+
+@receiver(post_save, sender=Contract)
+@receiver(post_delete, sender=Contract)
+def invalidate_contract_summary(sender, instance, **kwargs):
+    invalidate_home_summary([instance.consumer_id])
+
+
+@receiver(post_save, sender=MeterReading)
+@receiver(post_delete, sender=MeterReading)
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Invoice)
+def invalidate_reading_summary(sender, instance, **kwargs):
+    invalidate_for_contracts([instance.contract_id])
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def invalidate_payment_summary(sender, instance, **kwargs):
+    invalidate_home_summary(Invoice.objects.filter(
+        id=instance.invoice_id
+    ).values_list('contract__consumer_id', flat=True))
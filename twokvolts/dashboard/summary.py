@@ -0,0 +1,215 @@
+# dashboard/summary.py
+import asyncio
+import time
+
+from asgiref.sync import async_to_sync, sync_to_async
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from billing.models import OPEN_STATUSES, Invoice
+from contracts.models import Contract
+from meter_readings.models import MeterReading
+from payments.models import Payment
+from twokvolts.concurrency import run_query
+from twokvolts.replicas import pin_if_recent
+from twokvolts.versions import bump_versions, get_version
+
+KEY_PREFIX = 'dashboard:home'
+STATS_KEYS = {
+    'hits': f'{KEY_PREFIX}:stats:hits',
+    'misses': f'{KEY_PREFIX}:stats:misses',
+    'waits': f'{KEY_PREFIX}:stats:waits',
+}
+
+
+def active_contracts(consumer):
+    return list(Contract.objects.filter(
+        consumer=consumer,
+        is_active=True
+    ).select_related('tariff'))
+
+
+def recent_readings(contract_ids):
+    return MeterReading.objects.filter(
+        contract_id__in=contract_ids
+    ).select_related('contract', 'contract__tariff').order_by(
+        '-reading_date'
+    )
+
+
+def latest_readings(contract_ids, count=5):
+    # Обычно хватает секций последнего года, вся история читается,
+    # только если за год показаний меньше ``count``
+    readings = recent_readings(contract_ids)
+    latest = list(readings.within_lookback(timezone.localdate())[:count])
+    if len(latest) < count:
+        latest = list(readings[:count])
+    return latest
+
+
+def current_invoices(contract_ids):
+    return list(Invoice.objects.filter(
+        contract_id__in=contract_ids,
+        status__in=OPEN_STATUSES
+    ).select_related('contract').order_by('due_date')[:3])
+
+
+def recent_payments(contract_ids):
+    return list(Payment.objects.filter(
+        invoice__contract_id__in=contract_ids
+    ).select_related('invoice__contract').order_by('-payment_date')[:5])
+
+
+def total_debt(contract_ids):
+    # Частичные оплаты уменьшают долг
+    return Invoice.objects.filter(
+        contract_id__in=contract_ids,
+        status__in=OPEN_STATUSES
+    ).aggregate(total=Sum(F('amount') - F('paid_total')))['total'] or 0
+
+
+def overdue_invoices(contract_ids):
+    # Статус проставляет команда sweep_overdue
+    return Invoice.objects.filter(
+        contract_id__in=contract_ids,
+        status='overdue'
+    ).count()
+
+
+# Запросы по списку договоров, не зависящие друг от друга
+CONTRACT_QUERIES = {
+    'latest_readings': latest_readings,
+    'current_invoices': current_invoices,
+    'recent_payments': recent_payments,
+    'total_debt': total_debt,
+    'overdue_invoices': overdue_invoices,
+}
+
+
+def build_home_summary(consumer):
+    """Контекст главной страницы кабинета без кэша"""
+    contracts = active_contracts(consumer)
+    contract_ids = [contract.id for contract in contracts]
+    summary = {'active_contracts': contracts}
+    for name, query in CONTRACT_QUERIES.items():
+        summary[name] = query(contract_ids)
+    return summary
+
+
+async def abuild_home_summary(consumer):
+    """То же, но запросы по договорам идут параллельно в пуле потоков"""
+    contracts = await run_query(active_contracts, consumer)
+    contract_ids = [contract.id for contract in contracts]
+    results = await asyncio.gather(*(
+        run_query(query, contract_ids) for query in CONTRACT_QUERIES.values()
+    ))
+    summary = {'active_contracts': contracts}
+    summary.update(zip(CONTRACT_QUERIES, results))
+    return summary
+
+
+def _version_key(consumer_id):
+    return f'consumers:{consumer_id}'
+
+
+def _count(event):
+    try:
+        cache.incr(STATS_KEYS[event])
+    except ValueError:
+        cache.add(STATS_KEYS[event], 1, timeout=None)
+
+
+def data_version(consumer_id):
+    """Метка версии данных потребителя, меняется при каждом изменении.
+
+    Хранится в базе и общая для всех воркеров, поэтому подходит
+    и для других кэшей и ETag по данным потребителя. Пока реплики
+    могут отставать от новой версии, чтения идут в основную базу.
+    """
+    version = get_version(_version_key(consumer_id))
+    pin_if_recent(version)
+    return version
+
+
+def get_home_summary(consumer, build=build_home_summary, version=None):
+    """Контекст главной страницы из кэша.
+
+    Ключ включает поколение потребителя: инвалидация заменяет его
+    новой меткой времени, поэтому расчет, начатый до изменения данных,
+    не перезапишет кэш.
+    При одновременных промахах пересчитывает только один запрос,
+    остальные ждут его результат. ``version`` — уже прочитанная
+    версия данных потребителя.
+    """
+    generation = data_version(consumer.pk) if version is None else version
+    key = (f'{KEY_PREFIX}:{consumer.pk}:{generation}:'
+           f'{timezone.now().date().isoformat()}')
+    summary = cache.get(key)
+    if summary is not None:
+        _count('hits')
+        return summary
+
+    lock_key = f'{key}:lock'
+    timeout = settings.DASHBOARD_CACHE_LOCK_TIMEOUT
+    if not cache.add(lock_key, 1, timeout=timeout):
+        # Пересчет уже идет в другом запросе
+        _count('waits')
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            summary = cache.get(key)
+            if summary is not None:
+                _count('hits')
+                return summary
+
+    _count('misses')
+    try:
+        summary = build(consumer)
+        cache.set(key, summary, timeout=settings.DASHBOARD_CACHE_TIMEOUT)
+    finally:
+        cache.delete(lock_key)
+    return summary
+
+
+async def aget_home_summary(consumer):
+    """Асинхронный вариант :func:`get_home_summary`.
+
+    Работа с кэшем идет в отдельном потоке, чтобы ожидание чужого
+    пересчета не занимало общий поток синхронного кода.
+    """
+    def build(consumer):
+        return async_to_sync(abuild_home_summary)(consumer)
+
+    # Версия читается в пуле: у потоков sync_to_async нет своих
+    # соединений с базой
+    version = await run_query(data_version, consumer.pk)
+    return await sync_to_async(get_home_summary, thread_sensitive=False)(
+        consumer, build, version
+    )
+
+
+def invalidate_home_summary(consumer_ids):
+    """Сбрасывает кэш главной страницы указанных потребителей.
+
+    Срабатывает после фиксации транзакции, иначе параллельный запрос
+    успел бы закэшировать еще не зафиксированное состояние.
+    """
+    bump_versions(_version_key(consumer_id)
+                  for consumer_id in set(consumer_ids) - {None})
+
+
+def invalidate_for_contracts(contract_ids):
+    """То же по списку договоров (один запрос к базе)"""
+    contract_ids = set(contract_ids)
+    if contract_ids:
+        invalidate_home_summary(Contract.objects.filter(
+            id__in=contract_ids
+        ).values_list('consumer_id', flat=True).distinct())
+
+
+def summary_cache_stats():
+    values = cache.get_many(STATS_KEYS.values())
+    return {event: values.get(key, 0) for event, key in STATS_KEYS.items()}
@@ -1,3 +1,480 @@
-from django.test import TestCase
+import contextvars
+import datetime
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import (AsyncRequestFactory, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from billing.models import Invoice
+from billing.overdue import sweep_overdue
+from contracts.models import VersionStamp
+from meter_readings.models import MeterReading
+from meter_readings.tests import create_consumer
+from payments.models import Payment
+from twokvolts.concurrency import close_pool_connections
+from twokvolts.metrics import Registry, render
+from twokvolts.replicas import replica_reads
+from twokvolts.testing import QueryBudgetTestCase, seed_dataset
+from consumers.middleware import ConsumerMiddleware
+from consumers.models import Consumer
+from .models import MonthlyConsumption, Notification
+from .notifications import _save, generate_notifications
+from .rollups import refresh_rollups
+from .summary import (abuild_home_summary, build_home_summary,
+                      get_home_summary, summary_cache_stats)
+from .views import accounts_home_async
+
+
+def create_invoice(contract, period, consumption='100', amount='550',
+                   **kwargs):
+    kwargs.setdefault('due_date', period + datetime.timedelta(days=45))
+    return Invoice.objects.create(
+        contract=contract, period=period,
+        consumption=Decimal(consumption), amount=Decimal(amount), **kwargs
+    )
+
+
+class MonthlyConsumptionTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.contracts = create_consumer('rollup', contracts=2)
+
+    def rollup(self):
+        return list(MonthlyConsumption.objects.order_by(
+            'contract_id', 'month'
+        ).values_list('contract_id', 'month', 'consumption', 'amount',
+                      'invoices_count'))
+
+    def test_invoice_changes_update_rollup(self):
+        first, second = self.contracts
+        january = datetime.date(2024, 1, 1)
+        invoice = create_invoice(first, january)
+        create_invoice(second, january, consumption='10', amount='55')
+        self.assertEqual(self.rollup(), [
+            (first.id, january, Decimal('100'), Decimal('550'), 1),
+            (second.id, january, Decimal('10'), Decimal('55'), 1),
+        ])
+
+        invoice.period = datetime.date(2024, 2, 1)
+        invoice.save()
+        invoice.refresh_from_db()
+        self.assertEqual(self.rollup()[0][1], datetime.date(2024, 2, 1))
+
+        invoice.delete()
+        self.assertEqual(len(self.rollup()), 1)
+
+    def test_stats_page_ignores_out_of_range_year(self):
+        self.client.force_login(self.user)
+        for year in ('0', '9999', '-5'):
+            with self.subTest(year):
+                response = self.client.get(reverse('consumption_stats'),
+                                           {'year': year})
+                self.assertEqual(response.context['selected_year'],
+                                 timezone.now().year)
+
+    def test_rebuild_command(self):
+        create_invoice(self.contracts[0], datetime.date(2024, 1, 1))
+        MonthlyConsumption.objects.all().delete()
+        call_command('rebuild_consumption_rollup', stdout=StringIO())
+        self.assertEqual(len(self.rollup()), 1)
+
+    def test_rebuild_keeps_archived_history(self):
+        contract = self.contracts[0]
+        old = datetime.date(timezone.localdate().year - 6, 3, 1)
+        create_invoice(contract, old, status='paid', paid_total=550)
+        create_invoice(contract, old.replace(year=old.year + 5))
+        expected = self.rollup()
+        call_command('archive_history', stdout=StringIO())
+        self.assertFalse(Invoice.objects.filter(period=old).exists())
+
+        call_command('rebuild_consumption_rollup', stdout=StringIO())
+        self.assertEqual(self.rollup(), expected)
+        refresh_rollups([(contract.id, old)])
+        self.assertEqual(self.rollup(), expected)
+
+    def test_stats_page_reads_rollup_only(self):
+        for month in range(1, 13):
+            for contract in self.contracts:
+                create_invoice(contract, datetime.date(2024, month, 1))
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('consumption_stats'),
+                                       {'year': 2024})
+        self.assertEqual(len(response.context['monthly_stats']), 12)
+        self.assertEqual(response.context['monthly_stats'][0]['amount'],
+                         Decimal('1100'))
+        tables = [q['sql'] for q in ctx.captured_queries]
+        self.assertFalse([sql for sql in tables if 'billing_invoice' in sql])
+        self.assertEqual(
+            len([sql for sql in tables
+                 if 'dashboard_monthlyconsumption' in sql]),
+            1
+        )
+
+
+class HomeSummaryCacheTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.contracts = create_consumer('cached', contracts=2)
+        cls.consumer = cls.user.consumer
+        cls.invoice = create_invoice(cls.contracts[0],
+                                     datetime.date(2024, 1, 1))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_second_request_is_served_from_cache(self):
+        self.client.force_login(self.user)
+        url = reverse('dashboard')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.context['total_debt'], Decimal('550'))
+        self.assertFalse([q for q in ctx.captured_queries
+                          if 'billing_invoice' in q['sql']])
+        self.assertEqual(summary_cache_stats(),
+                         {'hits': 1, 'misses': 1, 'waits': 0})
+
+    def test_writes_invalidate_summary(self):
+        self.assertEqual(get_home_summary(self.consumer)['total_debt'],
+                         Decimal('550'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.create(invoice=self.invoice, amount=550,
+                                   payment_date=datetime.date(2024, 2, 1),
+                                   method='Online')
+        summary = get_home_summary(self.consumer)
+        self.assertEqual(summary['total_debt'], 0)
+        self.assertEqual(len(summary['recent_payments']), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            MeterReading.objects.create(
+                contract=self.contracts[1],
+                reading_date=datetime.date(2024, 2, 1), value=1
+            )
+        self.assertEqual(len(get_home_summary(self.consumer)[
+            'latest_readings'
+        ]), 1)
+
+    def test_invalidation_waits_for_commit(self):
+        get_home_summary(self.consumer)
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.contracts[1].is_active = False
+            self.contracts[1].save()
+            # До фиксации транзакции кэш еще действителен
+            self.assertEqual(
+                len(get_home_summary(self.consumer)['active_contracts']), 2
+            )
+        for callback in callbacks:
+            callback()
+        self.assertEqual(
+            len(get_home_summary(self.consumer)['active_contracts']), 1
+        )
+
+
+class AsyncHomeTest(TransactionTestCase):
+    """Запросы идут из потоков пула, поэтому данные должны быть в базе"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = seed_dataset(consumers=2, months=3)
+        self.consumer = self.user.consumer
+        self.addCleanup(close_pool_connections)
+
+    def test_same_context_as_sync(self):
+        expected = build_home_summary(self.consumer)
+        self.assertTrue(expected['current_invoices'])
+        self.assertEqual(async_to_sync(abuild_home_summary)(self.consumer),
+                         expected)
+
+    def test_view(self):
+        request = AsyncRequestFactory().get(reverse('dashboard'))
+        request.user = self.user
+        ConsumerMiddleware(lambda request: None).process_request(request)
+        response = async_to_sync(accounts_home_async)(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, self.consumer.full_name)
+
+        request.user = AnonymousUser()
+        response = async_to_sync(accounts_home_async)(request)
+        self.assertEqual(response.status_code, 302)
+
+
+class NotificationFeedTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.contracts = create_consumer('feed', contracts=2)
+        cls.consumer = cls.contracts[0].consumer
+        cls.today = timezone.now().date()
+        create_invoice(cls.contracts[0], datetime.date(2024, 1, 1),
+                       due_date=cls.today - datetime.timedelta(days=10))
+        create_invoice(cls.contracts[1], datetime.date(2024, 1, 1),
+                       due_date=cls.today + datetime.timedelta(days=2))
+
+    def unread(self):
+        return Consumer.objects.get(pk=self.consumer.pk).unread_notifications
+
+    def test_generator_is_idempotent(self):
+        sweep_overdue(self.today)
+        created = generate_notifications(self.today)
+        self.assertEqual(created,
+                         {'overdue': 1, 'upcoming': 1, 'new_invoice': 2})
+        self.assertEqual(self.unread(), 4)
+        self.assertEqual(
+            generate_notifications(self.today),
+            {'overdue': 0, 'upcoming': 0, 'new_invoice': 0}
+        )
+        self.assertEqual(Notification.objects.count(), 4)
+
+    def test_concurrent_duplicates_are_not_counted(self):
+        def notification(n):
+            return Notification(consumer=self.consumer, kind='new_invoice',
+                                 dedup_key=f'race:{n}', message=f'#{n}',
+                                 date=self.today)
+
+        # Первое уведомление уже создал параллельный запуск
+        notification(0).save()
+        consumer_ids = set()
+        self.assertEqual(
+            _save([notification(n) for n in range(3)], consumer_ids), 2
+        )
+        self.assertEqual(consumer_ids, {self.consumer.pk})
+
+    def test_keyset_pages(self):
+        Notification.objects.bulk_create([
+            Notification(consumer=self.consumer, kind='new_invoice',
+                         dedup_key=f'test:{n}', message=f'#{n}',
+                         date=datetime.date(2024, 1, 1 + n % 3))
+            for n in range(45)
+        ])
+        self.client.force_login(self.user)
+        url = reverse('notifications')
+        seen = []
+        pages = []
+        cursor = None
+        while True:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url, {'cursor': cursor}
+                                           if cursor else {})
+            self.assertFalse([q for q in ctx.captured_queries
+                              if 'billing_invoice' in q['sql']])
+            page = response.context['page_obj']
+            seen += [n.pk for n in page]
+            pages.append(page)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual([len(page) for page in pages], [20, 20, 5])
+        self.assertEqual(len(set(seen)), 45)
+        self.assertEqual(seen, list(Notification.objects.values_list(
+            'pk', flat=True
+        )))
+
+        response = self.client.get(url, {'cursor': pages[1].previous_cursor})
+        self.assertEqual(list(response.context['page_obj']), list(pages[0]))
+        self.assertEqual(self.client.get(url, {'cursor': 'x'}).status_code,
+                         404)
+
+    def test_mark_all_read(self):
+        generate_notifications(self.today)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, 'уведомления</span>')
+        self.client.post(reverse('notifications'))
+        self.assertEqual(self.unread(), 0)
+        self.assertFalse(Notification.objects.filter(is_read=False).exists())
+
+
+class DashboardQueryBudgetTest(QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_dataset()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_pages(self):
+        budgets = {
+            # История seed_dataset старше года: последние показания
+            # дочитываются по всей истории
+            'dashboard': 15,
+            'dashboard_overview': 8,
+            'consumption_stats': 8,
+            'notifications': 8,
+            'quick_reading': 7,
+            'quick_pay': 7,
+        }
+        for name, budget in budgets.items():
+            with self.subTest(name):
+                self.assertQueryBudget(reverse(name), budget)
+
+
+class MetricsTest(TestCase):
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_view_metrics_are_exported(self):
+        user, _ = create_consumer('metrics')
+        self.client.force_login(user)
+        self.client.get(reverse('dashboard'))
+        response = self.client.get(reverse('metrics'),
+                                   HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response['Content-Type'],
+                         'text/plain; version=0.0.4')
+        body = response.content.decode()
+        self.assertIn('# TYPE twokvolts_request_duration_seconds histogram',
+                      body)
+        self.assertRegex(
+            body, r'twokvolts_sql_queries_count\{view="dashboard",'
+                  r'method="GET"\} [1-9]'
+        )
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token_required(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code,
+                         403)
+        response = self.client.get(reverse('metrics'),
+                                   HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(reverse('metrics'),
+                                   HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+    def test_workers_are_merged(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        registry = Registry(directory)
+        values = {'request_duration_seconds': 0.02, 'sql_queries': 3,
+                  'sql_duration_seconds': 0.004}
+        registry.observe('dashboard', 'GET', values)
+        # Снимок другого воркера
+        other = Registry(directory)
+        other.observe('dashboard', 'GET', values)
+        other.observe('meter_readings:list', 'GET', values)
+        # pid 1 жив всегда
+        with open(os.path.join(directory, '1-1.json'), 'w') as f:
+            json.dump(other.snapshot(), f)
+
+        body = render(registry.collect())
+        self.assertIn('twokvolts_sql_queries_count{view="dashboard",'
+                      'method="GET"} 2', body)
+        self.assertIn('twokvolts_sql_queries_bucket{view="dashboard",'
+                      'method="GET",le="2"} 0', body)
+        self.assertIn('twokvolts_sql_queries_bucket{view="dashboard",'
+                      'method="GET",le="5"} 2', body)
+        self.assertIn('view="meter_readings:list"', body)
+
+        registry.flush()
+        self.assertEqual(
+            sorted(name for name in os.listdir(directory)
+                   if name.endswith('.json')),
+            ['1-1.json', f'{os.getpid()}-{registry.process[1]}.json']
+        )
+
+    def test_dead_workers_are_retired(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        values = {'request_duration_seconds': 0.02, 'sql_queries': 3,
+                  'sql_duration_seconds': 0.004}
+        worker = subprocess.Popen(['true'])
+        worker.wait()
+        dead = Registry(directory)
+        dead.observe('dashboard', 'GET', values)
+        with open(os.path.join(directory, f'{worker.pid}-1.json'), 'w') as f:
+            json.dump(dead.snapshot(), f)
+
+        registry = Registry(directory)
+        for _ in range(2):
+            body = render(registry.collect())
+            # Счетчики умершего воркера не теряются и не удваиваются
+            self.assertIn('twokvolts_sql_queries_count{view="dashboard",'
+                          'method="GET"} 1', body)
+        self.assertEqual(
+            sorted(name for name in os.listdir(directory)
+                   if name.endswith('.json')),
+            ['retired.json']
+        )
+
+
+@override_settings(REPLICA_DATABASES=['replica'])
+class ReplicaRoutingTest(TransactionTestCase):
+    # replica в тестах — зеркало default, данные видны после фиксации
+    databases = {'default', 'replica'}
+
+    def test_router_pins_reads_after_write(self):
+        def route():
+            with replica_reads():
+                before = MeterReading.objects.all().db
+                MeterReading.objects.filter(pk=0).update(value=1)
+                return before, MeterReading.objects.all().db
+
+        self.assertEqual(contextvars.Context().run(route),
+                         ('replica', 'default'))
+        self.assertEqual(
+            contextvars.Context().run(lambda: MeterReading.objects.all().db),
+            'default'
+        )
+
+    def test_client_sticks_to_primary_after_submit(self):
+        user, contracts = create_consumer('replica')
+        # Данные изменены давно, реплика успела их получить
+        VersionStamp.objects.update(version=0)
+        self.client.force_login(user)
+        url = (f"{reverse('meter_readings:chart_data')}"
+               f'?contract={contracts[0].id}')
+        with CaptureQueriesContext(connections['replica']) as replica:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertTrue(replica.captured_queries)
+
+        response = self.client.post(reverse('meter_readings:submit'), {
+            'contract': contracts[0].id, 'reading_date': '2024-01-28',
+            'value': '100',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('primary_pin', response.cookies)
+        with CaptureQueriesContext(connections['replica']) as replica:
+            data = self.client.get(url).json()
+        self.assertEqual(replica.captured_queries, [])
+        self.assertEqual(data['total'], 1)
+
+    def test_recent_change_without_cookie_reads_primary(self):
+        user, contracts = create_consumer('replica-api')
+        VersionStamp.objects.update(version=0)
+        self.client.force_login(user)
+        url = (f"{reverse('meter_readings:chart_data')}"
+               f'?contract={contracts[0].id}')
+        etag = self.client.get(url)['ETag']
+
+        # Показание принято API: cookie у клиента нет
+        MeterReading.objects.create(contract=contracts[0],
+                                    reading_date=datetime.date(2024, 1, 28),
+                                    value=100)
+        with CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        # До сверки версии с реплики читается только профиль потребителя
+        self.assertFalse([q for q in replica.captured_queries
+                          if 'meter_reading' in q['sql']])
+        self.assertEqual(response.json()['total'], 1)
+
+        with self.settings(REPLICA_STICKY_SECONDS=0):
+            with CaptureQueriesContext(connections['replica']) as replica:
+                self.client.get(url)
+        self.assertTrue([q for q in replica.captured_queries
+                         if 'meter_reading' in q['sql']])
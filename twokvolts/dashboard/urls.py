@@ -1,9 +1,16 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Под ASGI главная страница собирает сводку параллельными запросами
+if settings.DASHBOARD_ASYNC_VIEWS:
+    home_view = views.accounts_home_async
+else:
+    home_view = views.AccountsHomeView.as_view()
+
 urlpatterns = [
     # Основные страницы личного кабинета
-    path('', views.AccountsHomeView.as_view(), name='dashboard'),
+    path('', home_view, name='dashboard'),
     path('overview/', views.DashboardOverview.as_view(), name='dashboard_overview'),
     path('stats/', views.ConsumptionStatsView.as_view(), name='consumption_stats'),
     path('notifications/', views.NotificationsView.as_view(), name='notifications'),
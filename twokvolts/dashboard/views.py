@@ -1,16 +1,19 @@
-from django.shortcuts import render
-
+from asgiref.sync import sync_to_async
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.views.generic import TemplateView, ListView, DetailView
-from django.shortcuts import render, get_object_or_404
-from django.db.models import Sum, Avg, Count
+from django.contrib.auth.views import redirect_to_login
+from django.views.generic import TemplateView, ListView
+from django.shortcuts import render, redirect
+from django.contrib import messages
+from django.db.models import Sum
 from django.utils import timezone
-from datetime import timedelta
-from consumers.models import Consumer
-from contracts.models import Contract
-from meter_readings.models import MeterReading
-from billing.models import Invoice
-from payments.models import Payment
+from datetime import MAXYEAR, MINYEAR, date, timedelta
+from consumers.middleware import get_consumer
+from consumers.mixins import ConsumerMixin
+from twokvolts.pagination import KeysetPaginationMixin
+from twokvolts.replicas import ReplicaReadMixin
+from .models import MonthlyConsumption, Notification
+from .notifications import mark_all_read
+from .summary import aget_home_summary, get_home_summary
 
 
 class AccountsHomeView(LoginRequiredMixin, TemplateView):
@@ -19,83 +22,68 @@ class AccountsHomeView(LoginRequiredMixin, TemplateView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        user = self.request.user
+        consumer = get_consumer(self.request)
+        context['consumer'] = consumer
         
-        try:
-            consumer = Consumer.objects.get(user=user)
-            context['consumer'] = consumer
-            
-            # Получаем активные договоры
-            active_contracts = Contract.objects.filter(
-                consumer=consumer, 
-                is_active=True
-            ).select_related('tariff')
-            context['active_contracts'] = active_contracts
-            
-            # Последние показания
-            latest_readings = MeterReading.objects.filter(
-                contract__in=active_contracts
-            ).order_by('-reading_date')[:5]
-            context['latest_readings'] = latest_readings
-            
-            # Текущие счета
-            current_invoices = Invoice.objects.filter(
-                contract__in=active_contracts,
-                status='issued'
-            ).order_by('due_date')[:3]
-            context['current_invoices'] = current_invoices
-            
-            # Последние платежи
-            recent_payments = Payment.objects.filter(
-                invoice__contract__in=active_contracts
-            ).order_by('-payment_date')[:5]
-            context['recent_payments'] = recent_payments
-            
-            # Статистика
-            total_debt = Invoice.objects.filter(
-                contract__in=active_contracts,
-                status='issued'
-            ).aggregate(total=Sum('amount'))['total'] or 0
-            context['total_debt'] = total_debt
-            
-            # Уведомления
-            overdue_invoices = Invoice.objects.filter(
-                contract__in=active_contracts,
-                status='issued',
-                due_date__lt=timezone.now().date()
-            ).count()
-            context['overdue_invoices'] = overdue_invoices
-            
-        except Consumer.DoesNotExist:
-            context['consumer'] = None
+        if consumer is not None:
+            # Договоры, показания, счета, платежи и статистика из кэша
+            context.update(get_home_summary(consumer))
         
         return context
 
 
-class DashboardOverview(LoginRequiredMixin, TemplateView):
+def _home_consumer(request):
+    if not request.user.is_authenticated:
+        return False, None
+    return True, get_consumer(request)
+
+
+async def accounts_home_async(request):
+    """Главная страница кабинета под ASGI.
+
+    Контекст тот же, что у AccountsHomeView, но запросы сводки по
+    договорам выполняются параллельно.
+    """
+    authenticated, consumer = await sync_to_async(_home_consumer)(request)
+    if not authenticated:
+        return redirect_to_login(request.get_full_path())
+
+    context = {'consumer': consumer}
+    if consumer is not None:
+        context.update(await aget_home_summary(consumer))
+    return await sync_to_async(render)(
+        request, AccountsHomeView.template_name, context
+    )
+
+
+class DashboardOverview(LoginRequiredMixin, ReplicaReadMixin, ConsumerMixin,
+                        TemplateView):
     """Обзорная панель с графиками и статистикой"""
     template_name = 'dashboard/overview.html'
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        consumer = get_object_or_404(Consumer, user=self.request.user)
+        consumer = self.get_consumer()
         
         # Статистика потребления за последние 6 месяцев
         six_months_ago = timezone.now().date() - timedelta(days=180)
         
-        invoices = Invoice.objects.filter(
+        monthly = MonthlyConsumption.objects.filter(
             contract__consumer=consumer,
-            period__gte=six_months_ago
-        ).order_by('period')
+            month__gte=six_months_ago
+        ).values('month').annotate(
+            consumption=Sum('consumption'),
+            amount=Sum('amount')
+        ).order_by('month')
         
         consumption_data = []
         amount_data = []
         labels = []
         
-        for invoice in invoices:
-            consumption_data.append(float(invoice.consumption))
-            amount_data.append(float(invoice.amount))
-            labels.append(invoice.period.strftime('%b %Y'))
+        for row in monthly:
+            consumption_data.append(float(row['consumption']))
+            amount_data.append(float(row['amount']))
+            labels.append(row['month'].strftime('%b %Y'))
         
         context['consumption_data'] = consumption_data
         context['amount_data'] = amount_data
@@ -104,34 +92,41 @@ class DashboardOverview(LoginRequiredMixin, TemplateView):
         return context
 
 
-class ConsumptionStatsView(LoginRequiredMixin, TemplateView):
+class ConsumptionStatsView(LoginRequiredMixin, ReplicaReadMixin,
+                           ConsumerMixin, TemplateView):
     """Детальная статистика потребления"""
     template_name = 'dashboard/stats.html'
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        consumer = get_object_or_404(Consumer, user=self.request.user)
+        consumer = self.get_consumer()
         
-        year = self.request.GET.get('year', timezone.now().year)
-        
-        # Статистика по месяцам за выбранный год
-        monthly_stats = []
-        for month in range(1, 13):
-            invoices = Invoice.objects.filter(
+        try:
+            year = int(self.request.GET.get('year', timezone.now().year))
+        except ValueError:
+            year = timezone.now().year
+        # Граница года должна оставаться допустимой датой
+        if not MINYEAR <= year < MAXYEAR:
+            year = timezone.now().year
+        
+        # Статистика по месяцам за выбранный год одним запросом
+        monthly_stats = [
+            {
+                'month': row['month'].month,
+                'consumption': row['consumption'],
+                'amount': row['amount'],
+                'invoices_count': row['invoices_count']
+            }
+            for row in MonthlyConsumption.objects.filter(
                 contract__consumer=consumer,
-                period__year=year,
-                period__month=month
-            )
-            
-            if invoices.exists():
-                total_consumption = invoices.aggregate(Sum('consumption'))['consumption__sum'] or 0
-                total_amount = invoices.aggregate(Sum('amount'))['amount__sum'] or 0
-                monthly_stats.append({
-                    'month': month,
-                    'consumption': total_consumption,
-                    'amount': total_amount,
-                    'invoices_count': invoices.count()
-                })
+                month__gte=date(year, 1, 1),
+                month__lt=date(year + 1, 1, 1)
+            ).values('month').annotate(
+                consumption=Sum('consumption'),
+                amount=Sum('amount'),
+                invoices_count=Sum('invoices_count')
+            ).order_by('month')
+        ]
         
         context['monthly_stats'] = monthly_stats
         context['selected_year'] = year
@@ -140,64 +135,22 @@ class ConsumptionStatsView(LoginRequiredMixin, TemplateView):
         return context
 
 
-class NotificationsView(LoginRequiredMixin, ListView):
+class NotificationsView(LoginRequiredMixin, ConsumerMixin,
+                        KeysetPaginationMixin, ListView):
     """Страница уведомлений"""
     template_name = 'dashboard/notifications.html'
     context_object_name = 'notifications'
+    paginate_by = 20
+    keyset_ordering = ('-date', '-id')
     
     def get_queryset(self):
-        consumer = get_object_or_404(Consumer, user=self.request.user)
-        
-        notifications = []
-        
-        # Просроченные счета
-        overdue = Invoice.objects.filter(
-            contract__consumer=consumer,
-            status='issued',
-            due_date__lt=timezone.now().date()
-        )
-        for invoice in overdue:
-            notifications.append({
-                'type': 'warning',
-                'title': 'Просроченный счет',
-                'message': f'Счет #{invoice.id} за {invoice.period.strftime("%B %Y")} просрочен',
-                'date': invoice.due_date,
-                'link': invoice.get_absolute_url()
-            })
-        
-        # Предстоящие сроки оплаты (в течение 3 дней)
-        upcoming = Invoice.objects.filter(
-            contract__consumer=consumer,
-            status='issued',
-            due_date__range=[
-                timezone.now().date(),
-                timezone.now().date() + timedelta(days=3)
-            ]
-        )
-        for invoice in upcoming:
-            notifications.append({
-                'type': 'info',
-                'title': 'Скоро срок оплаты',
-                'message': f'Счет #{invoice.id} нужно оплатить до {invoice.due_date}',
-                'date': invoice.due_date,
-                'link': invoice.get_absolute_url()
-            })
-        
-        # Новые счета (последние 7 дней)
-        new_invoices = Invoice.objects.filter(
-            contract__consumer=consumer,
-            issue_date__gte=timezone.now().date() - timedelta(days=7)
-        )
-        for invoice in new_invoices:
-            notifications.append({
-                'type': 'success',
-                'title': 'Новый счет',
-                'message': f'Выставлен счет #{invoice.id} за {invoice.period.strftime("%B %Y")}',
-                'date': invoice.issue_date,
-                'link': invoice.get_absolute_url()
-            })
-        
-        return sorted(notifications, key=lambda x: x['date'], reverse=True)
+        # Лента заранее собрана командой generate_notifications
+        return Notification.objects.filter(consumer=self.get_consumer())
+    
+    def post(self, request, *args, **kwargs):
+        mark_all_read(self.get_consumer())
+        messages.success(request, 'Все уведомления отмечены прочитанными')
+        return redirect('notifications')
 
 
 # Быстрые действия
@@ -1,4 +1,47 @@
 from django.contrib import admin
-from .models import MeterReading
 
-admin.site.register(MeterReading)
+from twokvolts.pagination import EstimatedCountPaginator
+from .models import ApiToken, MeterReading
+
+
+@admin.register(MeterReading)
+class MeterReadingAdmin(admin.ModelAdmin):
+    list_display = ('reading_date', 'contract_number', 'personal_account',
+                    'value', 'is_confirmed', 'anomaly')
+    list_filter = ('is_confirmed', 'anomaly')
+    list_select_related = ('contract__consumer',)
+    # Только точные совпадения по уникальным полям — поиск по индексу
+    search_fields = ('=contract__contract_number',
+                     '=contract__consumer__personal_account')
+    raw_id_fields = ('contract',)
+    readonly_fields = ('submitted_at',)
+    actions = ['confirm_selected']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    @admin.display(description='Договор',
+                   ordering='contract__contract_number')
+    def contract_number(self, obj):
+        return obj.contract.contract_number
+
+    @admin.display(description='Лицевой счет')
+    def personal_account(self, obj):
+        return obj.contract.consumer.personal_account
+
+    @admin.action(description='Подтвердить выбранные показания')
+    def confirm_selected(self, request, queryset):
+        updated = queryset.update(is_confirmed=True, anomaly='')
+        self.message_user(request, f'Подтверждено показаний: {updated}')
+
+
+@admin.register(ApiToken)
+class ApiTokenAdmin(admin.ModelAdmin):
+    list_display = ('name', 'prefix', 'consumer', 'is_active', 'last_used_at')
+    list_filter = ('is_active',)
+    search_fields = ('name', 'prefix')
+    raw_id_fields = ('consumer', 'contracts')
+    # Ключ выпускается командой issue_api_token
+    readonly_fields = ('prefix', 'key_hash', 'created_at', 'last_used_at')
+
+    def has_add_permission(self, request):
+        return False
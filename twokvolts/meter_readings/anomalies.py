@@ -0,0 +1,136 @@
+# meter_readings/anomalies.py
+import numpy as np
+
+from .models import MeterReading
+
+SPIKE_Z = 6.0  # Робастный z-score, выше которого расход считается скачком
+MIN_HISTORY = 4  # Сколько интервалов нужно для выводов о договоре
+ZERO_MIN_RATE = 0.5  # кВт*ч в сутки: ниже этого нулевой расход не странен
+SCALE_FLOOR = 0.1  # Минимальный разброс в долях медианы (ровные ряды)
+MAD_SCALE = 1.4826  # MAD -> стандартное отклонение для нормального закона
+
+
+def group_median(groups, values):
+    """Медиана ``values`` внутри каждой группы, по элементу на значение"""
+    order = np.lexsort((values, groups))
+    sorted_groups = groups[order]
+    starts = np.flatnonzero(
+        np.r_[True, sorted_groups[1:] != sorted_groups[:-1]]
+    )
+    counts = np.diff(np.r_[starts, len(order)])
+    sorted_values = values[order]
+    medians = (sorted_values[starts + (counts - 1) // 2]
+               + sorted_values[starts + counts // 2]) / 2
+    result = np.empty(len(values))
+    result[order] = np.repeat(medians, counts)
+    return result
+
+
+def detect(contracts, dates, values, checked):
+    """Классифицирует показания, упорядоченные по договору и дате.
+
+    ``dates`` - массив datetime64[D], ``checked`` - маска показаний,
+    которые нужно оценить. Возвращает массив меток: '' - в норме
+    (и у первого показания договора), 'spike', 'rollback', 'zero'
+    и None - мало истории для вывода.
+    Расход приводится к суточному, сезонность учитывается общим для
+    пачки помесячным индексом, разброс по договору - медианой и MAD.
+    """
+    n = len(values)
+    labels = np.full(n, None, dtype=object)
+    has_previous = np.r_[False, contracts[1:] == contracts[:-1]]
+    delta = np.r_[np.nan, np.diff(values)]
+    interval = np.r_[1, np.diff(dates).astype(int)].clip(min=1)
+    rate = delta / interval
+    months = dates.astype('datetime64[M]').astype(int) % 12 + 1
+
+    # Статистика только по интервалам без откатов
+    usable = has_previous & (delta >= 0)
+    idx = np.flatnonzero(usable)
+    stats = np.full(n, np.nan)
+    scale = np.full(n, np.nan)
+    history = np.zeros(n, dtype=int)
+    if len(idx):
+        level = group_median(contracts[idx], rate[idx])
+        ratio = np.where(level > 0, rate[idx] / np.where(level > 0, level, 1),
+                         np.nan)
+        seasonal = np.ones(13)
+        valid = ~np.isnan(ratio)
+        if valid.any():
+            factor = group_median(months[idx][valid], ratio[valid])
+            seasonal[months[idx][valid]] = factor.clip(0.2, 5)
+        deseasonal = rate[idx] / seasonal[months[idx]]
+        median = group_median(contracts[idx], deseasonal)
+        mad = group_median(contracts[idx], np.abs(deseasonal - median))
+        stats[idx] = median
+        scale[idx] = np.maximum(MAD_SCALE * mad, SCALE_FLOOR * median)
+        _, inverse, counts = np.unique(contracts[idx], return_inverse=True,
+                                       return_counts=True)
+        history[idx] = counts[inverse]
+        z = np.full(n, np.nan)
+        z[idx] = (deseasonal - median) / np.maximum(scale[idx], 1e-9)
+    else:
+        z = np.full(n, np.nan)
+
+    judged = checked & has_previous
+    enough = judged & (history >= MIN_HISTORY)
+    labels[enough] = ''
+    labels[enough & (z > SPIKE_Z)] = 'spike'
+    labels[enough & (delta == 0) & (stats > ZERO_MIN_RATE)] = 'zero'
+    # Откат виден и без истории
+    labels[judged & (delta < 0)] = 'rollback'
+    # Первое показание договора сравнить не с чем, оно принимается как есть
+    labels[checked & ~has_previous] = ''
+    return labels
+
+
+def unchecked_contracts(after, limit):
+    """Следующие ``limit`` договоров с непроверенными показаниями"""
+    return list(MeterReading.objects.filter(
+        is_confirmed=False, anomaly='', contract_id__gt=after
+    ).order_by('contract_id').values_list(
+        'contract_id', flat=True
+    ).distinct()[:limit])
+
+
+def check_chunk(contract_ids, since, dry_run=False):
+    """Проверяет показания пачки договоров, возвращает счетчики по меткам"""
+    fields = ['id', 'contract_id', 'reading_date', 'value', 'is_confirmed',
+              'anomaly']
+    rows = list(MeterReading.objects.filter(
+        contract_id__in=contract_ids, reading_date__gte=since
+    ).order_by('contract_id', 'reading_date').values_list(*fields))
+    if not rows:
+        return {}
+    # Расход первого показания окна считается от последнего показания
+    # до окна; само оно помечается проверенным и не оценивается
+    seeds = MeterReading.objects.filter(
+        contract_id__in=contract_ids, reading_date__lt=since
+    ).within_lookback(since).order_by(
+        'contract_id', '-reading_date'
+    ).distinct('contract_id').values_list(*fields[:4])
+    rows = sorted(
+        [(*seed, True, '') for seed in seeds] + rows,
+        key=lambda row: (row[1], row[2])
+    )
+    ids = np.array([row[0] for row in rows])
+    labels = detect(
+        np.array([row[1] for row in rows]),
+        np.array([row[2] for row in rows], dtype='datetime64[D]'),
+        np.array([float(row[3]) for row in rows]),
+        np.array([not row[4] and not row[5] for row in rows]),
+    )
+
+    counts = {}
+    for label in ('', 'spike', 'rollback', 'zero'):
+        selected = ids[labels == label].tolist()
+        counts[label or 'confirmed'] = len(selected)
+        if not selected or dry_run:
+            continue
+        readings = MeterReading.objects.filter(id__in=selected)
+        if label:
+            readings.update(anomaly=label)
+        else:
+            # Все показания в пределах нормы - одним UPDATE
+            readings.update(is_confirmed=True)
+    return counts
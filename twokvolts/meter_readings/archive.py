@@ -0,0 +1,93 @@
+# meter_readings/archive.py
+from django.db import connection, transaction
+
+from billing.models import OPEN_STATUSES, Invoice, InvoiceArchive
+from contracts.models import Contract
+from dashboard.models import Notification
+from dashboard.notifications import refresh_unread_counts
+from dashboard.summary import invalidate_home_summary
+from payments.models import Payment, PaymentArchive
+from .models import MeterReading, ReadingArchive
+
+
+def _move(archive, source, contract, where, params, join=''):
+    """Переносит строки ``source`` в архив одним DELETE ... RETURNING.
+
+    Строки каждого договора сворачиваются в одну строку архива,
+    массивы упорядочены по дате. Возвращает число перенесенных строк.
+    """
+    qn = connection.ops.quote_name
+    fields = [archive._meta.get_field(name)
+              for name in archive.packed.values()]
+    date = qn(source._meta.get_field(archive.date_field).column)
+    aggregates = [
+        f'array_agg(moved.{qn(source._meta.get_field(name).column)} '
+        f'ORDER BY moved.{date}, moved.id)'
+        for name in archive.packed
+    ]
+    columns = ['contract_id', 'first_date', 'last_date', 'archived_at'] + [
+        field.column for field in fields
+    ]
+    sql = (
+        f'WITH moved AS (DELETE FROM {qn(source._meta.db_table)} AS src '
+        f'WHERE {where} RETURNING src.*), '
+        f'packed AS (INSERT INTO {qn(archive._meta.db_table)} '
+        f'({", ".join(map(qn, columns))}) '
+        f'SELECT {contract}, min(moved.{date}), max(moved.{date}), now(), '
+        f'{", ".join(aggregates)} FROM moved {join} GROUP BY {contract} '
+        f'RETURNING cardinality({qn(fields[0].column)})) '
+        f'SELECT coalesce(sum(cardinality), 0) FROM packed'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone()[0]
+
+
+def archive_contracts(contract_ids, before):
+    """Переносит в архив историю договоров раньше даты ``before``.
+
+    Договор с неоплаченными счетами за эти периоды пропускается целиком.
+    Платежи уходят вместе со своими счетами, показания — если на них
+    не ссылается оставшийся счет. Возвращает {модель: перенесено строк}.
+    """
+    open_contracts = set(Invoice.objects.filter(
+        contract_id__in=contract_ids, period__lt=before,
+        status__in=OPEN_STATUSES
+    ).values_list('contract_id', flat=True))
+    contract_ids = [pk for pk in contract_ids if pk not in open_contracts]
+    if not contract_ids:
+        return {}
+
+    invoices = Invoice._meta.db_table
+    consumer_ids = set(Contract.objects.filter(
+        id__in=contract_ids
+    ).values_list('consumer_id', flat=True))
+    with transaction.atomic():
+        # Уведомления по уходящим в архив счетам больше не нужны
+        Notification.objects.filter(invoice__contract_id__in=contract_ids,
+                                    invoice__period__lt=before).delete()
+        moved = {
+            'payments': _move(
+                PaymentArchive, Payment, 'invoice.contract_id',
+                f'src.invoice_id IN (SELECT id FROM {invoices} '
+                f'WHERE contract_id = ANY(%s) AND period < %s)',
+                [contract_ids, before],
+                join=f'JOIN {invoices} AS invoice '
+                     f'ON invoice.id = moved.invoice_id'
+            ),
+            'invoices': _move(
+                InvoiceArchive, Invoice, 'moved.contract_id',
+                'src.contract_id = ANY(%s) AND src.period < %s',
+                [contract_ids, before]
+            ),
+            'readings': _move(
+                ReadingArchive, MeterReading, 'moved.contract_id',
+                f'src.contract_id = ANY(%s) AND src.reading_date < %s '
+                f'AND NOT EXISTS (SELECT 1 FROM {invoices} AS invoice '
+                f'WHERE invoice.meter_reading_id = src.id)',
+                [contract_ids, before]
+            ),
+        }
+        refresh_unread_counts(consumer_ids)
+        invalidate_home_summary(consumer_ids)
+    return moved
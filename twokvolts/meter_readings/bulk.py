@@ -0,0 +1,171 @@
+# meter_readings/bulk.py
+import datetime
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from contracts.models import Contract
+from twokvolts.dates import month_start, next_month_start
+from .models import MeterReading
+
+
+def parse_value(raw):
+    """Значение показаний как Decimal или текст ошибки"""
+    try:
+        value = Decimal(str(raw))
+    except InvalidOperation:
+        return None, 'Неверное значение показаний'
+    if not value.is_finite() or value < 0:
+        return None, 'Неверное значение показаний'
+    try:
+        # Число должно помещаться в поле модели, иначе упадет bulk_create
+        MeterReading._meta.get_field('value').run_validators(value)
+    except ValidationError:
+        return None, 'Значение показаний вне допустимого диапазона'
+    return value, None
+
+
+def _parse_row(row):
+    """Разбирает строку пачки: (contract_id, date, value) или текст ошибки"""
+    if not isinstance(row, dict) or not all(
+        k in row for k in ['contract', 'date', 'value']
+    ):
+        return None, 'Неполные данные'
+    try:
+        contract_id = int(row['contract'])
+    except (TypeError, ValueError):
+        return None, 'Неверный договор'
+    try:
+        reading_date = datetime.date.fromisoformat(str(row['date']))
+    except ValueError:
+        return None, 'Неверная дата'
+    value, error = parse_value(row['value'])
+    if error:
+        return None, error
+    if reading_date > timezone.now().date():
+        return None, 'Дата показаний в будущем'
+    return (contract_id, reading_date, value), None
+
+
+def _check_access(parsed, errors, user, contract_ids):
+    """Отсеивает строки с чужими и несуществующими договорами (1 запрос)"""
+    if contract_ids is not None:
+        contract_ids = set(contract_ids)
+    ids = {contract_id for _, contract_id, _, _ in parsed}
+    owners = dict(
+        Contract.objects.filter(id__in=ids, is_active=True)
+        .values_list('id', 'consumer__user_id')
+    )
+
+    accepted = []
+    for i, contract_id, reading_date, value in parsed:
+        if contract_id not in owners:
+            errors[i].append('Неверный договор')
+        elif contract_ids is not None and contract_id not in contract_ids:
+            errors[i].append('Нет доступа к договору')
+        elif user is not None and owners[contract_id] != user.pk:
+            errors[i].append('Нет доступа к договору')
+        else:
+            accepted.append((i, contract_id, reading_date, value))
+    return accepted
+
+
+def previous_readings(contract_ids, before):
+    """Последнее показание каждого договора раньше ``before``"""
+    return MeterReading.objects.filter(
+        contract_id__in=contract_ids,
+        reading_date__lt=before
+    ).order_by('contract_id', '-reading_date').distinct(
+        'contract_id'
+    ).values_list('contract_id', 'reading_date', 'value')
+
+
+def _load_timeline(accepted):
+    """Загружает историю договоров, нужную для проверки пачки.
+
+    Два запроса, третий — если у части договоров не нашлось
+    показаний за последний год.
+    """
+    ids = {contract_id for _, contract_id, _, _ in accepted}
+    window_start = month_start(min(r[2] for r in accepted))
+    window_end = next_month_start(max(r[2] for r in accepted))
+
+    # Уже поданные показания в пределах месяцев пачки
+    timeline = defaultdict(list)
+    existing_months = defaultdict(set)
+    for contract_id, reading_date, value in MeterReading.objects.filter(
+        contract_id__in=ids,
+        reading_date__gte=window_start,
+        reading_date__lt=window_end
+    ).values_list('contract_id', 'reading_date', 'value'):
+        timeline[contract_id].append((reading_date, value, None))
+        existing_months[contract_id].add(month_start(reading_date))
+
+    # Последнее показание до начала окна по каждому договору: сначала
+    # в секциях последнего года, остальные договоры — по всей истории
+    previous = list(previous_readings(ids, window_start).within_lookback(
+        window_start
+    ))
+    missing = ids - {contract_id for contract_id, _, _ in previous}
+    if missing:
+        previous += previous_readings(missing, window_start)
+    for contract_id, reading_date, value in previous:
+        timeline[contract_id].append((reading_date, value, None))
+
+    return timeline, existing_months
+
+
+def prepare_readings(rows, user=None, contract_ids=None):
+    """Проверяет пачку показаний за постоянное число запросов.
+
+    Доступ ограничивается договорами пользователя ``user`` либо явным
+    набором ``contract_ids``. Возвращает пару ``(readings, errors)``:
+    несохраненные ``MeterReading`` для корректных строк и словарь
+    ``{номер строки: [ошибки]}`` (строки нумеруются с 1).
+    """
+    errors = defaultdict(list)
+    parsed = []
+    for i, row in enumerate(rows, start=1):
+        data, error = _parse_row(row)
+        if error:
+            errors[i].append(error)
+        else:
+            parsed.append((i, *data))
+
+    accepted = _check_access(parsed, errors, user, contract_ids)
+    if not accepted:
+        return [], dict(errors)
+
+    timeline, existing_months = _load_timeline(accepted)
+    batch_months = defaultdict(set)
+    for i, contract_id, reading_date, value in accepted:
+        month = month_start(reading_date)
+        if (month in existing_months[contract_id]
+                or month in batch_months[contract_id]):
+            errors[i].append('Показания за этот месяц уже поданы')
+            continue
+        batch_months[contract_id].add(month)
+        timeline[contract_id].append((reading_date, value, i))
+
+    # Монотонность проверяется в памяти по объединенной истории договора
+    readings = []
+    for contract_id, points in timeline.items():
+        previous = None
+        for reading_date, value, i in sorted(points, key=lambda p: p[0]):
+            if i is not None:
+                if previous is not None and value <= previous:
+                    errors[i].append(
+                        'Новые показания должны быть больше предыдущих'
+                    )
+                    continue
+                readings.append((i, MeterReading(
+                    contract_id=contract_id,
+                    reading_date=reading_date,
+                    value=value
+                )))
+            previous = value
+
+    readings.sort(key=lambda r: r[0])
+    return [reading for _, reading in readings], dict(errors)
@@ -0,0 +1,76 @@
+# meter_readings/charts.py
+import datetime
+
+from twokvolts.archive import reaches_archive
+from .models import MeterReading, ReadingArchive
+
+
+def lttb(points, threshold):
+    """Прореживание ряда алгоритмом Largest-Triangle-Three-Buckets.
+
+    ``points`` — список пар (x, y), отсортированный по x. Сохраняет
+    первую и последнюю точки, а в каждой корзине выбирает точку,
+    образующую наибольший треугольник с соседними, поэтому пики
+    и провалы графика не теряются.
+    """
+    if threshold >= len(points) or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    every = (len(points) - 2) / (threshold - 2)
+    selected = 0
+    for i in range(threshold - 2):
+        # Среднее следующей корзины — третья вершина треугольника
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, len(points))
+        bucket = points[next_start:next_end]
+        avg_x = sum(x for x, _ in bucket) / len(bucket)
+        avg_y = sum(y for _, y in bucket) / len(bucket)
+
+        ax, ay = points[selected]
+        best_area = -1
+        for j in range(int(i * every) + 1, next_start):
+            x, y = points[j]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > best_area:
+                best_area = area
+                selected = j
+        sampled.append(points[selected])
+    sampled.append(points[-1])
+    return sampled
+
+
+def reading_series(contract_id, date_from=None, date_to=None):
+    """Показания договора за окно дат как список (дата, значение).
+
+    Если окно уходит раньше границы архива, добавляются архивные
+    показания (еще один запрос).
+    """
+    readings = MeterReading.objects.filter(contract_id=contract_id)
+    if date_from:
+        readings = readings.filter(reading_date__gte=date_from)
+    if date_to:
+        readings = readings.filter(reading_date__lte=date_to)
+    series = list(readings.order_by('reading_date').values_list(
+        'reading_date', 'value'
+    ))
+    if reaches_archive(date_from):
+        archived = list(ReadingArchive.objects.filter(
+            contract_id=contract_id
+        ).values_rows(['reading_date', 'value'], date_from, date_to))
+        if archived:
+            series = sorted(archived + series)
+    return series
+
+
+def chart_data(series, points):
+    """Данные графика, прореженные до ``points`` точек"""
+    sampled = lttb(
+        [(day.toordinal(), float(value)) for day, value in series], points
+    )
+    return {
+        'dates': [datetime.date.fromordinal(x).isoformat()
+                  for x, _ in sampled],
+        'values': [y for _, y in sampled],
+        'total': len(series),
+    }
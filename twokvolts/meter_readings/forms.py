@@ -1,6 +1,8 @@
 # meter_readings/forms.py
 from django import forms
 from django.utils import timezone
+from twokvolts.dates import month_start, next_month_start
+from .bulk import prepare_readings
 from .models import MeterReading
 from contracts.models import Contract
 
@@ -26,20 +28,14 @@ class MeterReadingForm(forms.ModelForm):
         }
     
     def __init__(self, *args, **kwargs):
-        self.user = kwargs.pop('user', None)
+        contract_ids = kwargs.pop('contract_ids', None)
         super().__init__(*args, **kwargs)
         
-        if self.user:
+        if contract_ids is not None:
             # Ограничиваем выбор только активными договорами пользователя
-            from consumers.models import Consumer
-            try:
-                consumer = Consumer.objects.get(user=self.user)
-                self.fields['contract'].queryset = Contract.objects.filter(
-                    consumer=consumer,
-                    is_active=True
-                )
-            except Consumer.DoesNotExist:
-                self.fields['contract'].queryset = Contract.objects.none()
+            self.fields['contract'].queryset = Contract.objects.filter(
+                id__in=contract_ids
+            )
         
         self.fields['contract'].widget.attrs.update({'class': 'form-control'})
     
@@ -62,11 +58,12 @@ class MeterReadingForm(forms.ModelForm):
                 )
             
             # Проверяем, чтобы не было дубликатов за месяц
+            # (диапазон дат использует индекс по contract, reading_date)
             existing = MeterReading.objects.filter(
                 contract=contract,
-                reading_date__year=reading_date.year,
-                reading_date__month=reading_date.month
-            ).exists()
+                reading_date__gte=month_start(reading_date),
+                reading_date__lt=next_month_start(reading_date)
+            ).exclude(pk=self.instance.pk).exists()
             
             if existing:
                 raise forms.ValidationError(
@@ -84,25 +81,26 @@ class BulkMeterReadingForm(forms.Form):
     )
     
     def __init__(self, *args, **kwargs):
-        self.user = kwargs.pop('user', None)
+        self.contract_ids = kwargs.pop('contract_ids', None)
+        self.row_errors = {}
         super().__init__(*args, **kwargs)
     
     def clean_readings(self):
         readings = self.cleaned_data['readings']
         if not readings:
             raise forms.ValidationError('Нет данных для обработки')
+        if not isinstance(readings, list):
+            raise forms.ValidationError('Неверный формат данных')
         
-        # Валидация каждого показания
-        for i, reading_data in enumerate(readings):
-            if not all(k in reading_data for k in ['contract', 'date', 'value']):
-                raise forms.ValidationError(f'Неполные данные в строке {i+1}')
-            
-            try:
-                contract = Contract.objects.get(id=reading_data['contract'])
-                # Проверка прав доступа
-                if contract.consumer.user != self.user:
-                    raise forms.ValidationError(f'Нет доступа к договору в строке {i+1}')
-            except Contract.DoesNotExist:
-                raise forms.ValidationError(f'Неверный договор в строке {i+1}')
+        # Вся пачка проверяется за постоянное число запросов
+        prepared, self.row_errors = prepare_readings(
+            readings, contract_ids=self.contract_ids
+        )
+        if self.row_errors:
+            raise forms.ValidationError([
+                forms.ValidationError(f'Строка {i}: {message}')
+                for i, messages in sorted(self.row_errors.items())
+                for message in messages
+            ])
         
-        return readings
\ No newline at end of file
+        return prepared
@@ -0,0 +1,133 @@
+# meter_readings/ingest.py
+import datetime
+import gzip
+import json
+import zlib
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from dashboard.summary import invalidate_for_contracts
+from .bulk import prepare_readings
+from .models import ApiToken, MeterReading
+
+TOKEN_TOUCH_INTERVAL = datetime.timedelta(minutes=1)
+
+
+class IngestError(Exception):
+    """Тело запроса нельзя дочитать до конца"""
+
+
+def authenticate_token(request):
+    """Активный токен из заголовка ``Authorization: Bearer <ключ>``"""
+    scheme, _, key = request.headers.get('Authorization', '').partition(' ')
+    if scheme != 'Bearer' or not key:
+        return None
+    token = ApiToken.objects.filter(key_hash=ApiToken.hash_key(key.strip()),
+                                    is_active=True).first()
+    if token is not None:
+        now = timezone.now()
+        # Отметка использования не чаще раза в минуту
+        if (token.last_used_at is None
+                or token.last_used_at < now - TOKEN_TOUCH_INTERVAL):
+            ApiToken.objects.filter(pk=token.pk).update(last_used_at=now)
+    return token
+
+
+def open_body(request):
+    """Поток тела запроса с учетом Content-Encoding (или None)"""
+    encoding = request.headers.get('Content-Encoding', 'identity').lower()
+    if encoding == 'gzip':
+        return gzip.GzipFile(fileobj=request, mode='rb')
+    if encoding == 'identity':
+        return request
+    return None
+
+
+def iter_lines(stream, max_line):
+    """Разбирает NDJSON построчно: (номер строки, запись, ошибка)"""
+    line = 0
+    while True:
+        raw = stream.readline(max_line + 1)
+        if not raw:
+            return
+        line += 1
+        if len(raw) > max_line and not raw.endswith(b'\n'):
+            while raw and not raw.endswith(b'\n'):
+                raw = stream.readline(max_line + 1)
+            yield line, None, 'Слишком длинная строка'
+        elif raw.strip():
+            try:
+                yield line, json.loads(raw), None
+            except ValueError:
+                yield line, None, 'Неверный JSON'
+
+
+class ReadingIngest:
+    """Прием показаний пачками с проверкой через prepare_readings.
+
+    Каждая пачка проверяется за постоянное число запросов и
+    сохраняется своей транзакцией, поэтому уже принятые пачки
+    остаются в базе, даже если дальше тело запроса окажется битым.
+    """
+
+    def __init__(self, contract_ids, chunk_size=None, max_rows=None):
+        self.contract_ids = contract_ids
+        self.chunk_size = chunk_size or settings.INGEST_CHUNK_SIZE
+        self.max_rows = max_rows or settings.INGEST_MAX_ROWS
+        self.received = 0
+        self.created = 0
+        self.errors = {}
+
+    def run(self, stream):
+        chunk = []
+        try:
+            for line, row, error in iter_lines(stream,
+                                               settings.INGEST_MAX_LINE):
+                self.received += 1
+                if self.received > self.max_rows:
+                    raise IngestError(
+                        f'Больше {self.max_rows} строк в одном запросе'
+                    )
+                if error:
+                    self.errors[line] = [error]
+                    continue
+                chunk.append((line, row))
+                if len(chunk) >= self.chunk_size:
+                    self.save_chunk(chunk)
+                    chunk = []
+        except (OSError, EOFError, zlib.error) as error:
+            raise IngestError('Не удалось прочитать тело запроса') from error
+        if chunk:
+            self.save_chunk(chunk)
+
+    def save_chunk(self, chunk, attempts=2):
+        lines = [line for line, _ in chunk]
+        for attempt in range(attempts):
+            readings, errors = prepare_readings(
+                [row for _, row in chunk], contract_ids=self.contract_ids
+            )
+            try:
+                with transaction.atomic():
+                    MeterReading.objects.bulk_create(readings)
+                    invalidate_for_contracts(
+                        {reading.contract_id for reading in readings}
+                    )
+                break
+            except IntegrityError:
+                # Те же месяцы подали параллельно: проверяем пачку заново
+                if attempt == attempts - 1:
+                    raise
+        self.created += len(readings)
+        for i, messages in errors.items():
+            self.errors[lines[i - 1]] = messages
+
+    def summary(self):
+        return {
+            'received': self.received,
+            'created': self.created,
+            'rejected': len(self.errors),
+            'errors': [{'line': line, 'errors': self.errors[line]}
+                       for line in sorted(self.errors)],
+        }
@@ -0,0 +1,42 @@
+# meter_readings/management/commands/archive_history.py
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from contracts.models import Contract
+from meter_readings.archive import archive_contracts
+from twokvolts.archive import archive_boundary
+
+
+class Command(BaseCommand):
+    help = ('Перенос показаний, оплаченных счетов и платежей закрытых '
+            'периодов в архивные таблицы')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=settings.ARCHIVE_BATCH_SIZE,
+                            help='Договоров в одной транзакции')
+
+    def handle(self, *args, **options):
+        before = archive_boundary()
+        totals = {'readings': 0, 'invoices': 0, 'payments': 0}
+        started = time.perf_counter()
+        last = 0
+        while True:
+            batch = list(Contract.objects.filter(id__gt=last).order_by(
+                'id'
+            ).values_list('id', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            for key, count in archive_contracts(batch, before).items():
+                totals[key] += count
+            last = batch[-1]
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Договоров обработано до id {last}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'В архив до {before:%d.%m.%Y}: показаний {totals["readings"]}, '
+            f'счетов {totals["invoices"]}, платежей {totals["payments"]} '
+            f'за {time.perf_counter() - started:.1f} с'
+        ))
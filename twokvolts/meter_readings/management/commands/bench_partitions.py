@@ -0,0 +1,143 @@
+# meter_readings/management/commands/bench_partitions.py
+import re
+import statistics
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max
+from django.test import RequestFactory
+
+from billing.engine import partition_rows, period_bounds
+from contracts.models import Contract
+from dashboard.summary import recent_readings
+from meter_readings.bulk import previous_readings
+from meter_readings.models import MeterReading
+from meter_readings.views import MeterReadingListView
+from twokvolts.partitions import PARTITIONED_TABLES, is_partitioned
+
+
+def _relations(plan):
+    """Таблицы, которые реально читает план"""
+    names = set()
+    if plan.get('Actual Loops') == 0:
+        # Секция отсечена при выполнении (never executed)
+        return names
+    if 'Relation Name' in plan:
+        names.add(plan['Relation Name'])
+    for child in plan.get('Plans', ()):
+        names |= _relations(child)
+    return names
+
+
+class Command(BaseCommand):
+    help = ('Сравнение планов и времени запросов по секционированным '
+            'таблицам и их несекционированным копиям')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, metavar='CONSUMERS',
+                            help='Сначала создать потребителей с историей')
+        parser.add_argument('--years', type=int, default=5,
+                            help='Лет истории при --seed')
+        parser.add_argument('--plans', action='store_true',
+                            help='Вывести текстовые планы')
+
+    def handle(self, *args, **options):
+        for table in PARTITIONED_TABLES:
+            if not is_partitioned(connection, table):
+                raise CommandError(f'Таблица {table} не секционирована')
+        if options['seed']:
+            from twokvolts.testing import seed_dataset
+            seed_dataset(options['seed'], months=12 * options['years'])
+
+        latest = MeterReading.objects.aggregate(last=Max('reading_date'))
+        if latest['last'] is None:
+            raise CommandError('Нет показаний, используйте --seed')
+        last = latest['last']
+        month = last.replace(day=1)
+        contract = Contract.objects.filter(readings__reading_date=last).first()
+        ids = list(contract.consumer.contracts.values_list('id', flat=True))
+
+        # Запросы, которые выполняют страницы, пачки показаний и биллинг
+        request = RequestFactory().get('/')
+        request.user = contract.consumer.user
+        view = MeterReadingListView()
+        view.setup(request)
+        start, end = period_bounds(month)
+        cases = [
+            ('Список показаний', view.get_queryset().order_by(
+                '-reading_date', '-id'
+            )[:view.paginate_by + 1]),
+            ('Последние показания', recent_readings(ids).within_lookback(
+                last
+            )[:5]),
+            ('Последние показания (вся история)', recent_readings(ids)[:5]),
+            ('Предыдущие показания пачки', previous_readings(
+                ids, month
+            ).within_lookback(month)),
+            ('Предыдущие показания пачки (вся история)',
+             previous_readings(ids, month)),
+            ('Строки расчетного прогона', partition_rows(
+                start, end, (min(ids), max(ids))
+            )),
+        ]
+
+        with connection.cursor() as cursor:
+            for table in PARTITIONED_TABLES:
+                self.copy_flat(cursor, table)
+            rows = []
+            for name, queryset in cases:
+                sql, params = queryset.query.sql_with_params()
+                flat_sql = sql
+                for table in PARTITIONED_TABLES:
+                    flat_sql = flat_sql.replace(f'"{table}"',
+                                                f'"{table}_flat"')
+                partitioned, scanned = self.measure(cursor, sql, params,
+                                                    options, name)
+                flat, _ = self.measure(cursor, flat_sql, params, options,
+                                       f'{name} (без секций)')
+                rows.append((name, scanned, flat, partitioned))
+            for table in PARTITIONED_TABLES:
+                cursor.execute(f'DROP TABLE "{table}_flat"')
+
+        width = max(len(name) for name, *_ in rows)
+        self.stdout.write(f'{"Запрос":<{width}}  секций  без секций  '
+                          f'с секциями')
+        for name, scanned, flat, partitioned in rows:
+            self.stdout.write(
+                f'{name:<{width}}  {scanned:>6}  {flat:>7.2f} мс  '
+                f'{partitioned:>7.2f} мс'
+            )
+
+    def copy_flat(self, cursor, table):
+        """Временная обычная таблица с теми же данными и индексами"""
+        flat = f'{table}_flat'
+        cursor.execute(f'CREATE TEMP TABLE "{flat}" AS '
+                       f'SELECT * FROM "{table}"')
+        cursor.execute('SELECT indexname, indexdef FROM pg_indexes '
+                       'WHERE tablename = %s', [table])
+        for index, definition in cursor.fetchall():
+            definition = re.sub(
+                r' ON (ONLY )?\S+ ', f' ON "{flat}" ',
+                definition.replace(f'INDEX {index} ', f'INDEX {index}_f ', 1),
+                count=1
+            )
+            cursor.execute(definition)
+        cursor.execute(f'ANALYZE "{flat}"')
+        cursor.execute(f'ANALYZE "{table}"')
+
+    def measure(self, cursor, sql, params, options, title):
+        timings = []
+        for _ in range(options['repeat']):
+            cursor.execute(f'EXPLAIN (ANALYZE, FORMAT JSON) {sql}', params)
+            result = cursor.fetchone()[0][0]
+            timings.append(result['Planning Time']
+                           + result['Execution Time'])
+        if options['plans']:
+            cursor.execute(f'EXPLAIN {sql}', params)
+            self.stdout.write(f'--- {title}')
+            self.stdout.write('\n'.join(row[0] for row in cursor.fetchall()))
+        scanned = {name for name in _relations(result['Plan'])
+                   if name.startswith(tuple(f'{table}_'
+                                            for table in PARTITIONED_TABLES))}
+        return statistics.median(timings), len(scanned)
@@ -0,0 +1,50 @@
+# meter_readings/management/commands/check_readings.py
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from meter_readings.anomalies import check_chunk, unchecked_contracts
+
+
+class Command(BaseCommand):
+    help = ('Ночная проверка показаний: скачки, откаты и нулевой расход, '
+            'автоподтверждение остальных')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=36,
+                            help='Глубина истории для статистики')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Договоров в одной пачке')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать, ничего не записывать')
+
+    def handle(self, *args, **options):
+        since = (timezone.localdate()
+                 - datetime.timedelta(days=31 * options['months']))
+        totals = {'confirmed': 0, 'spike': 0, 'rollback': 0, 'zero': 0}
+        contracts = 0
+        started = time.perf_counter()
+        last = 0
+        while True:
+            chunk = unchecked_contracts(last, options['chunk_size'])
+            if not chunk:
+                break
+            with transaction.atomic():
+                counts = check_chunk(chunk, since,
+                                     dry_run=options['dry_run'])
+            for label, count in counts.items():
+                totals[label] += count
+            contracts += len(chunk)
+            last = chunk[-1]
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Договоров проверено: {contracts}')
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Договоров: {contracts}, подтверждено: {totals["confirmed"]}, '
+            f'скачков: {totals["spike"]}, откатов: {totals["rollback"]}, '
+            f'нулевых: {totals["zero"]} за {elapsed:.1f} с'
+        ))
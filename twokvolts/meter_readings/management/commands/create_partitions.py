@@ -0,0 +1,58 @@
+# meter_readings/management/commands/create_partitions.py
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from twokvolts.partitions import (PARTITIONED_TABLES, default_partition,
+                                  ensure_partitions, is_partitioned,
+                                  partition_name)
+
+
+class Command(BaseCommand):
+    help = ('Создает годовые секции показаний и счетов на будущие годы '
+            '(запускать по расписанию, например раз в месяц)')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ahead', type=int, default=settings.PARTITIONS_AHEAD_YEARS,
+            help='На сколько лет вперед создать секции'
+        )
+        parser.add_argument(
+            '--from-year', type=int,
+            help='Создать и прошлые секции, начиная с этого года, '
+                 'перенеся их строки из default-секции'
+        )
+
+    def handle(self, *args, **options):
+        this_year = timezone.localdate().year
+        years = range(options['from_year'] or this_year,
+                      this_year + options['ahead'] + 1)
+        if not years:
+            raise CommandError('--from-year позже последнего года секций')
+        qn = connection.ops.quote_name
+        for table, column in PARTITIONED_TABLES.items():
+            if not is_partitioned(connection, table):
+                raise CommandError(
+                    f'Таблица {table} не секционирована, примените миграции'
+                )
+            created = ensure_partitions(connection, table, column, years)
+            for year, moved in created.items():
+                self.stdout.write(
+                    f'Создана секция {partition_name(table, year)}'
+                    + (f', перенесено строк: {moved}' if moved else '')
+                )
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT count(*) FROM {qn(default_partition(table))}'
+                )
+                rest = cursor.fetchone()[0]
+            if rest:
+                # Такие строки читаются без отсечения секций
+                self.stderr.write(self.style.WARNING(
+                    f'В {default_partition(table)} строк: {rest}, '
+                    f'создайте их секции через --from-year'
+                ))
+        self.stdout.write(self.style.SUCCESS(
+            f'Секции на {years[0]}–{years[-1]} годы готовы'
+        ))
@@ -0,0 +1,258 @@
+# meter_readings/management/commands/import_readings.py
+import csv
+import datetime
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+
+from contracts.models import Contract
+from dashboard.summary import invalidate_for_contracts
+from meter_readings.bulk import parse_value
+from meter_readings.models import MeterReading
+
+
+class LineSource:
+    """Итератор по строкам файла, запоминающий смещение прочитанного"""
+
+    def __init__(self, stream, offset):
+        self.stream = stream
+        self.offset = offset
+        self.line = 0
+
+    def __iter__(self):
+        for raw in self.stream:
+            self.offset += len(raw)
+            self.line += 1
+            yield raw.decode('utf-8')
+
+
+class Command(BaseCommand):
+    help = 'Потоковый импорт показаний из выгрузки АСКУЭ (CSV или NDJSON)'
+
+    max_reported_errors = 20
+    batch_size = 2000
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл выгрузки')
+        parser.add_argument(
+            '--format', choices=['csv', 'ndjson'],
+            help='Формат файла (по умолчанию — по расширению)'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=10000,
+            help='Строк в одной транзакции'
+        )
+        parser.add_argument('--delimiter', default=',')
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл контрольной точки (по умолчанию <path>.checkpoint)'
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Игнорировать контрольную точку и начать сначала'
+        )
+
+    def handle(self, *args, **options):
+        path = os.path.abspath(options['path'])
+        if not os.path.exists(path):
+            raise CommandError(f'Файл не найден: {path}')
+        fmt = options['format'] or (
+            'ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv'
+        )
+        self.checkpoint_path = options['checkpoint'] or f'{path}.checkpoint'
+        self.verbosity = options['verbosity']
+        self.reported_errors = 0
+
+        state = {'path': path, 'offset': 0, 'line': 0, 'stats': {
+            'rows': 0, 'imported': 0, 'unknown': 0, 'invalid': 0,
+        }}
+        if not options['restart'] and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as f:
+                saved = json.load(f)
+            if saved.get('path') != path:
+                raise CommandError(
+                    'Контрольная точка относится к другому файлу, '
+                    'используйте --restart'
+                )
+            state = saved
+            self.stdout.write(
+                f'Продолжение импорта со строки {state["line"] + 1}'
+            )
+
+        started = time.monotonic()
+        rows_before = state['stats']['rows']
+        with open(path, 'rb') as stream:
+            records = self.read_records(stream, fmt, state, options)
+            chunk = []
+            for record in records:
+                chunk.append(record)
+                if len(chunk) >= options['chunk_size']:
+                    self.import_chunk(chunk, state, started, rows_before)
+                    chunk = []
+            if chunk:
+                self.import_chunk(chunk, state, started, rows_before)
+
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+        elapsed = time.monotonic() - started
+        stats = state['stats']
+        rows = stats['rows'] - rows_before
+        self.stdout.write(self.style.SUCCESS(
+            f'Импорт завершен: строк {stats["rows"]}, '
+            f'загружено {stats["imported"]}, '
+            f'неизвестных счетчиков {stats["unknown"]}, '
+            f'ошибочных {stats["invalid"]}; '
+            f'{rows / elapsed if elapsed else rows:.0f} строк/с'
+        ))
+
+    def read_records(self, stream, fmt, state, options):
+        """Потоково разбирает файл начиная с сохраненного смещения"""
+        if fmt == 'csv':
+            header = stream.readline()
+            fieldnames = next(csv.reader([header.decode('utf-8-sig')],
+                                         delimiter=options['delimiter']))
+            state['offset'] = max(state['offset'], len(header))
+            state['line'] = max(state['line'], 1)
+        stream.seek(state['offset'])
+        self.source = LineSource(stream, state['offset'])
+        self.source.line = state['line']
+
+        if fmt == 'csv':
+            rows = csv.DictReader(self.source, fieldnames=fieldnames,
+                                  delimiter=options['delimiter'])
+        else:
+            rows = (self.parse_json(line) for line in self.source
+                    if line.strip())
+        for row in rows:
+            yield self.source.line, self.parse_row(row)
+
+    def parse_json(self, line):
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None
+
+    def parse_row(self, row):
+        """Приводит запись к виду (поле ключа, ключ, дата, значение)"""
+        if not isinstance(row, dict):
+            return None
+        if row.get('contract_number'):
+            key = ('contract_number', str(row['contract_number']).strip())
+        elif row.get('meter_number'):
+            key = ('meter_number', str(row['meter_number']).strip())
+        else:
+            return None
+        try:
+            reading_date = datetime.date.fromisoformat(
+                str(row.get('reading_date') or row.get('date')).strip()[:10]
+            )
+        except ValueError:
+            return None
+        # Значение, не помещающееся в поле, считается неверной строкой
+        value, error = parse_value(str(row.get('value')).strip())
+        if error:
+            return None
+        return (*key, reading_date, value)
+
+    def resolve_contracts(self, parsed):
+        """Один запрос на пачку: ключи выгрузки -> id договоров"""
+        numbers = {key for field, key, _, _ in parsed
+                   if field == 'contract_number'}
+        meters = {key for field, key, _, _ in parsed
+                  if field == 'meter_number'}
+        lookup = {}
+        for pk, number, meter, is_active in Contract.objects.filter(
+            Q(contract_number__in=numbers)
+            | Q(meter_number__in=meters, is_active=True)
+        ).values_list('id', 'contract_number', 'meter_number', 'is_active'):
+            lookup['contract_number', number] = pk
+            if is_active:
+                lookup['meter_number', meter] = pk
+        return lookup
+
+    def insert_readings(self, readings):
+        """Вставляет новые показания, возвращает число добавленных.
+
+        Уже загруженные пропускаются ON CONFLICT DO NOTHING, а RETURNING
+        отдает только действительно вставленные строки.
+        """
+        qn = connection.ops.quote_name
+        table = qn(MeterReading._meta.db_table)
+        columns = ', '.join(qn(name) for name in [
+            'contract_id', 'reading_date', 'value', 'submitted_at',
+            'is_confirmed', 'anomaly',
+        ])
+        sql = (
+            f'WITH ins AS (INSERT INTO {table} ({columns}) '
+            f'SELECT unnest(%s::bigint[]), unnest(%s::date[]), '
+            f'unnest(%s::numeric[]), now(), false, \'\' '
+            f'ON CONFLICT DO NOTHING RETURNING 1) SELECT count(*) FROM ins'
+        )
+        imported = 0
+        with connection.cursor() as cursor:
+            for start in range(0, len(readings), self.batch_size):
+                batch = readings[start:start + self.batch_size]
+                cursor.execute(sql, [
+                    [r.contract_id for r in batch],
+                    [r.reading_date for r in batch],
+                    [r.value for r in batch],
+                ])
+                imported += cursor.fetchone()[0]
+        return imported
+
+    def import_chunk(self, chunk, state, started, rows_before):
+        stats = state['stats']
+        parsed = []
+        for line, record in chunk:
+            if record is None:
+                stats['invalid'] += 1
+                self.report_error(line, 'не удалось разобрать строку')
+            else:
+                parsed.append((line, record))
+
+        lookup = self.resolve_contracts([record for _, record in parsed])
+        readings = []
+        for line, (field, key, reading_date, value) in parsed:
+            contract_id = lookup.get((field, key))
+            if contract_id is None:
+                stats['unknown'] += 1
+                self.report_error(line, f'не найден договор {field}={key}')
+                continue
+            readings.append(MeterReading(contract_id=contract_id,
+                                         reading_date=reading_date,
+                                         value=value))
+
+        # Повторно загруженные показания отбрасываются уникальным индексом
+        with transaction.atomic():
+            imported = self.insert_readings(readings)
+            invalidate_for_contracts(r.contract_id for r in readings)
+
+        stats['rows'] += len(chunk)
+        stats['imported'] += imported
+        state['offset'] = self.source.offset
+        state['line'] = self.source.line
+        self.save_checkpoint(state)
+
+        if self.verbosity >= 2:
+            elapsed = time.monotonic() - started
+            rate = (stats['rows'] - rows_before) / elapsed if elapsed else 0
+            self.stdout.write(
+                f'Строка {state["line"]}: {stats["rows"]} обработано, '
+                f'{rate:.0f} строк/с'
+            )
+
+    def save_checkpoint(self, state):
+        tmp_path = f'{self.checkpoint_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def report_error(self, line, message):
+        if self.reported_errors < self.max_reported_errors:
+            self.stderr.write(f'Строка {line}: {message}')
+        self.reported_errors += 1
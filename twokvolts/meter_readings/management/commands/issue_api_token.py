@@ -0,0 +1,47 @@
+# meter_readings/management/commands/issue_api_token.py
+from django.core.management.base import BaseCommand, CommandError
+
+from consumers.models import Consumer
+from contracts.models import Contract
+from meter_readings.models import ApiToken
+
+
+class Command(BaseCommand):
+    help = 'Выпуск токена для API приема показаний'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help='Устройство или интегратор')
+        parser.add_argument('--account',
+                            help='Лицевой счет: все активные договоры '
+                                 'потребителя')
+        parser.add_argument('--contract', action='append', default=[],
+                            help='Номер договора (можно несколько раз)')
+
+    def handle(self, *args, **options):
+        consumer = None
+        if options['account']:
+            consumer = Consumer.objects.filter(
+                personal_account=options['account']
+            ).first()
+            if consumer is None:
+                raise CommandError(
+                    f'Лицевой счет не найден: {options["account"]}'
+                )
+        contracts = list(Contract.objects.filter(
+            contract_number__in=options['contract']
+        ))
+        missing = set(options['contract']) - {
+            contract.contract_number for contract in contracts
+        }
+        if missing:
+            raise CommandError(
+                f'Договоры не найдены: {", ".join(sorted(missing))}'
+            )
+        if consumer is None and not contracts:
+            raise CommandError('Укажите --account или --contract')
+
+        token, key = ApiToken.issue(options['name'], consumer, contracts)
+        self.stdout.write(self.style.SUCCESS(
+            f'Токен {token} выпущен, ключ показывается один раз:'
+        ))
+        self.stdout.write(key)
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.16 on 2026-10-18 10:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meter_readings', '0002_api_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meterreading',
+            name='anomaly',
+            field=models.CharField(blank=True, choices=[('', 'Нет'), ('spike', 'Скачок расхода'), ('rollback', 'Откат счетчика'), ('zero', 'Нулевой расход')], default='', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='meterreading',
+            index=models.Index(condition=models.Q(('anomaly', ''), ('is_confirmed', False)), fields=['contract'], name='meter_reading_unchecked'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.16 on 2026-10-18 11:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meter_readings', '0003_reading_anomaly'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='meterreading',
+            index=models.Index(fields=['-reading_date', '-id'], name='meter_reading_date_id'),
+        ),
+        migrations.AddIndex(
+            model_name='meterreading',
+            index=models.Index(condition=models.Q(('anomaly', ''), _negated=True), fields=['-reading_date'], name='meter_reading_anomaly'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.16 on 2026-10-18 11:10
+
+from django.db import migrations
+
+from twokvolts.partitions import partition_table, unpartition_table
+
+
+def partition(apps, schema_editor):
+    partition_table(schema_editor, 'meter_readings_meterreading',
+                    'reading_date')
+
+
+def unpartition(apps, schema_editor):
+    unpartition_table(schema_editor, 'meter_readings_meterreading',
+                      'reading_date')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0006_invoice_db_constraint'),
+        ('meter_readings', '0004_reading_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.16 on 2026-10-18 11:08
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0002_tariff_tiers_zones'),
+        ('meter_readings', '0005_partition_reading_by_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadingArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_date', models.DateField()),
+                ('last_date', models.DateField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('ids', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), size=None)),
+                ('dates', django.contrib.postgres.fields.ArrayField(base_field=models.DateField(), size=None)),
+                ('values', django.contrib.postgres.fields.ArrayField(base_field=models.DecimalField(decimal_places=4, max_digits=12), size=None)),
+                ('confirmed', django.contrib.postgres.fields.ArrayField(base_field=models.BooleanField(), size=None)),
+                ('submitted', django.contrib.postgres.fields.ArrayField(base_field=models.DateTimeField(), size=None)),
+                ('contract', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contracts.contract')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='readingarchive',
+            index=models.Index(fields=['contract', 'last_date'], name='reading_archive_contract'),
+        ),
+    ]
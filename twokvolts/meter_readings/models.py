@@ -1,8 +1,37 @@
+import datetime
+import hashlib
+import secrets
+
+from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
 from django.db import models
+from django.db.models import Q
+
+from consumers.models import Consumer
 from contracts.models import Contract
+from twokvolts.archive import PackedArchive
+
+
+class MeterReadingQuerySet(models.QuerySet):
+
+    def within_lookback(self, day):
+        """Показания не старше READINGS_LOOKBACK_DAYS до ``day``.
+
+        Нижняя граница даты отсекает секции прошлых лет в запросах
+        «последнее показание до даты», у которых есть только верхняя.
+        """
+        return self.filter(reading_date__gte=day - datetime.timedelta(
+            days=settings.READINGS_LOOKBACK_DAYS
+        ))
 
 
 class MeterReading(models.Model):
+    ANOMALY_CHOICES = [
+        ('', 'Нет'),
+        ('spike', 'Скачок расхода'),
+        ('rollback', 'Откат счетчика'),
+        ('zero', 'Нулевой расход'),
+    ]
     contract = models.ForeignKey(Contract,
                                  on_delete=models.CASCADE,
                                  related_name='readings')
@@ -11,7 +40,96 @@ class MeterReading(models.Model):
                                 decimal_places=4)  # Значение счетчика в кВт*ч
     submitted_at = models.DateTimeField(auto_now_add=True)
     is_confirmed = models.BooleanField(default=False)
+    # Проставляется командой check_readings
+    anomaly = models.CharField(max_length=10, choices=ANOMALY_CHOICES,
+                               blank=True, default='')
+
+    objects = MeterReadingQuerySet.as_manager()
 
     class Meta:
         ordering = ['-reading_date']
-        unique_together = ['contract', 'reading_date']
\ No newline at end of file
+        unique_together = ['contract', 'reading_date']
+        indexes = [
+            # Договоры с непроверенными показаниями
+            models.Index(fields=['contract'],
+                         condition=Q(is_confirmed=False, anomaly=''),
+                         name='meter_reading_unchecked'),
+            # Порядок списка в админке (-reading_date, -pk)
+            models.Index(fields=['-reading_date', '-id'],
+                         name='meter_reading_date_id'),
+            # Фильтр по аномалиям в админке
+            models.Index(fields=['-reading_date'], condition=~Q(anomaly=''),
+                         name='meter_reading_anomaly'),
+        ]
+
+
+class ReadingArchive(PackedArchive):
+    """Показания закрытых периодов, перенесенные командой archive_history"""
+
+    ids = ArrayField(models.BigIntegerField())
+    dates = ArrayField(models.DateField())
+    values = ArrayField(models.DecimalField(max_digits=12, decimal_places=4))
+    confirmed = ArrayField(models.BooleanField())
+    submitted = ArrayField(models.DateTimeField())
+
+    packed = {
+        'id': 'ids',
+        'reading_date': 'dates',
+        'value': 'values',
+        'is_confirmed': 'confirmed',
+        'submitted_at': 'submitted',
+    }
+    date_field = 'reading_date'
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['contract', 'last_date'],
+                         name='reading_archive_contract'),
+        ]
+
+
+class ApiToken(models.Model):
+    """Токен устройства или интегратора для API приема показаний.
+
+    Хранится только хэш ключа, сам ключ показывается один раз при выпуске.
+    """
+
+    name = models.CharField(max_length=100)  # Концентратор, интегратор
+    prefix = models.CharField(max_length=8)  # Начало ключа для поиска в логах
+    key_hash = models.CharField(max_length=64, unique=True)
+    consumer = models.ForeignKey(Consumer, on_delete=models.CASCADE,
+                                 null=True, blank=True,
+                                 related_name='api_tokens')
+    contracts = models.ManyToManyField(Contract, blank=True,
+                                       related_name='api_tokens')
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.name} ({self.prefix}…)'
+
+    @staticmethod
+    def hash_key(key):
+        # Ключ случайный и длинный, медленный хэш паролей не нужен
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    @classmethod
+    def issue(cls, name, consumer=None, contracts=()):
+        """Выпускает токен, возвращает (токен, ключ)"""
+        key = secrets.token_urlsafe(32)
+        token = cls.objects.create(name=name, prefix=key[:8],
+                                   key_hash=cls.hash_key(key),
+                                   consumer=consumer)
+        token.contracts.set(contracts)
+        return token, key
+
+    def contract_ids(self):
+        """Договоры, по которым токен может подавать показания (1 запрос).
+
+        Явно выданные договоры плюс активные договоры потребителя.
+        """
+        return set(Contract.objects.filter(
+            Q(api_tokens=self)
+            | Q(consumer_id=self.consumer_id, is_active=True)
+        ).values_list('id', flat=True))
@@ -7,8 +7,11 @@ urlpatterns = [
     path('', views.MeterReadingListView.as_view(), name='list'),
     path('submit/', views.MeterReadingCreateView.as_view(), name='submit'),
     path('history/', views.MeterReadingHistoryView.as_view(), name='history'),
+    path('history/data/', views.MeterReadingChartDataView.as_view(), name='chart_data'),
     path('<int:pk>/', views.MeterReadingDetailView.as_view(), name='detail'),
     path('<int:pk>/edit/', views.MeterReadingUpdateView.as_view(), name='edit'),
     path('<int:pk>/delete/', views.MeterReadingDeleteView.as_view(), name='delete'),
     path('bulk-submit/', views.BulkMeterReadingView.as_view(), name='bulk_submit'),
+    path('export/', views.MeterReadingExportView.as_view(), name='export'),
+    path('api/ingest/', views.ReadingIngestView.as_view(), name='api_ingest'),
 ]
\ No newline at end of file
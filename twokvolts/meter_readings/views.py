@@ -1,30 +1,47 @@
-from django.shortcuts import render
-
 # meter_readings/views.py
+import hashlib
+from datetime import date
+from urllib.parse import urlencode
+
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.views.generic import ListView, CreateView, UpdateView, DeleteView, DetailView, TemplateView
-from django.urls import reverse_lazy
+from django.views.generic import (ListView, CreateView, UpdateView,
+                                  DeleteView, DetailView, TemplateView,
+                                  FormView, View)
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
+from django.http import JsonResponse
+from django.urls import reverse, reverse_lazy
 from django.contrib import messages
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
-from .models import MeterReading
+from django.db import IntegrityError, transaction
+from .models import MeterReading, ReadingArchive
 from contracts.models import Contract
-from consumers.models import Consumer
+from consumers.middleware import get_consumer
+from consumers.mixins import ConsumerMixin
+from dashboard.summary import data_version, invalidate_home_summary
+from twokvolts.exports import StreamingExportView
+from twokvolts.pagination import KeysetPaginationMixin
+from twokvolts.replicas import ReplicaReadMixin
+from .charts import chart_data, reading_series
 from .forms import MeterReadingForm, BulkMeterReadingForm
+from .ingest import (IngestError, ReadingIngest, authenticate_token,
+                     open_body)
 
-class MeterReadingListView(LoginRequiredMixin, ListView):
+class MeterReadingListView(LoginRequiredMixin, ConsumerMixin,
+                           KeysetPaginationMixin, ListView):
     """Список показаний счетчиков"""
     model = MeterReading
     template_name = 'meter_readings/list.html'
     context_object_name = 'readings'
     paginate_by = 10
+    # Курсорный вывод: страница N стоит столько же, сколько первая
+    keyset_ordering = ('-reading_date', '-id')
     
     def get_queryset(self):
-        consumer = get_object_or_404(Consumer, user=self.request.user)
-        contracts = Contract.objects.filter(consumer=consumer, is_active=True)
-        
         queryset = MeterReading.objects.filter(
-            contract__in=contracts
+            contract_id__in=self.get_contract_ids()
         ).select_related('contract', 'contract__tariff')
         
         # Фильтрация по договору
@@ -40,19 +57,17 @@ class MeterReadingListView(LoginRequiredMixin, ListView):
         if date_to:
             queryset = queryset.filter(reading_date__lte=date_to)
         
-        return queryset.order_by('-reading_date')
+        return queryset
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        consumer = get_object_or_404(Consumer, user=self.request.user)
-        context['contracts'] = Contract.objects.filter(
-            consumer=consumer, 
-            is_active=True
-        )
+        context['contracts'] = list(Contract.objects.filter(
+            id__in=self.get_contract_ids()
+        ))
         return context
 
 
-class MeterReadingCreateView(LoginRequiredMixin, CreateView):
+class MeterReadingCreateView(LoginRequiredMixin, ConsumerMixin, CreateView):
     """Подача новых показаний"""
     model = MeterReading
     form_class = MeterReadingForm
@@ -61,11 +76,10 @@ class MeterReadingCreateView(LoginRequiredMixin, CreateView):
     
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        kwargs['user'] = self.request.user
+        kwargs['contract_ids'] = self.get_contract_ids()
         return kwargs
     
     def form_valid(self, form):
-        form.instance.submitted_by = self.request.user
         response = super().form_valid(form)
         messages.success(
             self.request, 
@@ -81,21 +95,30 @@ class MeterReadingCreateView(LoginRequiredMixin, CreateView):
         return super().form_invalid(form)
 
 
-class MeterReadingUpdateView(LoginRequiredMixin, UpdateView):
+class MeterReadingUpdateView(LoginRequiredMixin, ConsumerMixin, UpdateView):
     """Редактирование показаний"""
     model = MeterReading
     form_class = MeterReadingForm
     template_name = 'meter_readings/edit.html'
     
     def get_queryset(self):
-        consumer = get_object_or_404(Consumer, user=self.request.user)
-        contracts = Contract.objects.filter(consumer=consumer)
-        return MeterReading.objects.filter(contract__in=contracts)
+        return MeterReading.objects.filter(
+            contract__consumer=self.get_consumer()
+        )
+    
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['contract_ids'] = self.get_contract_ids()
+        return kwargs
     
     def get_success_url(self):
         return reverse_lazy('meter_readings:detail', kwargs={'pk': self.object.pk})
     
     def form_valid(self, form):
+        # Исправленное показание снова не подтверждено
+        # и заново пройдет ночную проверку
+        form.instance.is_confirmed = False
+        form.instance.anomaly = ''
         messages.success(
             self.request,
             'Показания успешно обновлены!'
@@ -103,16 +126,16 @@ class MeterReadingUpdateView(LoginRequiredMixin, UpdateView):
         return super().form_valid(form)
 
 
-class MeterReadingDeleteView(LoginRequiredMixin, DeleteView):
+class MeterReadingDeleteView(LoginRequiredMixin, ConsumerMixin, DeleteView):
     """Удаление показаний"""
     model = MeterReading
     template_name = 'meter_readings/confirm_delete.html'
     success_url = reverse_lazy('meter_readings:list')
     
     def get_queryset(self):
-        consumer = get_object_or_404(Consumer, user=self.request.user)
-        contracts = Contract.objects.filter(consumer=consumer)
-        return MeterReading.objects.filter(contract__in=contracts)
+        return MeterReading.objects.filter(
+            contract__consumer=self.get_consumer()
+        )
     
     def delete(self, request, *args, **kwargs):
         messages.success(
@@ -122,24 +145,26 @@ class MeterReadingDeleteView(LoginRequiredMixin, DeleteView):
         return super().delete(request, *args, **kwargs)
 
 
-class MeterReadingDetailView(LoginRequiredMixin, DetailView):
+class MeterReadingDetailView(LoginRequiredMixin, ConsumerMixin, DetailView):
     """Детальный просмотр показаний"""
     model = MeterReading
     template_name = 'meter_readings/detail.html'
     context_object_name = 'reading'
     
     def get_queryset(self):
-        consumer = get_object_or_404(Consumer, user=self.request.user)
-        contracts = Contract.objects.filter(consumer=consumer)
-        return MeterReading.objects.filter(contract__in=contracts)
+        return MeterReading.objects.filter(
+            contract__consumer=self.get_consumer()
+        )
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # Получаем предыдущие показания для сравнения
-        previous = MeterReading.objects.filter(
-            contract=self.object.contract,
-            reading_date__lt=self.object.reading_date
-        ).order_by('-reading_date').first()
+        # Получаем предыдущие показания для сравнения: сначала в пределах
+        # окна (только свежие секции), затем по всей истории
+        day = self.object.reading_date
+        earlier = MeterReading.objects.filter(
+            contract=self.object.contract_id, reading_date__lt=day
+        ).order_by('-reading_date')
+        previous = earlier.within_lookback(day).first() or earlier.first()
         
         if previous:
             consumption = self.object.value - previous.value
@@ -149,41 +174,83 @@ class MeterReadingDetailView(LoginRequiredMixin, DetailView):
         return context
 
 
-class MeterReadingHistoryView(LoginRequiredMixin, TemplateView):
+class MeterReadingHistoryView(LoginRequiredMixin, ReplicaReadMixin,
+                              ConsumerMixin, TemplateView):
     """История показаний с графиком"""
     template_name = 'meter_readings/history.html'
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        consumer = get_object_or_404(Consumer, user=self.request.user)
+        consumer = self.get_consumer()
         contract_id = self.request.GET.get('contract')
         
         if contract_id:
             contract = get_object_or_404(Contract, id=contract_id, consumer=consumer)
-            readings = MeterReading.objects.filter(
-                contract=contract
-            ).order_by('reading_date')
-            
-            # Подготовка данных для графика
-            dates = [r.reading_date.strftime('%Y-%m') for r in readings]
-            values = [float(r.value) for r in readings]
-            
-            context['readings'] = readings
+            # Сами точки график загружает из chart_data
+            query = {'contract': contract.id}
+            for key in ('date_from', 'date_to'):
+                if self.request.GET.get(key):
+                    query[key] = self.request.GET[key]
             context['contract'] = contract
-            context['chart_data'] = {
-                'dates': dates,
-                'values': values
-            }
+            context['chart_data_url'] = (
+                f"{reverse('meter_readings:chart_data')}?{urlencode(query)}"
+            )
         
         context['contracts'] = Contract.objects.filter(
-            consumer=consumer, 
-            is_active=True
+            id__in=self.get_contract_ids()
         )
         
         return context
 
 
-class BulkMeterReadingView(LoginRequiredMixin, CreateView):
+def chart_etag(request, *args, **kwargs):
+    """ETag по версии данных потребителя и параметрам запроса"""
+    consumer = get_consumer(request)
+    if consumer is None:
+        return None
+    params = sorted(request.GET.items())
+    return hashlib.md5(
+        f'{data_version(consumer.pk)}:{params}'.encode()
+    ).hexdigest()
+
+
+@method_decorator(condition(etag_func=chart_etag), name='get')
+class MeterReadingChartDataView(LoginRequiredMixin, ReplicaReadMixin,
+                                ConsumerMixin, View):
+    """Данные графика показаний, прореженные до заданного числа точек"""
+    default_points = 300
+    max_points = 2000
+    
+    def get(self, request, *args, **kwargs):
+        try:
+            contract_id = int(request.GET['contract'])
+            points = int(request.GET.get('points', self.default_points))
+            date_from, date_to = (
+                date.fromisoformat(request.GET[key]) if request.GET.get(key)
+                else None
+                for key in ('date_from', 'date_to')
+            )
+        except (KeyError, ValueError):
+            return JsonResponse(
+                {'error': 'Неверные параметры: contract, points, '
+                          'date_from, date_to (YYYY-MM-DD)'},
+                status=400
+            )
+        contract = get_object_or_404(
+            Contract.objects.only('id'), id=contract_id,
+            consumer=self.get_consumer()
+        )
+        
+        series = reading_series(contract.id, date_from, date_to)
+        data = chart_data(series, min(max(points, 3), self.max_points))
+        data['contract'] = contract.id
+        response = JsonResponse(data)
+        # Браузер каждый раз сверяет ETag и получает 304 без тела
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class BulkMeterReadingView(LoginRequiredMixin, ConsumerMixin, FormView):
     """Массовая подача показаний (для нескольких договоров сразу)"""
     template_name = 'meter_readings/bulk_submit.html'
     form_class = BulkMeterReadingForm
@@ -191,25 +258,78 @@ class BulkMeterReadingView(LoginRequiredMixin, CreateView):
     
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        kwargs['user'] = self.request.user
+        kwargs['contract_ids'] = self.get_contract_ids()
         return kwargs
     
     def form_valid(self, form):
-        # Обработка массовой подачи
-        readings_data = form.cleaned_data['readings']
-        created_count = 0
-        
-        for data in readings_data:
-            MeterReading.objects.create(
-                contract=data['contract'],
-                reading_date=data['date'],
-                value=data['value'],
-                submitted_by=self.request.user
+        # Обработка массовой подачи одной транзакцией
+        readings = form.cleaned_data['readings']
+        try:
+            with transaction.atomic():
+                MeterReading.objects.bulk_create(readings)
+                invalidate_home_summary([self.get_consumer().pk])
+        except IntegrityError:
+            form.add_error(
+                'readings',
+                'Часть показаний уже подана, обновите страницу и повторите'
             )
-            created_count += 1
+            return self.form_invalid(form)
         
         messages.success(
             self.request,
-            f'Успешно подано {created_count} показаний!'
+            f'Успешно подано {len(readings)} показаний!'
         )
         return super().form_valid(form)
+    
+    def form_invalid(self, form):
+        messages.error(
+            self.request,
+            'Пожалуйста, исправьте ошибки в форме.'
+        )
+        return super().form_invalid(form)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class ReadingIngestView(View):
+    """API приема показаний от концентраторов и интеграторов.
+
+    POST с NDJSON (можно сжатым gzip), по записи
+    ``{"contract": id, "date": "YYYY-MM-DD", "value": ...}`` на строку.
+    Авторизация токеном ``Authorization: Bearer <ключ>``, сессии и
+    CSRF не используются. В ответе итог и ошибки по номерам строк.
+    """
+
+    def post(self, request, *args, **kwargs):
+        token = authenticate_token(request)
+        if token is None:
+            return JsonResponse({'error': 'Неверный токен'}, status=401)
+        stream = open_body(request)
+        if stream is None:
+            return JsonResponse({'error': 'Поддерживается только gzip'},
+                                status=415)
+
+        ingest = ReadingIngest(token.contract_ids())
+        try:
+            ingest.run(stream)
+        except IngestError as error:
+            # Принятые до ошибки пачки уже сохранены
+            return JsonResponse({'error': str(error), **ingest.summary()},
+                                status=400)
+        return JsonResponse(ingest.summary())
+
+
+class MeterReadingExportView(StreamingExportView):
+    """Выгрузка показаний"""
+    model = MeterReading
+    fields = (('contract_number', 'contract__contract_number'),
+              ('meter_number', 'contract__meter_number'),
+              ('reading_date', 'reading_date'),
+              ('value', 'value'),
+              ('is_confirmed', 'is_confirmed'),
+              ('submitted_at', 'submitted_at'))
+    # Порядок уникального индекса (contract, reading_date)
+    ordering = ('contract_id', 'reading_date')
+    consumer_lookup = 'contract__consumer'
+    date_field = 'reading_date'
+    filename = 'readings'
+    archive_model = ReadingArchive
@@ -1,4 +1,39 @@
 from django.contrib import admin
+from django.db import transaction
+from django.db.models import Sum
+
+from billing.models import Invoice
+from dashboard.summary import invalidate_home_summary
+from twokvolts.pagination import EstimatedCountPaginator
 from .models import Payment
 
-admin.site.register(Payment)
+
+@admin.register(Payment)
+class PaymentAdmin(admin.ModelAdmin):
+    list_display = ('id', 'payment_date', 'invoice', 'personal_account',
+                    'amount', 'method', 'external_id')
+    list_filter = ('method',)
+    list_select_related = ('invoice__contract__consumer',)
+    search_fields = ('=external_id', '=invoice__id',
+                     '=invoice__contract__consumer__personal_account')
+    raw_id_fields = ('invoice',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    @admin.display(description='Лицевой счет')
+    def personal_account(self, obj):
+        return obj.invoice.contract.consumer.personal_account
+
+    def delete_queryset(self, request, queryset):
+        # Массовое удаление минует Payment.delete, поэтому суммы оплат
+        # счетов пересчитываются здесь же одним UPDATE
+        with transaction.atomic():
+            totals = queryset.order_by().values('invoice_id').annotate(
+                total=Sum('amount')
+            ).values_list('invoice_id', 'total')
+            deltas = {invoice_id: -total for invoice_id, total in totals}
+            invalidate_home_summary(queryset.values_list(
+                'invoice__contract__consumer_id', flat=True
+            ).distinct())
+            queryset.delete()
+            Invoice.objects.apply_payments(deltas)
@@ -0,0 +1,79 @@
+# payments/management/commands/reconcile_statement.py
+import csv
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.reconcile import reconcile_chunk
+
+
+class Command(BaseCommand):
+    help = 'Загрузка банковской выписки: сопоставление строк со счетами'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='CSV с колонками external_id, date, amount и хотя бы '
+                 'одной из invoice, personal_account, purpose'
+        )
+        parser.add_argument('--delimiter', default=',')
+        parser.add_argument('--encoding', default='utf-8-sig')
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Строк в одной транзакции')
+        parser.add_argument(
+            '--unmatched',
+            help='Куда записать несопоставленные и ошибочные строки (CSV)'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'Файл не найден: {path}')
+
+        self.verbosity = options['verbosity']
+        started = time.monotonic()
+        totals = {}
+        unmatched_file = writer = None
+        with open(path, newline='', encoding=options['encoding']) as f:
+            reader = csv.DictReader(f, delimiter=options['delimiter'])
+            if options['unmatched']:
+                unmatched_file = open(options['unmatched'], 'w', newline='',
+                                      encoding='utf-8')
+                writer = csv.DictWriter(unmatched_file,
+                                        fieldnames=reader.fieldnames or [],
+                                        delimiter=options['delimiter'],
+                                        extrasaction='ignore')
+                writer.writeheader()
+            try:
+                chunk = []
+                for row in reader:
+                    chunk.append(row)
+                    if len(chunk) >= options['chunk_size']:
+                        self.process(chunk, totals, writer)
+                        chunk = []
+                if chunk:
+                    self.process(chunk, totals, writer)
+            finally:
+                if unmatched_file:
+                    unmatched_file.close()
+
+        elapsed = time.monotonic() - started
+        rows = totals.get('rows', 0)
+        self.stdout.write(self.style.SUCCESS(
+            f'Строк {rows}: проведено платежей {totals.get("created", 0)}, '
+            f'повторов {totals.get("duplicates", 0)}, '
+            f'не сопоставлено {totals.get("unmatched", 0)}, '
+            f'ошибочных {totals.get("invalid", 0)}, '
+            f'закрыто счетов {totals.get("settled", 0)}; '
+            f'{rows / elapsed if elapsed else rows:.0f} строк/с'
+        ))
+
+    def process(self, chunk, totals, writer):
+        stats, unmatched = reconcile_chunk(chunk)
+        for key, value in stats.items():
+            totals[key] = totals.get(key, 0) + value
+        if writer:
+            writer.writerows(unmatched)
+        if self.verbosity >= 2:
+            self.stdout.write(f'Обработано строк: {totals["rows"]}')
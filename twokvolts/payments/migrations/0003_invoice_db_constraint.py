@@ -0,0 +1,20 @@
+# Generated by Django 3.2.16 on 2026-10-18 11:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0005_overdue_sweep'),
+        ('payments', '0002_payment_external_id_unique'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payment',
+            name='invoice',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.PROTECT, related_name='payments', to='billing.invoice'),
+        ),
+    ]
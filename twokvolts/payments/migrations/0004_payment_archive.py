@@ -0,0 +1,37 @@
+# Generated by Django 3.2.16 on 2026-10-18 11:08
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0002_tariff_tiers_zones'),
+        ('payments', '0003_invoice_db_constraint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_date', models.DateField()),
+                ('last_date', models.DateField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('ids', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), size=None)),
+                ('invoices', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), size=None)),
+                ('amounts', django.contrib.postgres.fields.ArrayField(base_field=models.DecimalField(decimal_places=2, max_digits=12), size=None)),
+                ('dates', django.contrib.postgres.fields.ArrayField(base_field=models.DateField(), size=None)),
+                ('external_ids', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=100), size=None)),
+                ('methods', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=50), size=None)),
+                ('created', django.contrib.postgres.fields.ArrayField(base_field=models.DateTimeField(), size=None)),
+                ('contract', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contracts.contract')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='paymentarchive',
+            index=models.Index(fields=['contract', 'last_date'], name='payment_archive_contract'),
+        ),
+    ]
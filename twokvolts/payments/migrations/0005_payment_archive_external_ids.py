@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-18 11:34
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0004_payment_archive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paymentarchive',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['external_ids'], name='payment_archive_external_ids'),
+        ),
+    ]
@@ -1,5 +1,11 @@
-from django.db import models
+from decimal import Decimal
+
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.db import models, transaction
+
 from billing.models import Invoice
+from twokvolts.archive import PackedArchive
 
 
 class Payment(models.Model):
@@ -8,19 +14,78 @@ class Payment(models.Model):
         ('Online', 'Безналичный'),
         ('Bank transfer', 'Банковский перевод'),
     ]
+    # Таблица счетов секционирована, внешний ключ проверяет Django
     invoice = models.ForeignKey(Invoice,
                                 on_delete=models.PROTECT,
-                                related_name='payments')
+                                related_name='payments',
+                                db_constraint=False)
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     payment_date = models.DateField()
     external_id = models.CharField(max_length=100, blank=True)
     method = models.CharField(max_length=50, choices=METHOD_CHOICES)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            # Одна банковская операция — один платеж
+            models.UniqueConstraint(fields=['external_id'],
+                                    condition=~models.Q(external_id=''),
+                                    name='payment_external_id_unique'),
+        ]
+
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Логика обновления статуса счета после оплаты
-        total_paid = self.invoice.payments.aggregate(total=models.Sum('amount'))['total'] or 0
-        if total_paid >= self.invoice.amount:
-            self.invoice.status = 'paid'
-            self.invoice.save()
+        # Сумма оплат счета меняется в той же транзакции, что и платеж
+        with transaction.atomic():
+            deltas = {}
+            if not self._state.adding:
+                previous = Payment.objects.select_for_update().filter(
+                    pk=self.pk
+                ).values_list('invoice_id', 'amount').first()
+                if previous:
+                    deltas[previous[0]] = -previous[1]
+            super().save(*args, **kwargs)
+            amount = Decimal(str(self.amount))
+            deltas[self.invoice_id] = deltas.get(self.invoice_id, 0) + amount
+            Invoice.objects.apply_payments(deltas)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            Invoice.objects.apply_payments(
+                {self.invoice_id: -Decimal(str(self.amount))}
+            )
+        return result
+
+
+class PaymentArchive(PackedArchive):
+    """Платежи по счетам, перенесенным в архив (команда archive_history)"""
+
+    ids = ArrayField(models.BigIntegerField())
+    invoices = ArrayField(models.BigIntegerField())
+    amounts = ArrayField(models.DecimalField(max_digits=12,
+                                             decimal_places=2))
+    dates = ArrayField(models.DateField())
+    external_ids = ArrayField(models.CharField(max_length=100))
+    methods = ArrayField(models.CharField(max_length=50))
+    created = ArrayField(models.DateTimeField())
+
+    packed = {
+        'id': 'ids',
+        'invoice_id': 'invoices',
+        'amount': 'amounts',
+        'payment_date': 'dates',
+        'external_id': 'external_ids',
+        'method': 'methods',
+        'created_at': 'created',
+    }
+    date_field = 'payment_date'
+    aliases = {'invoice__contract': 'contract'}
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['contract', 'last_date'],
+                         name='payment_archive_contract'),
+            # Проверка повторной загрузки выписки (reconcile_statement)
+            GinIndex(fields=['external_ids'],
+                     name='payment_archive_external_ids'),
+        ]
@@ -0,0 +1,174 @@
+# payments/reconcile.py
+import datetime
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from billing.models import OPEN_STATUSES, Invoice
+from dashboard.summary import invalidate_for_contracts
+from .models import Payment, PaymentArchive
+
+INVOICE_RE = re.compile(r'(?:#|№)\s*(\d+)')
+
+
+def _parse_date(value):
+    value = value.strip()
+    if '.' in value:
+        return datetime.datetime.strptime(value[:10], '%d.%m.%Y').date()
+    return datetime.date.fromisoformat(value[:10])
+
+
+def parse_row(row):
+    """Строка выписки -> (операция, дата, сумма, счет, лицевой счет)"""
+    if not isinstance(row, dict):
+        return None
+    external_id = str(row.get('external_id') or '').strip()
+    try:
+        payment_date = _parse_date(str(row.get('date') or ''))
+        amount = Decimal(str(row.get('amount') or '').replace(',', '.')
+                         .replace(' ', ''))
+    except (ValueError, InvalidOperation):
+        return None
+    if not external_id or not amount.is_finite() or amount <= 0:
+        return None
+    try:
+        # Сумма, не помещающаяся в поле, сорвала бы вставку всей пачки
+        Payment._meta.get_field('amount').run_validators(amount)
+    except ValidationError:
+        return None
+
+    invoice = str(row.get('invoice') or '').strip().lstrip('#№')
+    if not invoice.isdigit():
+        match = INVOICE_RE.search(str(row.get('purpose') or ''))
+        invoice = match.group(1) if match else ''
+    account = str(row.get('personal_account') or '').strip()
+    return (external_id, payment_date, amount,
+            int(invoice) if invoice else None, account)
+
+
+def _lookup_invoices(parsed):
+    """Счета по номерам и лицевым счетам, по одному запросу на вид"""
+    numbers = {row[3] for row in parsed if row[3] is not None}
+    by_number = dict(Invoice.objects.filter(
+        id__in=numbers
+    ).values_list('id', 'contract_id'))
+
+    accounts = {row[4] for row in parsed if row[4]}
+    by_account = {}
+    # Самый старый неоплаченный счет каждого лицевого счета
+    for account, pk, contract_id in Invoice.objects.filter(
+        contract__consumer__personal_account__in=accounts,
+        status__in=OPEN_STATUSES
+    ).order_by(
+        'contract__consumer__personal_account', 'due_date', 'id'
+    ).distinct('contract__consumer__personal_account').values_list(
+        'contract__consumer__personal_account', 'id', 'contract_id'
+    ):
+        by_account[account] = (pk, contract_id)
+    return by_number, by_account
+
+
+def _known_operations(external_ids):
+    """Уже проведенные операции, включая платежи, ушедшие в архив"""
+    external_ids = set(external_ids)
+    known = set(Payment.objects.filter(
+        external_id__in=external_ids
+    ).values_list('external_id', flat=True))
+    # Уникальный индекс не видит архив, поэтому он проверяется здесь
+    for archived in PaymentArchive.objects.filter(
+        external_ids__overlap=list(external_ids)
+    ).values_list('external_ids', flat=True):
+        known.update(external_ids.intersection(archived))
+    return known
+
+
+def reconcile_chunk(rows, method='Bank transfer'):
+    """Сопоставляет пачку строк выписки со счетами и проводит платежи.
+
+    Повторная загрузка той же выписки ничего не меняет: операции
+    с уже известным ``external_id`` пропускаются, а гонки гасит
+    уникальный индекс. Возвращает статистику и несопоставленные строки.
+    """
+    stats = dict.fromkeys(
+        ('rows', 'created', 'duplicates', 'unmatched', 'invalid',
+         'settled'), 0
+    )
+    stats['rows'] = len(rows)
+    parsed = {}
+    unmatched = []
+    for row in rows:
+        item = parse_row(row)
+        if item is None:
+            stats['invalid'] += 1
+            unmatched.append(row)
+        elif item[0] in parsed:
+            stats['duplicates'] += 1
+        else:
+            parsed[item[0]] = (item, row)
+
+    known = _known_operations(parsed)
+    stats['duplicates'] += len(known)
+    fresh = [value for key, value in parsed.items() if key not in known]
+    by_number, by_account = _lookup_invoices([item for item, _ in fresh])
+
+    payments = []
+    contracts = set()
+    for (external_id, day, amount, number, account), row in fresh:
+        if number in by_number:
+            invoice_id, contract_id = number, by_number[number]
+        elif account in by_account:
+            invoice_id, contract_id = by_account[account]
+        else:
+            stats['unmatched'] += 1
+            unmatched.append(row)
+            continue
+        contracts.add(contract_id)
+        payments.append(Payment(invoice_id=invoice_id, amount=amount,
+                                payment_date=day, external_id=external_id,
+                                method=method))
+
+    stats['created'], stats['settled'] = _insert(payments, stats)
+    invalidate_for_contracts(contracts)
+    return stats, unmatched
+
+
+def _insert(payments, stats, attempts=3):
+    """Вставляет платежи и прибавляет их к оплаченным суммам счетов.
+
+    Суммы меняются через F(), поэтому вставлено должно быть ровно то,
+    что прибавлено: если параллельная загрузка успела провести часть
+    операций, они отбрасываются и пачка повторяется.
+    """
+    for attempt in range(attempts):
+        try:
+            with transaction.atomic():
+                Payment.objects.bulk_create(payments)
+                deltas = {}
+                for payment in payments:
+                    deltas[payment.invoice_id] = (
+                        deltas.get(payment.invoice_id, 0) + payment.amount
+                    )
+                Invoice.objects.apply_payments(deltas)
+                return len(payments), _settled(deltas)
+        except IntegrityError:
+            if attempt == attempts - 1:
+                raise
+            known = set(Payment.objects.filter(
+                external_id__in=[p.external_id for p in payments]
+            ).values_list('external_id', flat=True))
+            stats['duplicates'] += len(known)
+            payments = [p for p in payments if p.external_id not in known]
+            for payment in payments:
+                payment.pk = None
+
+
+def _settled(deltas):
+    """Сколько счетов закрыла эта пачка платежей"""
+    return sum(
+        1 for pk, amount, paid_total in Invoice.objects.filter(
+            pk__in=deltas, status='paid'
+        ).values_list('pk', 'amount', 'paid_total')
+        if paid_total - deltas[pk] < amount
+    )
@@ -1,3 +1,143 @@
+import csv
+import datetime
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from billing.models import Invoice
+from dashboard.tests import create_invoice
+from meter_readings.tests import create_consumer
+from .models import Payment, PaymentArchive
+from .reconcile import reconcile_chunk
+
+
+class ReconcileStatementTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.contracts = create_consumer('bank', contracts=2)
+        january = datetime.date(2024, 1, 1)
+        cls.by_number = create_invoice(cls.contracts[0], january)
+        cls.by_account = create_invoice(
+            cls.contracts[1], january, due_date=datetime.date(2024, 1, 20)
+        )
+        cls.partial = create_invoice(cls.contracts[0],
+                                     datetime.date(2024, 2, 1))
+
+    def write(self, rows):
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['external_id', 'date', 'amount', 'invoice',
+                             'personal_account', 'purpose'])
+            writer.writerows(rows)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_import_is_idempotent(self):
+        path = self.write([
+            ['T1', '2024-02-01', '550.00', self.by_number.id, '', ''],
+            ['T2', '02.02.2024', '550,00', '', 'PA-bank', ''],
+            ['T3', '2024-02-03', '200', '', '',
+             f'Оплата по счету №{self.partial.id}'],
+            ['T4', '2024-02-03', '10', '', 'PA-unknown', ''],
+            ['T5', '2024-02-03', 'abc', self.by_number.id, '', ''],
+            ['T1', '2024-02-01', '550.00', self.by_number.id, '', ''],
+        ])
+        unmatched = f'{path}.unmatched'
+        self.addCleanup(os.remove, unmatched)
+        out = StringIO()
+        call_command('reconcile_statement', path, unmatched=unmatched,
+                     stdout=out)
+        self.assertIn('проведено платежей 3', out.getvalue())
+        self.assertIn('закрыто счетов 2', out.getvalue())
+        self.assertEqual(
+            dict(Payment.objects.values_list('external_id', 'invoice_id')),
+            {'T1': self.by_number.id, 'T2': self.by_account.id,
+             'T3': self.partial.id}
+        )
+        self.assertEqual(
+            dict(Invoice.objects.values_list('id', 'status')),
+            {self.by_number.id: 'paid', self.by_account.id: 'paid',
+             self.partial.id: 'issued'}
+        )
+        with open(unmatched) as f:
+            self.assertEqual([row['external_id'] for row in csv.DictReader(f)],
+                             ['T5', 'T4'])
+
+        out = StringIO()
+        call_command('reconcile_statement', path, stdout=out)
+        self.assertIn('проведено платежей 0, повторов 4', out.getvalue())
+        self.assertEqual(Payment.objects.count(), 3)
+        self.assertEqual(
+            Payment.objects.get(external_id='T2').amount, Decimal('550')
+        )
+
+    def test_amount_out_of_range_is_invalid(self):
+        rows = [
+            {'external_id': 'BIG', 'date': '2024-02-01',
+             'amount': '100000000000', 'invoice': self.by_number.id},
+            {'external_id': 'OK', 'date': '2024-02-01', 'amount': '550',
+             'invoice': self.by_number.id},
+        ]
+        stats, unmatched = reconcile_chunk(rows)
+        self.assertEqual((stats['created'], stats['invalid']), (1, 1))
+        self.assertEqual(unmatched, rows[:1])
+        self.by_number.refresh_from_db()
+        self.assertEqual((self.by_number.paid_total, self.by_number.status),
+                         (Decimal('550'), 'paid'))
+
+    def test_archived_operation_is_duplicate(self):
+        PaymentArchive.objects.create(
+            contract=self.contracts[1], first_date=datetime.date(2020, 2, 1),
+            last_date=datetime.date(2020, 2, 1), ids=[1], invoices=[1],
+            amounts=[Decimal('550')], dates=[datetime.date(2020, 2, 1)],
+            external_ids=['OLD-1'], methods=['Bank transfer'],
+            created=[timezone.now()]
+        )
+        stats, _ = reconcile_chunk([
+            {'external_id': 'OLD-1', 'date': '2020-02-01', 'amount': '550',
+             'personal_account': 'PA-bank'},
+        ])
+        self.assertEqual((stats['created'], stats['duplicates']), (0, 1))
+        self.assertFalse(Payment.objects.exists())
+
+
+class PaymentAdminTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser(
+            'cashier', password='pass'
+        )
+        cls.user, cls.contracts = create_consumer('admin-payments')
+        cls.invoice = create_invoice(cls.contracts[0],
+                                     datetime.date(2024, 1, 1))
+
+    def test_bulk_delete_restores_paid_total(self):
+        payments = [
+            Payment.objects.create(
+                invoice=self.invoice, amount=Decimal(amount),
+                payment_date=datetime.date(2024, 2, 1), method='Online'
+            )
+            for amount in ('300', '250')
+        ]
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.status, 'paid')
 
-# Create your tests here.
+        self.client.force_login(self.admin)
+        self.client.post(reverse('admin:payments_payment_changelist'), {
+            'action': 'delete_selected', 'post': 'yes',
+            '_selected_action': [payment.pk for payment in payments],
+        })
+        self.assertFalse(Payment.objects.exists())
+        self.invoice.refresh_from_db()
+        self.assertEqual((self.invoice.paid_total, self.invoice.status),
+                         (Decimal('0'), 'overdue'))
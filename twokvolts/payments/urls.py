@@ -5,4 +5,5 @@ app_name = 'payments'
 
 urlpatterns = [
     # path('', , name='list'),
+    path('export/', views.PaymentExportView.as_view(), name='export'),
 ]
\ No newline at end of file
@@ -1,3 +1,19 @@
-from django.shortcuts import render
+from twokvolts.exports import StreamingExportView
+from .models import Payment, PaymentArchive
 
-# Create your views here.
+
+class PaymentExportView(StreamingExportView):
+    """Выгрузка платежей"""
+    model = Payment
+    fields = (('payment', 'id'),
+              ('invoice', 'invoice_id'),
+              ('contract_number', 'invoice__contract__contract_number'),
+              ('payment_date', 'payment_date'),
+              ('amount', 'amount'),
+              ('method', 'method'),
+              ('external_id', 'external_id'))
+    ordering = ('id',)
+    consumer_lookup = 'invoice__contract__consumer'
+    date_field = 'payment_date'
+    filename = 'payments'
+    archive_model = PaymentArchive
@@ -0,0 +1,96 @@
+# twokvolts/archive.py
+import datetime
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+from contracts.models import Contract
+
+
+def archive_boundary():
+    """Дата, раньше которой закрытые периоды уходят в архив"""
+    return datetime.date(
+        timezone.localdate().year - settings.ARCHIVE_AFTER_YEARS, 1, 1
+    )
+
+
+def reaches_archive(date_from):
+    """Нужен ли архив для выборки, начинающейся с ``date_from``"""
+    return date_from is None or date_from < archive_boundary()
+
+
+class ArchiveQuerySet(models.QuerySet):
+
+    def overlapping(self, date_from=None, date_to=None):
+        """Архивные строки, диапазон дат которых пересекает окно"""
+        queryset = self
+        if date_from:
+            queryset = queryset.filter(last_date__gte=date_from)
+        if date_to:
+            queryset = queryset.filter(first_date__lte=date_to)
+        return queryset
+
+    def unpack(self, date_from=None, date_to=None):
+        """Исходные записи как словари {поле модели: значение}"""
+        # Строки архива крупные, читаем их небольшими пачками
+        queryset = self.overlapping(date_from, date_to)
+        for archive in queryset.iterator(chunk_size=100):
+            fields = list(archive.packed)
+            arrays = [getattr(archive, name)
+                      for name in archive.packed.values()]
+            for values in zip(*arrays):
+                item = dict(zip(fields, values))
+                day = item[archive.date_field]
+                if date_from and day < date_from:
+                    continue
+                if date_to and day > date_to:
+                    continue
+                yield archive, item
+
+    def values_rows(self, lookups, date_from=None, date_to=None):
+        """Кортежи значений по путям исходной модели, как values_list"""
+        for archive, item in self.unpack(date_from, date_to):
+            yield tuple(
+                item[lookup] if lookup in item else archive.resolve(lookup)
+                for lookup in lookups
+            )
+
+
+class PackedArchive(models.Model):
+    """Архив записей договора, упакованных в массивы по столбцам.
+
+    Одна строка архива заменяет все перенесенные за раз записи договора:
+    без заголовков строк и записей индексов, а длинные массивы PostgreSQL
+    сжимает в TOAST. ``packed`` — {поле исходной модели: поле-массив},
+    ``aliases`` переписывают пути исходной модели к договору.
+    """
+
+    contract = models.ForeignKey(Contract, on_delete=models.CASCADE,
+                                 related_name='+')
+    first_date = models.DateField()
+    last_date = models.DateField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    packed = {}
+    date_field = None
+    aliases = {}
+
+    objects = ArchiveQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def lookup(cls, path):
+        """Путь исходной модели в терминах архива"""
+        for source, target in cls.aliases.items():
+            if path == source or path.startswith(f'{source}__'):
+                return target + path[len(source):]
+        return path
+
+    def resolve(self, path):
+        value = self
+        for name in self.lookup(path).split('__'):
+            value = getattr(value, name)
+        return value
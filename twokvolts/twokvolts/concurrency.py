@@ -0,0 +1,63 @@
+# twokvolts/concurrency.py
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import close_old_connections, connection, connections
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def query_pool():
+    """Общий для процесса пул потоков для запросов к базе"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=settings.QUERY_POOL_WORKERS,
+                thread_name_prefix='query'
+            )
+    return _pool
+
+
+def _call(wrappers, func, args):
+    # Соединение потока пула живет по тем же правилам, что и соединение
+    # запроса: CONN_MAX_AGE и сброс сломанных соединений
+    close_old_connections()
+    try:
+        with ExitStack() as stack:
+            for wrapper in wrappers:
+                stack.enter_context(connection.execute_wrapper(wrapper))
+            return func(*args)
+    finally:
+        close_old_connections()
+
+
+async def run_query(func, *args):
+    """Выполняет синхронную функцию с запросами в пуле потоков.
+
+    Обертки execute_wrapper текущего потока (метрики SQL, замеры)
+    действуют и на запросы в пуле.
+    """
+    wrappers = list(connection.execute_wrappers)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(query_pool(), _call, wrappers, func,
+                                      args)
+
+
+def close_pool_connections(timeout=10):
+    """Закрывает соединения всех потоков пула (тесты, остановка воркера)"""
+    if _pool is None:
+        return
+    workers = settings.QUERY_POOL_WORKERS
+    # Каждая задача ждет остальные, поэтому попадает в свой поток
+    barrier = threading.Barrier(workers, timeout=timeout)
+
+    def close(_):
+        barrier.wait()
+        connections.close_all()
+
+    list(_pool.map(close, range(workers)))
@@ -0,0 +1,14 @@
+# twokvolts/dates.py
+import datetime
+
+
+def month_start(day):
+    """Первый день месяца ``day``"""
+    return day.replace(day=1)
+
+
+def next_month_start(day):
+    """Первый день месяца, следующего за месяцем ``day``"""
+    if day.month == 12:
+        return datetime.date(day.year + 1, 1, 1)
+    return datetime.date(day.year, day.month + 1, 1)
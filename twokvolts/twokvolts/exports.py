@@ -0,0 +1,158 @@
+# twokvolts/exports.py
+import csv
+import datetime
+import itertools
+import json
+
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views import View
+
+from consumers.middleware import get_consumer
+from .archive import reaches_archive
+from .replicas import ReplicaReadMixin, read_alias
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class Echo:
+    """Псевдофайл для csv.writer: write возвращает строку, а не пишет ее"""
+
+    def write(self, value):
+        return value
+
+
+def _format(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def csv_lines(header, rows, batch_size):
+    # BOM, чтобы Excel сразу открывал кириллицу
+    writer = csv.writer(Echo())
+    yield '\ufeff' + writer.writerow(header)
+    batch = []
+    for row in rows:
+        batch.append(writer.writerow([_format(value) for value in row]))
+        if len(batch) >= batch_size:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+def ndjson_lines(header, rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(json.dumps(dict(zip(header, row)), cls=DjangoJSONEncoder,
+                                ensure_ascii=False) + '\n')
+        if len(batch) >= batch_size:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+class StreamingExportView(LoginRequiredMixin, ReplicaReadMixin, View):
+    """Потоковая выгрузка строк модели в CSV или NDJSON.
+
+    Строки читаются серверным курсором через ``values_list().iterator()``
+    пачками по ``chunk_size`` и сразу уходят клиенту, поэтому память не
+    зависит от размера выгрузки. Потребитель получает только свои
+    данные, сотрудник - все или одного потребителя (``?consumer=<id>``).
+    Период ограничивается параметрами ``date_from`` и ``date_to``.
+    Если период уходит раньше границы архива, сначала выгружаются
+    строки ``archive_model`` в том же формате, затем оперативные.
+    Строки читаются из реплики, если она настроена.
+    """
+
+    model = None
+    fields = ()  # Пары (заголовок, поле для values_list)
+    ordering = ()
+    consumer_lookup = None  # Путь от модели до потребителя
+    date_field = None
+    filename = None
+    chunk_size = 2000
+    batch_size = 500  # Строк в одном отправляемом куске
+    archive_model = None  # Архив модели (twokvolts.archive.PackedArchive)
+
+    def get_filters(self):
+        """Фильтр по потребителю и окно дат из параметров запроса"""
+        params = self.request.GET
+        filters = {}
+        if not self.request.user.is_staff:
+            consumer = get_consumer(self.request)
+            if consumer is None:
+                raise Http404('Профиль потребителя не найден')
+            filters[self.consumer_lookup] = consumer
+        elif params.get('consumer'):
+            filters[f'{self.consumer_lookup}_id'] = int(params['consumer'])
+        date_from, date_to = (
+            datetime.date.fromisoformat(params[param])
+            if params.get(param) else None
+            for param in ('date_from', 'date_to')
+        )
+        return filters, date_from, date_to
+
+    def get_queryset(self, filters, date_from, date_to):
+        queryset = self.model.objects.order_by(*self.ordering).filter(
+            **filters
+        )
+        if date_from:
+            queryset = queryset.filter(**{f'{self.date_field}__gte':
+                                          date_from})
+        if date_to:
+            queryset = queryset.filter(**{f'{self.date_field}__lte':
+                                          date_to})
+        return queryset
+
+    def get_rows(self, filters, date_from, date_to):
+        lookups = [field for _, field in self.fields]
+        # Строки читаются уже после dispatch, базу фиксируем сейчас
+        alias = read_alias()
+        rows = self.get_queryset(filters, date_from, date_to).using(
+            alias
+        ).values_list(*lookups).iterator(chunk_size=self.chunk_size)
+        if self.archive_model is None or not reaches_archive(date_from):
+            return rows
+        archive = self.archive_model.objects.using(alias).filter(**{
+            self.archive_model.lookup(lookup): value
+            for lookup, value in filters.items()
+        }).select_related('contract').order_by('contract_id', 'first_date')
+        return itertools.chain(
+            archive.values_rows(lookups, date_from, date_to), rows
+        )
+
+    def get(self, request, *args, **kwargs):
+        fmt = request.GET.get('format', 'csv')
+        if fmt not in FORMATS:
+            return JsonResponse({'error': 'Формат: csv или ndjson'},
+                                status=400)
+        try:
+            filters, date_from, date_to = self.get_filters()
+        except ValueError:
+            return JsonResponse(
+                {'error': 'Неверные параметры: consumer, date_from, '
+                          'date_to (YYYY-MM-DD)'},
+                status=400
+            )
+
+        header = [name for name, _ in self.fields]
+        rows = self.get_rows(filters, date_from, date_to)
+        lines = csv_lines if fmt == 'csv' else ndjson_lines
+        response = StreamingHttpResponse(
+            lines(header, rows, self.batch_size), content_type=FORMATS[fmt]
+        )
+        stamp = timezone.now().strftime('%Y%m%d')
+        response['Content-Disposition'] = (
+            f'attachment; filename="{self.filename}-{stamp}.{fmt}"'
+        )
+        # Без буферизации в nginx первые байты уходят сразу
+        response['X-Accel-Buffering'] = 'no'
+        return response
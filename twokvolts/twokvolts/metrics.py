@@ -0,0 +1,274 @@
+# twokvolts/metrics.py
+import atexit
+import bisect
+import fcntl
+import hmac
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'twokvolts'
+HISTOGRAMS = {
+    'request_duration_seconds': (
+        'Время обработки запроса',
+        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    ),
+    'sql_queries': (
+        'Число SQL-запросов за один запрос',
+        (0, 1, 2, 5, 10, 20, 50, 100, 200),
+    ),
+    'sql_duration_seconds': (
+        'Время SQL-запросов за один запрос',
+        (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+    ),
+}
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+# Снимок воркера: pid и время запуска, чтобы новый процесс с тем же pid
+# не затер счетчики прежнего
+SNAPSHOT_RE = re.compile(r'(\d+)-(\d+)\.json')
+RETIRED = 'retired.json'  # Сумма снимков завершившихся воркеров
+
+
+class Registry:
+    """Гистограммы по представлениям в памяти процесса.
+
+    Если задан каталог, процесс периодически сохраняет в него свой
+    снимок, а экспорт суммирует снимки всех воркеров WSGI. Снимки
+    завершившихся воркеров при экспорте сворачиваются в один файл.
+    """
+
+    def __init__(self, directory=None, flush_interval=15):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.series = {}
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+        self.process = None
+
+    def observe(self, view, method, values):
+        now = time.monotonic()
+        with self.lock:
+            series = self.series.get((view, method))
+            if series is None:
+                series = self.series[view, method] = {
+                    name: [[0] * (len(buckets) + 1), 0]
+                    for name, (_, buckets) in HISTOGRAMS.items()
+                }
+            for name, value in values.items():
+                counts, _ = series[name]
+                counts[bisect.bisect_left(HISTOGRAMS[name][1], value)] += 1
+                series[name][1] += value
+            due = (self.directory
+                   and now - self.last_flush >= self.flush_interval)
+            if due:
+                self.last_flush = now
+        if due:
+            self.flush()
+
+    def snapshot(self):
+        with self.lock:
+            return [[view, method, json.loads(json.dumps(series))]
+                    for (view, method), series in self.series.items()]
+
+    def _own_name(self):
+        # Реестр создается до fork, поэтому процесс опознается лениво
+        pid = os.getpid()
+        if self.process is None or self.process[0] != pid:
+            self.process = (pid, time.time_ns())
+        return '{}-{}.json'.format(*self.process)
+
+    def flush(self):
+        """Сохраняет снимок процесса в общий каталог"""
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, self._own_name())
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def collect(self):
+        """Сумма по всем процессам: свой снимок берется из памяти"""
+        snapshots = [self.snapshot()]
+        if self.directory and os.path.isdir(self.directory):
+            # Параллельный экспорт не должен увидеть снимок дважды:
+            # и в файле воркера, и уже в RETIRED
+            with open(os.path.join(self.directory, '.lock'), 'a') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                self.retire_dead()
+                own = self._own_name()
+                for name in os.listdir(self.directory):
+                    if name == own or not (SNAPSHOT_RE.fullmatch(name)
+                                           or name == RETIRED):
+                        continue
+                    snapshot = _read(os.path.join(self.directory, name))
+                    if snapshot is not None:
+                        snapshots.append(snapshot)
+        return _merge_all(snapshots)
+
+    def retire_dead(self):
+        """Сворачивает снимки завершившихся воркеров в RETIRED.
+
+        Счетчики умерших воркеров остаются в сумме, поэтому она
+        не уменьшается, а файлы по pid не копятся.
+        """
+        dead = []
+        for name in os.listdir(self.directory):
+            match = SNAPSHOT_RE.fullmatch(name)
+            if match and not _alive(int(match.group(1))):
+                dead.append(os.path.join(self.directory, name))
+        if not dead:
+            return
+        retired_path = os.path.join(self.directory, RETIRED)
+        snapshots = [_read(path) for path in [retired_path, *dead]]
+        merged = _merge_all(s for s in snapshots if s is not None)
+        tmp_path = f'{retired_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump([[view, method, series]
+                       for (view, method), series in merged.items()], f)
+        os.replace(tmp_path, retired_path)
+        for path in dead:
+            os.remove(path)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Процесс есть, но принадлежит другому пользователю
+        return True
+    return True
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # Файл мог исчезнуть или еще дописывается
+        return None
+
+
+def _merge_all(snapshots):
+    merged = {}
+    for snapshot in snapshots:
+        for view, method, series in snapshot:
+            _merge(merged.setdefault((view, method), {}), series)
+    return merged
+
+
+def _merge(target, series):
+    for name, (counts, total) in series.items():
+        if name not in target:
+            target[name] = [list(counts), total]
+            continue
+        current = target[name]
+        current[0] = [a + b for a, b in zip(current[0], counts)]
+        current[1] += total
+
+
+def _label(value):
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def render(merged):
+    """Текстовый формат экспозиции Prometheus"""
+    lines = []
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        metric = f'{PREFIX}_{name}'
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} histogram')
+        for (view, method), series in sorted(merged.items()):
+            if name not in series:
+                continue
+            counts, total = series[name]
+            labels = f'view="{_label(view)}",method="{method}"'
+            cumulative = 0
+            for bound, count in zip([*buckets, '+Inf'], counts):
+                cumulative += count
+                lines.append(
+                    f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}'
+                )
+            lines.append(f'{metric}_sum{{{labels}}} {total}')
+            lines.append(f'{metric}_count{{{labels}}} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+class SqlTimer:
+    """Обертка выполнения запросов: считает их число и время"""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.seconds += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """Время ответа и SQL по имени URL для каждого запроса"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        sql = SqlTimer()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(sql))
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        registry.observe(
+            match.view_name if match else 'unresolved',
+            request.method if request.method in METHODS else 'OTHER',
+            {
+                'request_duration_seconds': time.perf_counter() - started,
+                'sql_queries': sql.queries,
+                'sql_duration_seconds': sql.seconds,
+            }
+        )
+        return response
+
+
+def metrics_view(request):
+    """Экспорт метрик для Prometheus, только с токеном METRICS_TOKEN"""
+    token = settings.METRICS_TOKEN
+    # Без настроенного токена метрики не отдаются никому
+    if not token or not hmac.compare_digest(
+        request.headers.get('Authorization', ''), f'Bearer {token}'
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(render(registry.collect()),
+                        content_type='text/plain; version=0.0.4')
+
+
+def _flush_at_exit():
+    try:
+        registry.flush()
+    except OSError as error:
+        logger.warning('Не удалось сохранить метрики: %s', error)
+
+
+registry = Registry(settings.METRICS_DIR, settings.METRICS_FLUSH_INTERVAL)
+atexit.register(_flush_at_exit)
@@ -0,0 +1,169 @@
+# twokvolts/pagination.py
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+
+def estimated_count(queryset):
+    """Оценка числа строк по плану запроса вместо COUNT(*)"""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        return cursor.fetchone()[0][0]['Plan']['Plan Rows']
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator для админки: на больших выборках число строк — оценка.
+
+    Точный COUNT(*) выполняется, только если по плану строк меньше
+    ADMIN_EXACT_COUNT_LIMIT, иначе берется оценка планировщика.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate < settings.ADMIN_EXACT_COUNT_LIMIT:
+            return self.object_list.count()
+        return estimate
+
+
+class KeysetPage:
+    """Страница выборки с курсорами соседних страниц"""
+
+    def __init__(self, object_list, next_cursor, previous_cursor,
+                 paginator=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """Постраничный вывод по ключу сортировки без OFFSET и COUNT.
+
+    ``ordering`` — поля сортировки, последнее из них должно быть
+    уникальным (обычно ``id``). Курсор — непрозрачная строка с ключом
+    крайней записи страницы и направлением перехода.
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = [
+            (name.lstrip('-'), name.startswith('-')) for name in ordering
+        ]
+        self.per_page = per_page
+
+    @cached_property
+    def estimated_count(self):
+        """Примерное число записей, считается только при обращении"""
+        return estimated_count(self.queryset)
+
+    def encode(self, obj, direction):
+        key = [str(getattr(obj, name)) for name, _ in self.ordering]
+        raw = json.dumps({'d': direction, 'k': key}).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            data = json.loads(raw)
+            direction = data['d']
+            model = self.queryset.model
+            key = [
+                model._meta.get_field(name).to_python(value)
+                for (name, _), value in zip(self.ordering, data['k'])
+            ]
+        except (ValueError, TypeError, KeyError, ValidationError):
+            raise Http404('Неверный курсор страницы')
+        if (direction not in ('next', 'prev')
+                or len(key) != len(self.ordering) or None in key):
+            raise Http404('Неверный курсор страницы')
+        return direction, key
+
+    def _after(self, key, backwards):
+        """Условие «строго после ключа» в порядке сортировки"""
+        condition = Q()
+        for i, (name, descending) in enumerate(self.ordering):
+            lookup = 'lt' if descending != backwards else 'gt'
+            step = Q(**{f'{name}__{lookup}': key[i]})
+            for prev_name, _ in self.ordering[:i]:
+                step &= Q(**{prev_name: key[self._index(prev_name)]})
+            condition |= step
+        return condition
+
+    def _index(self, name):
+        return [n for n, _ in self.ordering].index(name)
+
+    def page(self, cursor=None):
+        direction, key = self.decode(cursor) if cursor else ('next', None)
+        backwards = direction == 'prev'
+        order_by = [
+            f'{"-" if descending != backwards else ""}{name}'
+            for name, descending in self.ordering
+        ]
+        queryset = self.queryset.order_by(*order_by)
+        if key is not None:
+            queryset = queryset.filter(self._after(key, backwards))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+        if not rows:
+            return KeysetPage(rows, None, None, self)
+
+        more_after = has_more if not backwards else True
+        more_before = key is not None if not backwards else has_more
+        return KeysetPage(
+            rows,
+            self.encode(rows[-1], 'next') if more_after else None,
+            self.encode(rows[0], 'prev') if more_before else None,
+            self,
+        )
+
+
+class KeysetPaginationMixin:
+    """Подменяет постраничный вывод ListView на курсорный"""
+
+    keyset_ordering = ('-id',)
+    cursor_kwarg = 'cursor'
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, self.keyset_ordering,
+                                    page_size)
+        page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Фильтры страницы без курсора — для ссылок на соседние страницы
+        query = self.request.GET.copy()
+        query.pop(self.cursor_kwarg, None)
+        context['cursor_query'] = query.urlencode()
+        return context
@@ -0,0 +1,226 @@
+# twokvolts/partitions.py
+import datetime
+import re
+
+from django.db import transaction
+
+# Секционированные по годам таблицы: таблица -> ключ секционирования
+PARTITIONED_TABLES = {
+    'meter_readings_meterreading': 'reading_date',
+    'billing_invoice': 'period',
+}
+
+
+def partition_name(table, year):
+    return f'{table}_y{year}'
+
+
+def default_partition(table):
+    return f'{table}_default'
+
+
+def parent_table(name):
+    """Секционированная таблица, к которой относится секция ``name``"""
+    for table in PARTITIONED_TABLES:
+        if re.fullmatch(rf'{table}_(y\d{{4}}|default)', name):
+            return table
+    return name
+
+
+def is_partitioned(connection, table):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table "
+            "WHERE partrelid = to_regclass(%s)", [table]
+        )
+        return cursor.fetchone() is not None
+
+
+def partitions(connection, table):
+    """Имена секций таблицы"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT inhrelid::regclass::text FROM pg_inherits "
+            "WHERE inhparent = %s::regclass", [table]
+        )
+        return {name for name, in cursor.fetchall()}
+
+
+def _bounds(year):
+    return datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1)
+
+
+def create_partition(connection, table, column, year):
+    """Создает годовую секцию, возвращает число строк из default-секции.
+
+    Строки этого года, успевшие попасть в default, переносятся в новую
+    секцию в той же транзакции: иначе PostgreSQL не даст ее создать.
+    """
+    name = partition_name(table, year)
+    default = default_partition(table)
+    start, end = _bounds(year)
+    qn = connection.ops.quote_name
+    with transaction.atomic(using=connection.alias), \
+            connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM {qn(default)} '
+            f'WHERE {qn(column)} >= %s AND {qn(column)} < %s)', [start, end]
+        )
+        if not cursor.fetchone()[0]:
+            cursor.execute(
+                f'CREATE TABLE {qn(name)} PARTITION OF {qn(table)} '
+                f'FOR VALUES FROM (%s) TO (%s)', [start, end]
+            )
+            return 0
+        cursor.execute(
+            f'CREATE TABLE {qn(name)} (LIKE {qn(table)} '
+            f'INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+        )
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {qn(default)} '
+            f'WHERE {qn(column)} >= %s AND {qn(column)} < %s RETURNING *) '
+            f'INSERT INTO {qn(name)} SELECT * FROM moved', [start, end]
+        )
+        moved = cursor.rowcount
+        cursor.execute(
+            f'ALTER TABLE {qn(table)} ATTACH PARTITION {qn(name)} '
+            f'FOR VALUES FROM (%s) TO (%s)', [start, end]
+        )
+        return moved
+
+
+def ensure_partitions(connection, table, column, years):
+    """Создает недостающие секции, возвращает {год: перенесено строк}"""
+    existing = partitions(connection, table)
+    return {
+        year: create_partition(connection, table, column, year)
+        for year in years if partition_name(table, year) not in existing
+    }
+
+
+def _definition(cursor, table):
+    """Ограничения, индексы и последовательности таблицы для пересоздания"""
+    cursor.execute(
+        "SELECT c.conname, c.contype, pg_get_constraintdef(c.oid), "
+        "ARRAY(SELECT a.attname::text FROM unnest(c.conkey) k "
+        "JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = k) "
+        "FROM pg_constraint c WHERE c.conrelid = %s::regclass "
+        "AND c.contype IN ('p', 'u', 'f') ORDER BY c.contype DESC",
+        [table]
+    )
+    constraints = cursor.fetchall()
+    cursor.execute(
+        "SELECT pg_get_indexdef(i.indexrelid) FROM pg_index i "
+        "WHERE i.indrelid = %s::regclass AND NOT EXISTS ("
+        "SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid "
+        "AND c.conrelid = i.indrelid)", [table]
+    )
+    indexes = [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT s.oid::regclass::text, a.attname FROM pg_depend d "
+        "JOIN pg_class s ON s.oid = d.objid AND s.relkind = 'S' "
+        "JOIN pg_attribute a ON a.attrelid = d.refobjid "
+        "AND a.attnum = d.refobjsubid "
+        "WHERE d.refobjid = %s::regclass AND d.deptype = 'a'", [table]
+    )
+    return constraints, indexes, cursor.fetchall()
+
+
+def _rebuild(schema_editor, table, create, constraint_sql):
+    """Пересоздает таблицу с переносом данных, индексов и ограничений"""
+    qn = schema_editor.quote_name
+    old = f'{table}_old'
+    with schema_editor.connection.cursor() as cursor:
+        constraints, indexes, sequences = _definition(cursor, table)
+    schema_editor.execute(f'ALTER TABLE {qn(table)} RENAME TO {qn(old)}')
+    for sql in create(old):
+        schema_editor.execute(sql)
+    schema_editor.execute(f'INSERT INTO {qn(table)} SELECT * FROM {qn(old)}')
+    for sequence, column in sequences:
+        schema_editor.execute(
+            f'ALTER SEQUENCE {sequence} OWNED BY {qn(table)}.{qn(column)}'
+        )
+    # Секции удаляются вместе с секционированной таблицей
+    schema_editor.execute(f'DROP TABLE {qn(old)}')
+    # Индексы строятся один раз по уже загруженным данным
+    for name, kind, definition, columns in constraints:
+        sql = constraint_sql(name, kind, definition, columns)
+        if sql:
+            schema_editor.execute(
+                f'ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {sql}'
+            )
+        elif kind == 'u':
+            schema_editor.execute(
+                f'CREATE INDEX {qn(name)} ON {qn(table)} '
+                f'({", ".join(qn(column) for column in columns)})'
+            )
+    for definition in indexes:
+        # Индекс секционированной таблицы описан как ON ONLY
+        schema_editor.execute(definition.replace(' ON ONLY ', ' ON ', 1))
+
+
+def partition_table(schema_editor, table, column, ahead=1):
+    """Переводит таблицу на секционирование по годам ``column``.
+
+    Первичный ключ расширяется ключом секционирования. Уникальные
+    ограничения без него невозможны и заменяются обычными индексами,
+    а внешние ключи на таблицу нужно заранее снять (db_constraint=False).
+    Данные копируются целиком — на больших таблицах это окно обслуживания.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    qn = schema_editor.quote_name
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'SELECT EXTRACT(YEAR FROM min({qn(column)}))::int, '
+                       f'EXTRACT(YEAR FROM max({qn(column)}))::int '
+                       f'FROM {qn(table)}')
+        first, last = cursor.fetchone()
+    this_year = datetime.date.today().year
+    years = range(min(first or this_year, this_year),
+                  max(last or this_year, this_year + ahead) + 1)
+
+    def create(old):
+        yield (f'CREATE TABLE {qn(table)} (LIKE {qn(old)} '
+               f'INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE '
+               f'INCLUDING COMMENTS) PARTITION BY RANGE ({qn(column)})')
+        yield (f'CREATE TABLE {qn(default_partition(table))} '
+               f'PARTITION OF {qn(table)} DEFAULT')
+        for year in years:
+            start, end = _bounds(year)
+            yield (f'CREATE TABLE {qn(partition_name(table, year))} '
+                   f'PARTITION OF {qn(table)} FOR VALUES FROM '
+                   f"('{start}') TO ('{end}')")
+
+    def constraint_sql(name, kind, definition, columns):
+        if kind == 'p' and column not in columns:
+            return f'PRIMARY KEY ({", ".join(map(qn, columns + [column]))})'
+        if kind == 'u' and column not in columns:
+            return None
+        return definition
+
+    _rebuild(schema_editor, table, create, constraint_sql)
+
+
+def unpartition_table(schema_editor, table, column):
+    """Обратное преобразование: обычная таблица с первичным ключом без
+    ``column``. Индексы, заменившие уникальные ограничения, остаются
+    обычными — их восстанавливает миграция.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    qn = schema_editor.quote_name
+
+    def create(old):
+        yield (f'CREATE TABLE {qn(table)} (LIKE {qn(old)} '
+               f'INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE '
+               f'INCLUDING COMMENTS)')
+
+    def constraint_sql(name, kind, definition, columns):
+        if kind == 'p' and column in columns and len(columns) > 1:
+            columns = [name for name in columns if name != column]
+            return f'PRIMARY KEY ({", ".join(map(qn, columns))})'
+        return definition
+
+    _rebuild(schema_editor, table, create, constraint_sql)
@@ -0,0 +1,109 @@
+# twokvolts/replicas.py
+import contextvars
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+# Разрешено ли читать из реплик (включается явно для отчетов)
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+# Чтение прибито к основной базе: была запись или недавняя запись клиента
+_pinned = contextvars.ContextVar('replica_pinned', default=False)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Чтения внутри блока уходят в реплики из REPLICA_DATABASES"""
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def read_alias():
+    """Алиас базы для чтения в текущем контексте"""
+    if (not _replica_reads.get() or _pinned.get()
+            or not settings.REPLICA_DATABASES
+            # Внутри транзакции читаем то, что в ней же записано
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+        return DEFAULT_DB_ALIAS
+    return random.choice(settings.REPLICA_DATABASES)
+
+
+def pin_if_recent(stamp):
+    """Прибивает чтения к основной базе, если данные менялись недавно.
+
+    ``stamp`` — метка версии в наносекундах (twokvolts.versions).
+    Изменения через API, команды и админку не ставят клиенту cookie,
+    а ответ, собранный по отстающей реплике, закэшировался бы
+    под новой версией.
+    """
+    if time.time_ns() - stamp < settings.REPLICA_STICKY_SECONDS * 10 ** 9:
+        _pinned.set(True)
+
+
+class ReplicaRouter:
+    """Пишет в основную базу, читает из реплик только в replica_reads.
+
+    После первой записи чтения до конца запроса или команды идут в
+    основную базу, чтобы клиент видел то, что только что записал.
+    """
+
+    def db_for_read(self, model, **hints):
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        _pinned.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+    """Липкость к основной базе после записи клиента.
+
+    Ответ на изменяющий запрос ставит cookie на REPLICA_STICKY_SECONDS,
+    пока она жива, все чтения этого клиента идут в основную базу:
+    реплика могла еще не получить его изменения.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _pinned.set(
+            settings.REPLICA_STICKY_COOKIE in request.COOKIES
+        )
+        try:
+            response = self.get_response(request)
+        finally:
+            _pinned.reset(token)
+        if request.method not in SAFE_METHODS and settings.REPLICA_DATABASES:
+            response.set_cookie(
+                settings.REPLICA_STICKY_COOKIE, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True, samesite='Lax'
+            )
+        return response
+
+
+class ReplicaReadMixin:
+    """Представление только для чтения: запросы и отрисовка — на реплике"""
+
+    def dispatch(self, request, *args, **kwargs):
+        with replica_reads():
+            response = super().dispatch(request, *args, **kwargs)
+            # Шаблон отрисовывается лениво, уже после dispatch
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+        return response
@@ -50,7 +50,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'twokvolts.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'twokvolts.replicas.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -58,6 +60,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 
+    'consumers.middleware.ConsumerMiddleware',
     'consumers.middleware.UserActivityMiddleware',
 ]
 
@@ -112,10 +115,40 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения: DB_REPLICA_HOSTS=host1,host2 (алиасы replica,
+# replica_2, ...). Без переменной алиас replica смотрит на основную базу
+# и запросы в него не направляются, в тестах он зеркало default.
+# Локально маршрутизацию можно проверить с DB_REPLICA_HOSTS=localhost
+
+REPLICA_HOSTS = [
+    host for host in os.getenv('DB_REPLICA_HOSTS', '').split(',') if host
+]
+for n, host in enumerate(REPLICA_HOSTS or [DATABASES['default']['HOST']]):
+    DATABASES['replica' if n == 0 else f'replica_{n + 1}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'TEST': {'MIRROR': 'default'},
+    }
+REPLICA_DATABASES = [alias for alias in DATABASES
+                     if alias != 'default'] if REPLICA_HOSTS else []
+
+DATABASE_ROUTERS = ['twokvolts.replicas.ReplicaRouter']
+
 # if 'test' in sys.argv or 'test_coverage' in sys.argv:
 #    DATABASES['default']['ENGINE'] = 'django.db.backends.sqlite3'
 #    DATABASES['default']['NAME'] = ':memory:'
 
+# Cache
+# Без MEMCACHED_LOCATION кэш локальный для процесса (разработка)
+
+if os.getenv('MEMCACHED_LOCATION'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': os.getenv('MEMCACHED_LOCATION').split(','),
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -175,6 +208,71 @@ MESSAGE_TAGS = {
     messages.ERROR: 'danger',
 }
 
+# Биллинг
+
+BILLING_DUE_DAYS = int(os.getenv('BILLING_DUE_DAYS', '15'))  # Срок оплаты счета
+
+# Активность пользователей
+
+ACTIVITY_TRACKING_INTERVAL = 60  # Не чаще раза в минуту на пользователя
+ACTIVITY_FLUSH_INTERVAL = 30  # Как часто сбрасывать отметки в базу, с
+ACTIVITY_ONLINE_WINDOW = 300  # Кто считается онлайн, с
+
+# Кэш главной страницы кабинета
+
+DASHBOARD_CACHE_TIMEOUT = 300
+DASHBOARD_CACHE_LOCK_TIMEOUT = 5  # Сколько ждать чужой пересчет, с
+# Асинхронная главная страница (для запуска под ASGI)
+DASHBOARD_ASYNC_VIEWS = os.getenv('DASHBOARD_ASYNC_VIEWS') == '1'
+
+# Пул потоков для параллельных запросов к базе
+# Каждый поток держит свое соединение, учитывайте max_connections
+
+QUERY_POOL_WORKERS = int(os.getenv('QUERY_POOL_WORKERS', '6'))
+
+# Метрики Prometheus (/metrics)
+
+METRICS_DIR = os.getenv('METRICS_DIR')  # Общий каталог воркеров WSGI
+METRICS_FLUSH_INTERVAL = 15  # Как часто воркер сохраняет свой снимок, с
+# Bearer-токен для сборщика; без него /metrics закрыт
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# API приема показаний (/meter-readings/api/ingest/)
+
+INGEST_CHUNK_SIZE = 2000  # Строк в одной транзакции
+INGEST_MAX_ROWS = 100000  # Строк в одном запросе
+INGEST_MAX_LINE = 1024  # Байт в одной строке NDJSON
+
+# Страница тарифов для анонимов
+# Ключ кэша включает версию тарифов, изменение тарифа сразу дает новую страницу
+
+TARIFFS_PAGE_CACHE_TIMEOUT = 3600
+TARIFFS_PAGE_MAX_AGE = 60  # Сколько браузер и прокси держат страницу, с
+# Сколько процесс верит версии тарифов из кэша, не сверяясь с базой, с
+VERSION_CACHE_TIMEOUT = 5
+
+# Админка: выше этого числа строк по плану запроса — оценка вместо COUNT(*)
+
+ADMIN_EXACT_COUNT_LIMIT = 100000
+
+# Секционирование показаний и счетов по годам (команда create_partitions)
+
+PARTITIONS_AHEAD_YEARS = 1  # На сколько лет вперед держать готовые секции
+# Последние показания сначала ищутся за этот срок, дни: запрос читает
+# одну-две секции, вся история — только если там ничего не нашлось
+READINGS_LOOKBACK_DAYS = 400
+
+# Архив закрытых периодов (команда archive_history)
+# Показания, оплаченные счета и платежи старше стольких полных лет
+
+ARCHIVE_AFTER_YEARS = 3
+ARCHIVE_BATCH_SIZE = 500  # Договоров в одной транзакции переноса
+
+# Реплики: после изменяющего запроса клиент читает из основной базы
+
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '10'))
+REPLICA_STICKY_COOKIE = 'primary_pin'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,153 @@
+# twokvolts/testing.py
+import datetime
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from billing.models import Invoice
+from consumers.models import Consumer
+from contracts.models import Contract, Tariff
+from dashboard.models import Notification
+from dashboard.rollups import rebuild_rollups
+from meter_readings.models import MeterReading
+from payments.models import Payment
+from twokvolts.partitions import parent_table
+
+User = get_user_model()
+
+# Таблицы, которые в эксплуатации растут без ограничений
+LARGE_TABLES = {
+    'billing_invoice',
+    'contracts_contract',
+    'dashboard_monthlyconsumption',
+    'dashboard_notification',
+    'meter_readings_meterreading',
+    'payments_payment',
+}
+
+
+def seed_dataset(consumers=20, contracts=3, months=12):
+    """Набор данных для проверки запросов: потребители с историей.
+
+    Возвращает пользователя первого потребителя.
+    """
+    tariff, _ = Tariff.objects.get_or_create(
+        name='Базовый', defaults={'rate': Decimal('5.5000')}
+    )
+    users = User.objects.bulk_create([
+        User(username=f'seed{n}') for n in range(consumers)
+    ])
+    for user in users:
+        user.set_password('pass')
+        user.save(update_fields=['password'])
+    created = Consumer.objects.bulk_create([
+        Consumer(user=user, type='individual', full_name=user.username,
+                 address='-', phone='-', personal_account=f'PA-{user.pk}')
+        for user in users
+    ])
+    created_contracts = Contract.objects.bulk_create([
+        Contract(consumer=consumer, tariff=tariff,
+                 contract_number=f'S-{consumer.pk}-{n}',
+                 meter_number=f'SM-{consumer.pk}-{n}',
+                 start_date=datetime.date(2023, 1, 1),
+                 meter_installation_date=datetime.date(2023, 1, 1))
+        for consumer in created for n in range(contracts)
+    ])
+    _seed_history(created_contracts, months)
+    return users[0]
+
+
+def _seed_history(contracts, months):
+    readings = MeterReading.objects.bulk_create([
+        MeterReading(contract=contract,
+                     reading_date=datetime.date(2023 + m // 12, m % 12 + 1,
+                                                28),
+                     value=Decimal(100 * (m + 1)))
+        for contract in contracts for m in range(months + 1)
+    ])
+    consumers = {contract.pk: contract.consumer_id for contract in contracts}
+    by_contract = {}
+    for reading in readings:
+        by_contract.setdefault(reading.contract_id, []).append(reading)
+    invoices = Invoice.objects.bulk_create([
+        Invoice(contract_id=contract_id,
+                period=reading.reading_date.replace(day=1),
+                meter_reading=reading, consumption=Decimal(100),
+                amount=Decimal(550),
+                paid_total=Decimal(550 if m < months - 1 else 0),
+                status='paid' if m < months - 1 else 'issued',
+                due_date=reading.reading_date + datetime.timedelta(days=20))
+        for contract_id, items in by_contract.items()
+        for m, reading in enumerate(items[1:])
+    ])
+    Payment.objects.bulk_create([
+        Payment(invoice=invoice, amount=invoice.amount,
+                payment_date=invoice.due_date, method='Online')
+        for invoice in invoices if invoice.status == 'paid'
+    ])
+    Notification.objects.bulk_create([
+        Notification(consumer_id=consumers[invoice.contract_id],
+                     invoice=invoice, kind='new_invoice',
+                     dedup_key=f'new_invoice:{invoice.pk}',
+                     message=f'Выставлен счет #{invoice.pk}',
+                     date=invoice.due_date)
+        for invoice in invoices
+    ])
+    rebuild_rollups(by_contract)
+
+
+def explain(sql):
+    """План запроса при запрещенном последовательном чтении.
+
+    Если и так остается Seq Scan, подходящего индекса у таблицы нет.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SET enable_seqscan = off')
+        try:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+            return cursor.fetchone()[0][0]['Plan']
+        finally:
+            cursor.execute('RESET enable_seqscan')
+
+
+def seq_scans(plan):
+    """Таблицы, читаемые последовательным просмотром.
+
+    Секции секционированных таблиц считаются их родительской таблицей.
+    """
+    tables = set()
+    if plan['Node Type'] == 'Seq Scan':
+        tables.add(parent_table(plan['Relation Name']))
+    for child in plan.get('Plans', []):
+        tables |= seq_scans(child)
+    return tables
+
+
+class QueryBudgetTestCase(TestCase):
+    """Проверки числа запросов и планов для страниц"""
+
+    large_tables = LARGE_TABLES
+
+    def assertQueryBudget(self, url, budget,  # noqa: N802
+                          method='get', data=None, status=200):
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url, data or {})
+        self.assertEqual(response.status_code, status)
+
+        queries = [query['sql'] for query in ctx.captured_queries]
+        self.assertLessEqual(
+            len(queries), budget,
+            f'{url}: {len(queries)} запросов при бюджете {budget}:\n'
+            + '\n'.join(queries)
+        )
+        for sql in queries:
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            scans = seq_scans(explain(sql)) & self.large_tables
+            self.assertFalse(
+                scans, f'{url}: последовательное чтение {scans}:\n{sql}'
+            )
+        return response
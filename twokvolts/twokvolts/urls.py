@@ -18,6 +18,8 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from django.views.generic import TemplateView
+
+from .metrics import metrics_view
 # from accounts.views import dashboard_home
 
 urlpatterns = [
@@ -42,4 +44,7 @@ urlpatterns = [
     path('about/', TemplateView.as_view(template_name='pages/about.html'), name='about'),
     path('contact/', TemplateView.as_view(template_name='pages/contact.html'), name='contact'),
     path('tariffs/', include('contracts.urls')),
+
+    # Метрики для Prometheus
+    path('metrics', metrics_view, name='metrics'),
 ]
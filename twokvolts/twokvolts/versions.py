@@ -0,0 +1,68 @@
+# twokvolts/versions.py
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from contracts.models import VersionStamp
+
+
+def get_version(key):
+    """Текущая версия ``key`` (1 запрос), 0 — данные еще не менялись.
+
+    Читается всегда основная база: реплика могла еще не получить
+    новую метку.
+    """
+    return VersionStamp.objects.using(DEFAULT_DB_ALIAS).filter(
+        key=key
+    ).values_list('version', flat=True).first() or 0
+
+
+def cached_version(key):
+    """Версия ``key`` из кэша, при промахе — из базы.
+
+    Для данных, которым допустимо отставание на VERSION_CACHE_TIMEOUT
+    в других процессах: свой процесс (и все, если кэш общий) получает
+    новую версию сразу после bump_versions.
+    """
+    version = cache.get(_cache_key(key))
+    if version is None:
+        version = get_version(key)
+        cache.set(_cache_key(key), version,
+                  timeout=settings.VERSION_CACHE_TIMEOUT)
+    return version
+
+
+def _cache_key(key):
+    return f'version:{key}'
+
+
+def bump_versions(keys):
+    """Новые версии ``keys`` после фиксации транзакции.
+
+    Раньше нельзя: другой воркер прочитал бы данные без изменений
+    и запомнил их под новой версией.
+    """
+    keys = sorted(set(keys))
+    if keys:
+        transaction.on_commit(lambda: _bump(keys))
+
+
+def _bump(keys):
+    connection = connections[DEFAULT_DB_ALIAS]
+    qn = connection.ops.quote_name
+    table = qn(VersionStamp._meta.db_table)
+    key, version = qn('key'), qn('version')
+    # Метка не уменьшается, даже если часы воркеров расходятся
+    sql = (
+        f'INSERT INTO {table} ({key}, {version}) '
+        f'SELECT unnest(%s::varchar[]), %s '
+        f'ON CONFLICT ({key}) DO UPDATE SET {version} = '
+        f'GREATEST({table}.{version} + 1, EXCLUDED.{version}) '
+        f'RETURNING {key}, {version}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [keys, time.time_ns()])
+        cache.set_many({_cache_key(k): v for k, v in cursor.fetchall()},
+                       timeout=settings.VERSION_CACHE_TIMEOUT)